@@ -0,0 +1,139 @@
+"""
+Reference alignment for pitch scoring.
+
+The reference notes are laid out once on a grid of cells per note, in
+cents (analysis.references.ReferenceNotes.grid_cents, scaled by the note
+durations when the piece has them). The sung pitch center is then
+aligned to that grid with dynamic time warping restricted to a
+Sakoe-Chiba band around the diagonal, so tempo differences and rubato do
+not show up as pitch errors. Only the band is stored: cost and memory
+are O(N * band) instead of O(N * M).
+"""
+import numpy as np
+from numba import njit
+
+from .references import compile_reference
+
+# Band half-width as a fraction of the reference grid, and its lower bound in cells
+BAND_RATIO = 0.15
+MIN_BAND_RADIUS = 16
+
+# Local distance cap, so octave errors and glitches don't dominate the path
+MAX_LOCAL_CENTS = 600.0
+
+_DIAGONAL, _VERTICAL, _HORIZONTAL = 0, 1, 2
+
+
+@njit(cache=True)
+def _banded_dtw(query, reference, lo, width, max_cost):
+    n, m = len(query), len(reference)
+    steps = np.full((n, width), -1, dtype=np.int8)
+    previous = np.full(width, np.inf)
+    current = np.full(width, np.inf)
+
+    for i in range(n):
+        for w in range(width):
+            j = lo[i] + w
+            current[w] = np.inf
+            if j >= m:
+                continue
+            cost = min(abs(query[i] - reference[j]), max_cost)
+            if i == 0 and j == 0:
+                current[w] = cost
+                steps[i, w] = _DIAGONAL
+                continue
+            best = np.inf
+            step = -1
+            if i > 0:
+                k = j - 1 - lo[i - 1]
+                if 0 <= k < width and previous[k] < best:
+                    best, step = previous[k], _DIAGONAL
+                k = j - lo[i - 1]
+                if 0 <= k < width and previous[k] < best:
+                    best, step = previous[k], _VERTICAL
+            if w > 0 and current[w - 1] < best:
+                best, step = current[w - 1], _HORIZONTAL
+            if step >= 0:
+                current[w] = best + cost
+                steps[i, w] = step
+        previous, current = current, previous
+
+    total = previous[m - 1 - lo[n - 1]]
+
+    # Backtrack from the last cell of both sequences
+    path_i = np.empty(n + m, dtype=np.int64)
+    path_j = np.empty(n + m, dtype=np.int64)
+    i, j, length = n - 1, m - 1, 0
+    while True:
+        path_i[length], path_j[length] = i, j
+        length += 1
+        if i == 0 and j == 0:
+            break
+        step = steps[i, j - lo[i]]
+        if step == _DIAGONAL:
+            i, j = i - 1, j - 1
+        elif step == _VERTICAL:
+            i -= 1
+        else:
+            j -= 1
+    return total, path_i[:length][::-1], path_j[:length][::-1]
+
+
+def band_windows(n, m, radius):
+    """First reference cell and width of each query row's band, centered on the diagonal."""
+    # Consecutive rows must overlap, so the band is at least as wide as the slope
+    radius = max(radius, int(np.ceil(m / max(n, 1))) + 1)
+    width = min(m, 2 * radius + 1)
+    center = np.round(np.arange(n) * (m - 1) / max(n - 1, 1)).astype(np.int64)
+    lo = np.clip(center - radius, 0, m - width)
+    return lo, width
+
+
+def align_to_reference(center_cents, reference_notes, band_ratio=BAND_RATIO):
+    """
+    Align a pitch-center track (cents, voiced frames only) to the reference
+    notes. Returns the path as (frame indices, grid cell indices), the grid's
+    cents and note index per cell, and the average cost per path step.
+    """
+    reference = compile_reference(reference_notes)
+    grid_cents, note_index = reference.grid_cents, reference.grid_notes
+    n, m = len(center_cents), len(grid_cents)
+    radius = max(MIN_BAND_RADIUS, int(band_ratio * m))
+    lo, width = band_windows(n, m, radius)
+    total, path_i, path_j = _banded_dtw(np.asarray(center_cents, dtype=np.float64), grid_cents,
+                                        lo, width, MAX_LOCAL_CENTS)
+    return (path_i, path_j), grid_cents, note_index, float(total) / len(path_i)
+
+
+def per_note_deviation(center_cents, times, reference_notes, band_ratio=BAND_RATIO):
+    """
+    DTW-aligned deviation of each reference note. Returns the mean
+    absolute per-note deviation in cents and a debug dict whose "notes"
+    list has, per note, its aligned start/end time, median signed
+    deviation in cents and the number of frames aligned to it.
+    """
+    (path_i, path_j), grid_cents, note_index, step_cost = align_to_reference(
+        center_cents, reference_notes, band_ratio)
+    deviation = np.asarray(center_cents)[path_i] - grid_cents[path_j]
+    path_notes = note_index[path_j]
+
+    # The path is monotone in the grid, so each note's steps are contiguous
+    bounds = np.flatnonzero(np.diff(path_notes)) + 1
+    notes = []
+    for note, frames, cents in zip(reference_notes, np.split(path_i, bounds), np.split(deviation, bounds)):
+        notes.append({
+            "note": note,
+            "start": round(float(times[frames[0]]), 3),
+            "end": round(float(times[frames[-1]]), 3),
+            "cents": round(float(np.median(cents)), 1),
+            "frames": int(len(np.unique(frames))),
+        })
+
+    mean_abs_dev = float(np.mean([abs(n["cents"]) for n in notes]))
+    debug = {
+        "method": "dtw",
+        "mean_abs_cents": round(mean_abs_dev, 1),
+        "path_cost_cents": round(step_cost, 1),
+        "notes": notes,
+    }
+    return mean_abs_dev, debug
@@ -3,21 +3,23 @@ from pathlib import Path
 import sys
 from collections import defaultdict
 import numpy as np
-import matplotlib.pyplot as plt
-import io
-import base64
 import os
-import joblib
-import glob
+import hashlib
 import subprocess
-from sklearn.linear_model import LinearRegression
-from scipy.signal import find_peaks, savgol_filter
-from scipy.stats import pearsonr
 import warnings
 warnings.filterwarnings('ignore')
-from scipy.spatial.distance import cdist
-from librosa.sequence import dtw as librosa_dtw
-import librosa.display  # <-- add this so create_diction_plot() works
+from .features import FeatureContext
+from .references import compile_reference
+from .pitch import track_pitch
+from .cache import ANALYZER_VERSION, RESULT_CACHE, cache_key, file_cache_key
+from .decode import file_digest, load_audio
+from .model import model_version, predict_total
+from .stages import run_stages
+from .timing import StageTimer
+from .streaming import segment_features, stream_features
+from .vad import MIN_SKIPPED_FRACTION, skipped_fraction, voiced_segments
+from .plots import (PLOT_NAMES, RENDERERS, build_plot_data, compact_series,
+                    render_diction_plot, render_plots)
 
 
 
@@ -89,106 +91,26 @@ def get_feedback(score, category):
             return msg
     return NOTE_FEEDBACK[category][-1][2]  # Return highest feedback if score is 10
 
-def create_plot_image(fig):
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches="tight", dpi=150)
-    buf.seek(0)
-    encoded = base64.b64encode(buf.read()).decode("utf-8")
-    plt.close(fig)
-    return f"data:image/png;base64,{encoded}"
-
-def train_advanced_model():
-    # More comprehensive training data with realistic singing scenarios
-    X = np.array([
-        # Perfect singing
-        [10, 10, 10],
-        [9.5, 9.5, 9.5],
-        [9, 9, 9],
-        
-        # Good singing with minor issues
-        [8, 8, 8],
-        [8, 7, 8],
-        [7, 8, 7],
-        [7, 7, 8],
-        
-        # Average singing
-        [7, 6, 7],
-        [6, 7, 6],
-        [6, 6, 7],
-        [6, 6, 6],
-        
-        # Below average
-        [5, 5, 5],
-        [5, 4, 5],
-        [4, 5, 4],
-        [4, 4, 5],
-        
-        # Poor singing
-        [3, 3, 3],
-        [3, 2, 3],
-        [2, 3, 2],
-        [2, 2, 3],
-        
-        # Very poor
-        [1, 1, 1],
-        [1, 0, 1],
-        [0, 1, 0]
-    ])
-    
-    # Weighted total scores (pitch weighted more heavily)
-    y = np.array([
-        10.0, 9.8, 9.5,  # Perfect
-        8.2, 7.8, 7.6, 7.4,  # Good
-        6.8, 6.6, 6.4, 6.0,  # Average
-        5.2, 4.8, 4.6, 4.4,  # Below average
-        3.2, 2.8, 2.6, 2.4,  # Poor
-        1.2, 0.8, 0.6       # Very poor
-    ])
-    
-    model = LinearRegression()
-    model.fit(X, y)
-    joblib.dump(model, "advanced_score_model.joblib")
-    return model
-
-def get_advanced_model():
-    try:
-        return joblib.load("advanced_score_model.joblib")
-    except:
-        return train_advanced_model()
-
-def convert_to_wav(input_path):
-    output_path = os.path.splitext(input_path)[0] + "_converted.wav"
-    try:
-        subprocess.run([
-            "ffmpeg", "-y", "-i", input_path, "-ar", "22050", "-ac", "1", output_path
-        ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return output_path
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Failed to convert audio file: {e.stderr.decode()}") from e
-
-def cleanup_temp_uploads():
-    """Remove all audio files from backend/temp_uploads/ after processing."""
-    temp_dir = "backend/temp_uploads"
-    audio_exts = ("*.wav", "*.webm", "*.mp3", "*.m4a", "*.ogg", "*.flac")  # add more if needed
-
-    for ext in audio_exts:
-        for f in glob.glob(os.path.join(temp_dir, ext)):
-            try:
-                os.remove(f)
-                print(f"Deleted: {f}")
-            except Exception as e:
-                print(f"Error deleting {f}: {e}")
-
 import numpy as np
 import librosa
-from scipy.signal import savgol_filter, butter, filtfilt
 
-def analyze_pitch_accuracy(f0, times, reference_notes=None, sr=22050, debug=False):
+PITCH_ALIGNMENTS = ("dtw", "linear")
+VIBRATO_PERIOD_S = 0.2
+
+
+def analyze_pitch_accuracy(f0, times, reference_notes=None, sr=22050, debug=False, alignment="dtw"):
     """
     Vibrato-aware pitch scoring.
+
+    With reference notes, alignment="dtw" aligns the pitch center to the
+    notes (analysis.alignment) and scores each note's deviation;
+    "linear" spreads the notes evenly over the clip.
     Returns:
       pitch_score, accuracy_score, stability_score, vibrato_score, debug_dict
     """
+    # scipy.signal and numba load in ~1 s; only analysis processes need them
+    from scipy.signal import savgol_filter, butter, filtfilt
+
     # --- Clean ---
     valid_mask = ~np.isnan(f0)
     f0_clean = f0[valid_mask]
@@ -248,12 +170,23 @@ def analyze_pitch_accuracy(f0, times, reference_notes=None, sr=22050, debug=Fals
     stability_score = float(np.clip(10.0 - center_var / 500.0, 0.0, 10.0))
 
     # --- 4) Reference comparison (optional, use center vs reference) ---
+    debug_out = {}
     if reference_notes is not None and len(reference_notes) >= 2:
-        ref_hz = np.array([float(librosa.note_to_hz(n)) for n in reference_notes], dtype=float)
-        ref_time = np.linspace(0.0, times_clean[-1], len(ref_hz))
-        ref_interp = np.interp(times_clean, ref_time, ref_hz)
-        cents_dev = 1200.0 * np.log2(np.clip(smooth_f0 / np.clip(ref_interp, 1e-6, None), 1e-6, None))
-        mean_abs_dev = float(np.nanmean(np.abs(cents_dev)))
+        if alignment == "dtw":
+            from scipy.ndimage import uniform_filter1d
+            from .alignment import per_note_deviation
+
+            # The savgol center spans several notes; align a center that only
+            # averages out vibrato (one ~5 Hz cycle) so note steps survive
+            cents = 100.0 * librosa.hz_to_midi(f0_clean)
+            center_cents = uniform_filter1d(cents, max(1, int(round(fs * VIBRATO_PERIOD_S))), mode="nearest")
+            mean_abs_dev, debug_out = per_note_deviation(center_cents, times_clean, reference_notes)
+        else:
+            ref_hz = compile_reference(reference_notes).hz
+            ref_time = np.linspace(0.0, times_clean[-1], len(ref_hz))
+            ref_interp = np.interp(times_clean, ref_time, ref_hz)
+            cents_dev = 1200.0 * np.log2(np.clip(smooth_f0 / np.clip(ref_interp, 1e-6, None), 1e-6, None))
+            mean_abs_dev = float(np.nanmean(np.abs(cents_dev)))
         # 0–10 scale: ≤10–20 cents ~ top; 50 cents average ~ 0
         accuracy_score = float(np.clip(10.0 - (mean_abs_dev / 5.0), 0.0, 10.0))
     else:
@@ -270,9 +203,9 @@ def analyze_pitch_accuracy(f0, times, reference_notes=None, sr=22050, debug=Fals
     # --- 5) Combined pitch score ---
     pitch_score = float(0.7 * accuracy_score + 0.2 * stability_score + 0.1 * vibrato_score)
 
-    debug_out = {}
     if debug:
         debug_out = {
+            **debug_out,
             "vibrato_depth_cents": vib_depth_cents,
             "vibrato_rate_hz": vib_rate_hz,
             "center_variance": float(center_var),
@@ -281,77 +214,180 @@ def analyze_pitch_accuracy(f0, times, reference_notes=None, sr=22050, debug=Fals
 
     return pitch_score, accuracy_score, stability_score, float(vibrato_score), debug_out
 
-def analyze_breath_support(y, sr, rms):
-    """Comprehensive breath support analysis"""
-    # 1. Energy consistency
+# Minimum spacing of the energy peaks used for breath timing
+BREATH_PEAK_SPACING_S = 0.25
+
+
+def _smooth_energy(rms):
+    from scipy.signal import savgol_filter
+
     if len(rms) < 7:
-        rms_smooth = rms  # Too short to smooth
-    else:
-        # Make sure window length is odd and <= len(rms)
-        window_length = min(51, len(rms) if len(rms) % 2 == 1 else len(rms) - 1)
-        rms_smooth = savgol_filter(rms, window_length, 3)
+        return rms  # Too short to smooth
+    # Make sure window length is odd and <= len(rms)
+    window_length = min(51, len(rms) if len(rms) % 2 == 1 else len(rms) - 1)
+    return savgol_filter(rms, window_length, 3)
+
+
+def _segment_percentile(values, counts, q):
+    """q-th percentile of each consecutive segment of `values` with lengths `counts`; NaN if empty."""
+    # np.percentile partitions each segment in O(n); one global sort is slower
+    segments = np.split(values, np.cumsum(counts)[:-1])
+    return np.array([np.percentile(segment, q) if len(segment) else np.nan for segment in segments])
+
+
+def _run_lengths(mask):
+    """Start indices and lengths of the runs of True in a boolean array."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    return edges[::2], edges[1::2] - edges[::2]
 
-    energy_variance = np.var(rms_smooth)
+
+def analyze_breath_support_batch(rms_arrays, sr, hop_length=512):
+    """
+    Breath support scores for many RMS tracks at once.
+
+    The tracks are concatenated and every statistic is computed per track
+    with segment-wise NumPy reductions, so the cost is a few passes over
+    the total frame count. Phrase lengths come from run-length encoding
+    the sustained-energy mask, and all durations are in the frame domain
+    (hop_length / sr seconds per frame). Returns an (n_tracks, 5) array of
+    breath_score, energy_consistency, dropout_score, phrase_score, timing_score.
+    """
+    rms_arrays = [np.asarray(rms, dtype=np.float64) for rms in rms_arrays]
+    n = len(rms_arrays)
+    if n == 0:
+        return np.zeros((0, 5))
+    counts = np.array([len(rms) for rms in rms_arrays])
+    segment = np.repeat(np.arange(n), counts)
+    rms = np.concatenate(rms_arrays)
+    smooth = np.concatenate([_smooth_energy(r) for r in rms_arrays])
+    frame_seconds = hop_length / sr
+
+    # 1. Energy consistency
+    mean = np.bincount(segment, weights=smooth, minlength=n) / np.maximum(counts, 1)
+    energy_variance = np.bincount(segment, weights=(smooth - mean[segment]) ** 2, minlength=n) / np.maximum(counts, 1)
     energy_consistency = np.clip(10 - energy_variance * 100, 0, 10)
-    
+
     # 2. Breath dropouts (low energy regions)
-    energy_threshold = np.percentile(rms, 20)
-    dropouts = np.sum(rms < energy_threshold)
-    dropout_ratio = dropouts / len(rms)
+    energy_threshold = _segment_percentile(rms, counts, 20)
+    dropouts = np.bincount(segment, weights=rms < energy_threshold[segment], minlength=n)
+    dropout_ratio = dropouts / np.maximum(counts, 1)
     dropout_score = np.clip(10 - dropout_ratio * 50, 0, 10)
-    
+
     # 3. Phrase length analysis
-    # Find sustained notes (regions with consistent energy)
-    energy_diff = np.abs(np.diff(rms_smooth))
-    sustained_regions = energy_diff < np.percentile(energy_diff, 30)
-    
-    # Calculate average phrase length
-    phrase_lengths = []
-    current_length = 0
-    for sustained in sustained_regions:
-        if sustained:
-            current_length += 1
-        elif current_length > 0:
-            phrase_lengths.append(current_length)
-            current_length = 0
-    
-    if phrase_lengths:
-        avg_phrase_length = np.mean(phrase_lengths) / sr  # Convert to seconds
-        phrase_score = np.clip(avg_phrase_length * 2, 0, 10)  # 5+ seconds is excellent
-    else:
-        phrase_score = 3.0
-    
+    # Sustained notes are frames whose energy changes less than the track's
+    # 30th percentile change; diffs across track boundaries are dropped
+    within = np.ones(max(len(rms) - 1, 0), dtype=bool)
+    boundaries = np.cumsum(counts)[:-1] - 1
+    within[boundaries[(counts[:-1] > 0) & (boundaries < len(within))]] = False
+    energy_diff = np.abs(np.diff(smooth))[within]
+    diff_counts = np.maximum(counts - 1, 0)
+    diff_segment = np.repeat(np.arange(n), diff_counts)
+    sustained = energy_diff < _segment_percentile(energy_diff, diff_counts, 30)[diff_segment]
+    # A False between tracks keeps runs from spanning two of them
+    run_mask = np.zeros(len(sustained) + n, dtype=bool)
+    run_mask[np.arange(len(sustained)) + diff_segment] = sustained
+    run_starts, run_lengths = _run_lengths(run_mask)
+    run_segment = np.searchsorted(np.cumsum(diff_counts + 1), run_starts, side="right")
+    phrase_count = np.bincount(run_segment, minlength=n)
+    phrase_frames = np.bincount(run_segment, weights=run_lengths, minlength=n)
+    avg_phrase_length = phrase_frames / np.maximum(phrase_count, 1) * frame_seconds
+    phrase_score = np.where(phrase_count > 0, np.clip(avg_phrase_length * 2, 0, 10), 3.0)  # 5+ seconds is excellent
+
     # 4. Breath timing analysis
     # Look for natural breath patterns
-    energy_peaks, _ = find_peaks(rms, height=np.percentile(rms, 70), distance=sr//4)
-    if len(energy_peaks) > 1:
-        peak_intervals = np.diff(energy_peaks) / sr
-        timing_consistency = 1 / np.std(peak_intervals) if np.std(peak_intervals) > 0 else 0
-        timing_score = np.clip(timing_consistency / 10, 0, 10)
-    else:
-        timing_score = 5.0
-    
+    from scipy.signal import find_peaks
+
+    peak_height = _segment_percentile(rms, counts, 70)
+    peak_distance = max(1, int(round(BREATH_PEAK_SPACING_S / frame_seconds)))
+    timing_score = np.full(n, 5.0)
+    for i, track in enumerate(rms_arrays):
+        if counts[i] < 3:
+            continue
+        energy_peaks, _ = find_peaks(track, height=peak_height[i], distance=peak_distance)
+        if len(energy_peaks) > 1:
+            interval_std = np.std(np.diff(energy_peaks) * frame_seconds)
+            timing_consistency = 1 / interval_std if interval_std > 0 else 0
+            timing_score[i] = np.clip(timing_consistency / 10, 0, 10)
+
     # 5. Overall breath score
-    breath_score = (energy_consistency * 0.3 + dropout_score * 0.3 + 
-                   phrase_score * 0.2 + timing_score * 0.2)
-    
-    return breath_score, energy_consistency, dropout_score, phrase_score, timing_score
+    breath_score = (energy_consistency * 0.3 + dropout_score * 0.3 +
+                    phrase_score * 0.2 + timing_score * 0.2)
 
-def analyze_diction_articulation(y, sr):
-    """Enhanced diction and articulation analysis with better consonant detection"""
-    
+    return np.column_stack([breath_score, energy_consistency, dropout_score, phrase_score, timing_score])
+
+
+def analyze_breath_support(y, sr, rms, hop_length=512):
+    """Comprehensive breath support analysis of one RMS track (see analyze_breath_support_batch)"""
+    return tuple(analyze_breath_support_batch([rms], sr, hop_length)[0])
+
+def analyze_diction_articulation(y, sr, features=None, hnr_method="spectral"):
+    """
+    Enhanced diction and articulation analysis with better consonant detection.
+
+    hnr_method selects how the harmonic-to-noise ratio is measured:
+      "spectral" - one HPSS pass, energies read from the harmonic/percussive
+                   magnitudes (no inverse STFT)
+      "waveform" - reconstruct both components with an inverse STFT and
+                   measure their sample energies (original behaviour)
+    """
+    return score_diction(diction_statistics(y, sr, features, hnr_method), sr)
+
+def diction_statistics(y, sr, features=None, hnr_method="spectral"):
+    """
+    Frame-level statistics the diction score is computed from. Streaming
+    analysis builds the same dict block by block (see analysis.streaming).
+    """
+    # All spectral metrics below share one STFT via the feature context
+    if features is None:
+        features = FeatureContext(y, sr)
+    S = features.magnitude
+
+    mfcc = librosa.feature.mfcc(S=features.log_mel, sr=sr, n_mfcc=13)
+    mfcc_delta = librosa.feature.delta(mfcc)
+    contrast = librosa.feature.spectral_contrast(S=S, sr=sr, n_bands=6)
+
+    if hnr_method == "spectral":
+        H_mag, P_mag = features.hpss_magnitude
+        harmonic_energy = features.mean_energy(H_mag)
+        percussive_energy = features.mean_energy(P_mag)
+    elif hnr_method == "waveform":
+        H, P = features.hpss
+        harmonic = librosa.istft(H, dtype=y.dtype, n_fft=features.n_fft,
+                                 hop_length=features.hop_length, length=len(y))
+        percussive = librosa.istft(P, dtype=y.dtype, n_fft=features.n_fft,
+                                   hop_length=features.hop_length, length=len(y))
+        harmonic_energy = np.mean(harmonic**2)
+        percussive_energy = np.mean(percussive**2)
+    else:
+        raise ValueError(f"Unknown hnr_method: {hnr_method}")
+
+    return {
+        "centroid": librosa.feature.spectral_centroid(S=S, sr=sr)[0],
+        "rolloff": librosa.feature.spectral_rolloff(S=S, sr=sr, roll_percent=0.95)[0],
+        "onset_env": features.onset_env_median,
+        "zcr": features.zcr,
+        "mfcc_std": np.std(mfcc, axis=1),
+        "mfcc_delta_std": np.std(mfcc_delta, axis=1),
+        "contrast_mean": np.mean(contrast),
+        "harmonic_energy": harmonic_energy,
+        "percussive_energy": percussive_energy,
+        "flatness": librosa.feature.spectral_flatness(S=S)[0],
+    }
+
+def score_diction(stats, sr):
+    """Diction score and sub-scores from diction_statistics()."""
     # 1. Spectral centroid (brightness)
-    centroid = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+    centroid = stats["centroid"]
     centroid_mean = np.mean(centroid)
     brightness_score = np.clip((centroid_mean - 1000) / 200, 0, 10)
     
     # 2. Spectral rolloff (high frequency content)
-    rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr, roll_percent=0.95)[0]
+    rolloff = stats["rolloff"]
     rolloff_mean = np.mean(rolloff)
     rolloff_score = np.clip((rolloff_mean - 2000) / 500, 0, 10)
     
     # 3. Enhanced onset detection for consonants
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr, aggregate=np.median)
+    onset_env = stats["onset_env"]
     onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr)
     
     # Calculate onset strength metrics
@@ -363,7 +399,7 @@ def analyze_diction_articulation(y, sr):
         onset_score = 5.0  # Neutral score if no onsets detected
     
     # 4. Enhanced zero crossing rate analysis
-    zcr = librosa.feature.zero_crossing_rate(y, frame_length=2048, hop_length=512)[0]
+    zcr = stats["zcr"]
     zcr_mean = np.mean(zcr)
     zcr_var = np.var(zcr)
     
@@ -373,19 +409,14 @@ def analyze_diction_articulation(y, sr):
     zcr_score = (zcr_mean_score * 0.4 + zcr_var_score * 0.6)
     
     # 5. Enhanced MFCC analysis with delta features
-    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-    mfcc_delta = librosa.feature.delta(mfcc)
-    
-    # Calculate articulation metrics
-    mfcc_std = np.std(mfcc, axis=1)
-    mfcc_delta_std = np.std(mfcc_delta, axis=1)
+    mfcc_std = stats["mfcc_std"]
+    mfcc_delta_std = stats["mfcc_delta_std"]
     
     # Combined articulation score
     articulation_score = np.clip(np.mean(mfcc_std) * 1.5 + np.mean(mfcc_delta_std) * 2, 0, 10)
     
     # 6. Enhanced spectral contrast with more bands
-    contrast = librosa.feature.spectral_contrast(y=y, sr=sr, n_bands=6)
-    contrast_score = np.clip(np.mean(contrast) * 0.6, 0, 10)
+    contrast_score = np.clip(stats["contrast_mean"] * 0.6, 0, 10)
     
     # 7. New: Formant analysis for vowel clarity
     try:
@@ -396,13 +427,11 @@ def analyze_diction_articulation(y, sr):
         formant_score = 5.0
     
     # 8. New: Harmonic-to-noise ratio for voice quality
-    harmonic = librosa.effects.harmonic(y)
-    percussive = librosa.effects.percussive(y)
-    hnr = 10 * np.log10(np.mean(harmonic**2) / (np.mean(percussive**2) + 1e-10))
+    hnr = 10 * np.log10(stats["harmonic_energy"] / (stats["percussive_energy"] + 1e-10))
     hnr_score = np.clip(hnr / 5, 0, 10)  # 0-10 scale where higher is better
     
     # 9. New: Plosive detection (for consonant bursts)
-    spectral_flatness = librosa.feature.spectral_flatness(y=y)[0]
+    spectral_flatness = stats["flatness"]
     plosive_frames = np.where(spectral_flatness < np.percentile(spectral_flatness, 10))[0]
     plosive_score = np.clip(len(plosive_frames) / len(spectral_flatness) * 20, 0, 10)
     
@@ -425,55 +454,102 @@ def analyze_diction_articulation(y, sr):
         contrast_score, formant_score, hnr_score, plosive_score
     )
 
-def create_diction_plot(y, sr, diction_score):
+def create_diction_plot(y, sr, diction_score, features=None):
     """Enhanced diction visualization with more features"""
-    fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(12, 9))
-    
-    # Spectral features
-    S = librosa.feature.melspectrogram(y=y, sr=sr)
-    S_dB = librosa.power_to_db(S, ref=np.max)
-    img = librosa.display.specshow(S_dB, x_axis='time', y_axis='mel', 
-                                 sr=sr, fmax=8000, ax=ax1)
-    ax1.set_title(f"Diction Analysis (Score: {diction_score:.1f}/10) - Spectrogram")
-    fig.colorbar(img, ax=ax1, format='%+2.0f dB')
-    
-    # Onset strength
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-    onset_times = librosa.times_like(onset_env, sr=sr)
-    ax2.plot(onset_times, onset_env, label='Onset Strength', color='orange')
-    ax2.set_ylabel('Strength')
-    ax2.set_title('Consonant Detection')
-    ax2.legend()
-    
-    # Zero crossing rate
-    zcr = librosa.feature.zero_crossing_rate(y)[0]
-    zcr_times = librosa.times_like(zcr, sr=sr)
-    ax3.plot(zcr_times, zcr, label='Zero Crossing Rate', color='green')
-    ax3.set_xlabel('Time (s)')
-    ax3.set_ylabel('Rate')
-    ax3.set_title('Articulation Clarity')
-    ax3.legend()
-    
-    plt.tight_layout()
-    return create_plot_image(fig)
+    if features is None:
+        features = FeatureContext(y, sr)
+    rms = librosa.feature.rms(y=y, hop_length=features.hop_length)[0]
+    times = librosa.times_like(rms, sr=sr, hop_length=features.hop_length)
+    plot_data = build_plot_data(
+        times, np.full_like(times, np.nan), rms, features,
+        scores={"pitch": 0.0, "breath": 0.0, "diction": diction_score}
+    )
+    return render_diction_plot(plot_data)
+
+def plot_data_key(analysis_id):
+    return f"plots-{analysis_id}"
+
+def render_stored_plot(analysis_id, name, image_format="png"):
+    """Render one plot from the plot data stored by a previous analysis, or None if evicted."""
+    plot_data = RESULT_CACHE.get_arrays(plot_data_key(analysis_id))
+    if plot_data is None:
+        return None
+    return RENDERERS[name](plot_data, image_format)
+
+def stored_series(analysis_id):
+    """Compact series for a previous analysis, or None if its plot data was evicted."""
+    plot_data = RESULT_CACHE.get_arrays(plot_data_key(analysis_id))
+    if plot_data is None:
+        return None
+    return compact_series(plot_data)
+
+def analyze_live_take(y, sr, f0, rms, reference_notes=None, plots=(), series=True, image_format="png"):
+    """
+    Score a take recorded through a live session (analysis.live.LiveSession).
+
+    The f0 and RMS tracks were already computed frame by frame while the
+    user sang, so only the diction features are extracted from `y`. The
+    plot data is cached like any other analysis, so plots can be fetched
+    later by analysis_id.
+    """
+    times = librosa.times_like(f0, sr=sr, hop_length=512)
+    features = FeatureContext(y, sr, n_fft=2048, hop_length=512)
+    analysis_id = cache_key(
+        y, sr, reference_notes, options={"live": True},
+        version=f"{ANALYZER_VERSION}+{model_version()}"
+    )
+
+    metrics = score_analysis_metrics(f0, times, y, sr, rms, reference_notes, features=features)
+    scores = dict(zip(PLOT_NAMES, metrics[:3]))
+    plot_data = build_plot_data(times, f0, rms, features, scores=scores, reference_notes=reference_notes)
+    RESULT_CACHE.put_arrays(plot_data_key(analysis_id), plot_data)
+
+    feedback = build_feedback(analysis_id, metrics, render_plots(plot_data, plots, image_format),
+                              reference_notes)
+    if series:
+        feedback["series"] = compact_series(plot_data)
+    return feedback
+
+
+def score_analysis_metrics(f0, times, y, sr, rms, reference_notes=None, debug=False, features=None,
+                           hnr_method="spectral", progress=None, timer=None, diction_stats=None,
+                           alignment="dtw", threads=None):
+    """
+    Updated to handle enhanced diction analysis and pass debug flag.
+    diction_stats, if given, replaces the diction statistics computed from y
+    (streaming analysis passes the ones it accumulated; y may then be None).
+    The pitch, breath and diction stages run concurrently on up to `threads`
+    threads (see analysis.stages).
+    """
+    timer = timer or StageTimer()
+
+    def diction():
+        stats = diction_stats
+        if stats is None:
+            stats = diction_statistics(y, sr, features=features, hnr_method=hnr_method)
+        return score_diction(stats, sr)
+
+    def on_start(stage):
+        if progress and stage in ("breath", "diction"):
+            progress(stage)
+
+    results = run_stages({
+        "pitch_analysis": (lambda: analyze_pitch_accuracy(f0, times, reference_notes, sr,
+                                                          debug=debug, alignment=alignment), ()),
+        "breath": (lambda: analyze_breath_support(y, sr, rms), ()),
+        "diction": (diction, ()),
+        # Use advanced model for final scoring
+        "model": (lambda pitch, breath, diction: predict_total([[pitch[0], breath[0], diction[0]]])[0],
+                  ("pitch_analysis", "breath", "diction")),
+    }, threads=threads, timer=timer, on_start=on_start)
+
+    pitch_score, acc_score, stab_score, vib_score, dtw_debug = results["pitch_analysis"]
+    breath_score, energy_score, dropout_score, phrase_score, timing_score = results["breath"]
+    (diction_score, bright_score, rolloff_score, onset_score,
+     zcr_score, artic_score, contrast_score, formant_score,
+     hnr_score, plosive_score) = results["diction"]
+    total_score = results["model"]
 
-def score_analysis_metrics(f0, times, y, sr, rms, reference_notes=None, debug=False):
-    """Updated to handle enhanced diction analysis and pass debug flag"""
-    
-    # Analyze each component
-    pitch_score, acc_score, stab_score, vib_score, dtw_debug = analyze_pitch_accuracy(f0, times, reference_notes, sr, debug=debug)
-    breath_score, energy_score, dropout_score, phrase_score, timing_score = analyze_breath_support(y, sr, rms)
-    
-    # Enhanced diction analysis
-    (diction_score, bright_score, rolloff_score, onset_score, 
-     zcr_score, artic_score, contrast_score, formant_score, 
-     hnr_score, plosive_score) = analyze_diction_articulation(y, sr)
-    
-    # Use advanced model for final scoring
-    model = get_advanced_model()
-    total_score = model.predict([[pitch_score, breath_score, diction_score]])[0]
-    total_score = np.clip(total_score, 0, 10)
-    
     return (pitch_score, breath_score, diction_score, total_score,
             acc_score, stab_score, vib_score,
             energy_score, dropout_score, phrase_score, timing_score,
@@ -481,6 +557,54 @@ def score_analysis_metrics(f0, times, y, sr, rms, reference_notes=None, debug=Fa
             artic_score, contrast_score, formant_score, hnr_score, 
             plosive_score, dtw_debug)
 
+def build_feedback(analysis_id, metrics, images, reference_notes=None):
+    """Response dict for the tuple returned by score_analysis_metrics and the rendered plots."""
+    (pitch_score, breath_score, diction_score, total_score,
+     acc_score, stab_score, vib_score,
+     energy_score, dropout_score, phrase_score, timing_score,
+     bright_score, rolloff_score, onset_score, zcr_score,
+     artic_score, contrast_score, formant_score, hnr_score,
+     plosive_score, dtw_debug) = metrics
+
+    return {
+        "analysis_id": analysis_id,
+        "pitch_score": round(pitch_score, 1),
+        "breath_score": round(breath_score, 1),
+        "diction_score": round(diction_score, 1),
+        "total_score": round(total_score, 1),
+        "pitch_plot": images["pitch"],
+        "breath_plot": images["breath"],
+        "diction_plot": images["diction"],
+        "pitch_feedback": get_feedback(pitch_score, "pitch"),
+        "breath_feedback": get_feedback(breath_score, "breath"),
+        "diction_feedback": get_feedback(diction_score, "diction"),
+        "detailed_scores": {
+            "pitch": {
+                "accuracy": round(float(acc_score), 1),
+                "stability": round(float(stab_score), 1),
+                "vibrato": round(float(vib_score), 1)
+            },
+            "breath": {
+                "energy_consistency": round(float(energy_score), 1),
+                "dropout_control": round(float(dropout_score), 1),
+                "phrase_length": round(float(phrase_score), 1),
+                "timing": round(float(timing_score), 1)
+            },
+            "diction": {
+                "brightness": round(float(bright_score), 1),
+                "high_frequency": round(float(rolloff_score), 1),
+                "consonant_clarity": round(float(onset_score), 1),
+                "articulation": round(float(artic_score), 1),
+                "spectral_contrast": round(float(contrast_score), 1),
+                "formant_clarity": round(float(formant_score), 1),
+                "voice_quality": round(float(hnr_score), 1),
+                "plosive_detection": round(float(plosive_score), 1)
+            }
+        },
+        "reference_notes": list(reference_notes) if reference_notes else reference_notes,
+        "dtw_debug": dtw_debug,
+    }
+
 def extract_reference_pitches_from_sheetmusic(sheet_image_path):
     """
     Simplified version of SheetVision integration.
@@ -515,153 +639,187 @@ def extract_reference_pitches_from_sheetmusic(sheet_image_path):
         return []
 
 
-def analyze_singing_ai(file_path, reference_notes=None, sheet_image_path=None, sr=22050, debug=False):
-    """Main analysis function for AI-based vocal feedback with optional reference pitch input from sheet music."""
-
-    pitch_plot = None
-    breath_plot = None
-    diction_plot = None
+def analyze_singing_ai(file_path, reference_notes=None, sheet_image_path=None, sr=22050, debug=False,
+                       hnr_method="spectral", f0_method="pyin", voice_type=None, progress=None,
+                       use_cache=True, plots=PLOT_NAMES, series=False, image_format="png", timings=False,
+                       streaming=False, alignment="dtw", vad=True, threads=None):
+    """
+    Main analysis function for AI-based vocal feedback with optional reference pitch input from sheet music.
+
+    f0_method picks the pitch tracker ("pyin", "pyin_range" or "yin", see
+    analysis.pitch.track_pitch); voice_type narrows the range for the
+    faster backends when no reference notes are given.
+
+    alignment chooses how reference notes are matched to the performance:
+    "dtw" (tempo-independent, per-note results in "dtw_debug") or "linear"
+    (notes spread evenly over the clip).
+
+    progress, if given, is called with the name of each stage as it starts
+    ("decode", "pitch", "breath", "diction", "plots").
+
+    Results are memoized in analysis.cache.RESULT_CACHE keyed on the decoded
+    audio, the reference notes, the options and the analyzer/model version;
+    pass use_cache=False to force a fresh analysis.
+
+    plots selects which figures to render ("pitch", "breath", "diction");
+    pass an empty tuple to skip matplotlib entirely. series=True adds the
+    downsampled pitch/RMS/onset arrays under "series". The plot data is
+    stored under the returned "analysis_id" so figures can be rendered
+    later with render_stored_plot.
+
+    Stage durations are always reported through analysis.events for
+    /metrics; timings=True also returns them under "debug".
+
+    streaming=True reads the recording block by block (analysis.streaming)
+    so memory stays bounded for long rehearsal recordings. Scores match the
+    in-memory path closely but not bit for bit (pYIN and onset picking see
+    block boundaries), only the spectral HNR method is supported, and the
+    cache is keyed on the file contents rather than the decoded audio.
+
+    vad=True (in-memory path, spectral HNR) runs pitch tracking and the
+    diction features only on the voiced segments found by analysis.vad
+    when they leave out at least MIN_SKIPPED_FRACTION of the recording;
+    silent frames are unvoiced in the pitch track and left out of the
+    diction statistics. timings=True reports the gating under debug["vad"].
+    Streaming analysis is not gated (the silence threshold is relative to
+    the loudest frame, which is only known at the end), so for recordings
+    with long silences its scores differ from the in-memory path.
+
+    threads caps how many independent stages (the pitch, breath and diction
+    scores, then the plots) this analysis runs at once; the default comes
+    from STAGE_THREADS (see analysis.stages). Results don't depend on it.
+    """
+    plots = tuple(plots)
+    timer = StageTimer()
 
     # Extract reference pitches from sheet music image if provided (commented out)
     # print(reference_notes)
     # if sheet_image_path and not reference_notes:
     #     reference_notes = extract_reference_pitches_from_sheetmusic(sheet_image_path)
 
-    delete_after = not file_path.endswith(".wav")
-    if delete_after:
-        file_path = convert_to_wav(file_path)
+    if progress:
+        progress("decode")
 
     try:
-        y, sr = librosa.load(file_path, sr=sr)
-
-        f0, voiced_flag, voiced_probs = librosa.pyin(
-            y,
-            fmin=float(librosa.note_to_hz('C2')),
-            fmax=float(librosa.note_to_hz('C7')),
-            sr=sr,
-            frame_length=2048,
-            hop_length=512,
-            fill_na=np.nan
-        )
-        times = librosa.times_like(f0, sr=sr, hop_length=512)
-        rms = librosa.feature.rms(y=y, hop_length=512)[0]
-
-        (pitch_score, breath_score, diction_score, total_score,
-         acc_score, stab_score, vib_score,
-         energy_score, dropout_score, phrase_score, timing_score,
-         bright_score, rolloff_score, onset_score, zcr_score,
-         artic_score, contrast_score, formant_score, hnr_score,
-         plosive_score, dtw_debug) = score_analysis_metrics(
-            f0, times, y, sr, rms, reference_notes, debug=debug
-        )
-
-        try:
-            pitch_fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 6))
-            ax1.plot(times, f0, label="Sung Pitch", color="blue", alpha=0.7)
-
-            if reference_notes and len(reference_notes) >= 2:
-                try:
-                    ref_hz = [float(librosa.note_to_hz(note)) for note in reference_notes]
-                    ref_interp = np.interp(times, np.linspace(0, times[-1], len(ref_hz)), ref_hz)
-
-                    ax1.plot(times, ref_interp, label="Expected Pitch (Reference)", linestyle="--", color="orange", linewidth=2)
-
-                    cents_deviation = 1200 * np.log2(f0 / ref_interp)
-                    ax2.plot(times, cents_deviation, label="Pitch Deviation (cents)", color="red", alpha=0.7)
-                    ax2.axhline(y=0, color='black', linestyle='-', alpha=0.5)
-                    ax2.axhline(y=50, color='gray', linestyle='--', alpha=0.5, label="±50 cents")
-                    ax2.axhline(y=-50, color='gray', linestyle='--', alpha=0.5)
-                    ax2.set_ylabel("Deviation (cents)")
-                    ax2.set_xlabel("Time (s)")
-                    ax2.legend()
-                    ax2.grid(True, alpha=0.3)
-                except Exception as e:
-                    print(f"[WARN] Could not plot reference notes: {e}")
+        options = {"hnr_method": hnr_method, "f0_method": f0_method,
+                   "voice_type": voice_type, "debug": debug, "alignment": alignment, "vad": vad}
+        version = f"{ANALYZER_VERSION}+{model_version()}"
+        if streaming:
+            if hnr_method != "spectral":
+                raise ValueError("Streaming analysis only supports hnr_method='spectral'")
+            y = None
+            audio_seconds = None
+            with timer.stage("decode"):
+                analysis_id = file_cache_key(file_digest(file_path), sr, reference_notes,
+                                             options=dict(options, streaming=True), version=version)
+        else:
+            with timer.stage("decode"):
+                y, sr = load_audio(file_path, sr=sr)
+            audio_seconds = len(y) / sr
+            analysis_id = cache_key(y, sr, reference_notes, options=options, version=version)
+
+        key = None
+        if use_cache:
+            output_options = f"{','.join(sorted(plots))}|{series}|{image_format}"
+            key = hashlib.sha256(f"{analysis_id}|{output_options}".encode("utf-8")).hexdigest()
+            with timer.stage("cache_lookup"):
+                cached = RESULT_CACHE.get(key)
+            if cached is not None:
+                summary = timer.finish(audio_seconds, cached=True)
+                if timings:
+                    cached = dict(cached, debug=summary)
+                return cached
+
+        if progress:
+            progress("pitch")
+
+        streamed = None
+        vad_summary = None
+        if streaming:
+            streamed = stream_features(
+                file_path, sr,
+                pitch_options={"method": f0_method, "reference_notes": reference_notes,
+                               "voice_type": voice_type},
+                timer=timer
+            )
+            f0, rms = streamed.series("f0"), streamed.series("rms")
+            times = librosa.times_like(f0, sr=sr, hop_length=512)
+            audio_seconds = streamed.n_samples / sr
+            metrics = score_analysis_metrics(
+                f0, times, None, sr, rms, reference_notes, debug=debug,
+                progress=progress, timer=timer, diction_stats=streamed.diction_stats(), alignment=alignment,
+                threads=threads
+            )
+        else:
+            with timer.stage("rms"):
+                rms = librosa.feature.rms(y=y, hop_length=512)[0]
+            segments = None
+            if vad and hnr_method == "spectral":
+                with timer.stage("vad"):
+                    segments = voiced_segments(rms, sr, 512)
+                    skipped = skipped_fraction(segments, len(rms))
+                vad_summary = {"segments": len(segments), "skipped_fraction": round(skipped, 3),
+                               "gated": skipped >= MIN_SKIPPED_FRACTION and len(segments) > 0}
+
+            if vad_summary and vad_summary["gated"]:
+                streamed = segment_features(
+                    y, sr, rms, segments,
+                    pitch_options={"method": f0_method, "reference_notes": reference_notes,
+                                   "voice_type": voice_type},
+                    timer=timer
+                )
+                f0 = streamed.series("f0")
+                times = librosa.times_like(f0, sr=sr, hop_length=512)
+                metrics = score_analysis_metrics(
+                    f0, times, y, sr, rms, reference_notes, debug=debug,
+                    progress=progress, timer=timer, diction_stats=streamed.diction_stats(), alignment=alignment,
+                    threads=threads
+                )
             else:
-                print("[INFO] No reference notes available — skipping expected pitch overlay.")
-
-            ax1.set_title(f"Pitch Analysis (Score: {pitch_score:.1f}/10)")
-            ax1.set_xlabel("Time (s)")
-            ax1.set_ylabel("Frequency (Hz)")
-            ax1.legend()
-            ax1.grid(True, alpha=0.3)
-
-            pitch_plot = create_plot_image(pitch_fig)
-            plt.close(pitch_fig)
-        except Exception as e:
-            print(f"Error creating pitch plot: {e}")
-
-        try:
-            breath_fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 6))
-            rms_times = librosa.times_like(rms, sr=sr, hop_length=512)
-            ax1.plot(rms_times, rms, label="RMS Energy", color="green", alpha=0.7)
-            energy_threshold = np.percentile(rms, 20)
-            ax1.axhline(y=energy_threshold, color='red', linestyle='--', label="Low Energy Threshold")
-            ax1.set_title(f"Breath Support Analysis (Score: {breath_score:.1f}/10)")
-            ax1.set_ylabel("Energy")
-            ax1.legend()
-            ax1.grid(True, alpha=0.3)
-
-            if len(rms) < 7:
-                rms_smooth = rms
+                with timer.stage("pitch"):
+                    f0, voiced_flag, voiced_probs = track_pitch(
+                        y,
+                        sr,
+                        method=f0_method,
+                        reference_notes=reference_notes,
+                        voice_type=voice_type,
+                        frame_length=2048,
+                        hop_length=512
+                    )
+                times = librosa.times_like(f0, sr=sr, hop_length=512)
+                features = FeatureContext(y, sr, n_fft=2048, hop_length=512)
+
+                metrics = score_analysis_metrics(
+                    f0, times, y, sr, rms, reference_notes, debug=debug, features=features,
+                    hnr_method=hnr_method, progress=progress, timer=timer, alignment=alignment,
+                    threads=threads
+                )
+
+        pitch_score, breath_score, diction_score = metrics[:3]
+
+        if progress:
+            progress("plots")
+
+        with timer.stage("plot_data"):
+            scores = {"pitch": pitch_score, "breath": breath_score, "diction": diction_score}
+            if streamed is not None:
+                plot_data = streamed.plot_data(times, scores, reference_notes)
             else:
-                window_len = min(51, len(rms) if len(rms) % 2 == 1 else len(rms) - 1)
-                rms_smooth = savgol_filter(rms, window_len, 3)
-            ax2.plot(rms_times, rms_smooth, label="Smoothed Energy", color="darkgreen", alpha=0.7)
-            ax2.set_xlabel("Time (s)")
-            ax2.set_ylabel("Smoothed Energy")
-            ax2.legend()
-            ax2.grid(True, alpha=0.3)
-
-            breath_plot = create_plot_image(breath_fig)
-            plt.close(breath_fig)
-        except Exception as e:
-            print(f"Error creating breath plot: {e}")
-
-        try:
-            diction_plot = create_diction_plot(y, sr, diction_score)
-        except Exception as e:
-            print(f"Error creating diction plot: {e}")
-
-        cleanup_temp_uploads()
-
-        feedback = {
-            "pitch_score": round(pitch_score, 1),
-            "breath_score": round(breath_score, 1),
-            "diction_score": round(diction_score, 1),
-            "total_score": round(total_score, 1),
-            "pitch_plot": pitch_plot,
-            "breath_plot": breath_plot,
-            "diction_plot": diction_plot,
-            "pitch_feedback": get_feedback(pitch_score, "pitch"),
-            "breath_feedback": get_feedback(breath_score, "breath"),
-            "diction_feedback": get_feedback(diction_score, "diction"),
-            "detailed_scores": {
-                "pitch": {
-                    "accuracy": round(float(acc_score), 1),
-                    "stability": round(float(stab_score), 1),
-                    "vibrato": round(float(vib_score), 1)
-                },
-                "breath": {
-                    "energy_consistency": round(float(energy_score), 1),
-                    "dropout_control": round(float(dropout_score), 1),
-                    "phrase_length": round(float(phrase_score), 1),
-                    "timing": round(float(timing_score), 1)
-                },
-                "diction": {
-                    "brightness": round(float(bright_score), 1),
-                    "high_frequency": round(float(rolloff_score), 1),
-                    "consonant_clarity": round(float(onset_score), 1),
-                    "articulation": round(float(artic_score), 1),
-                    "spectral_contrast": round(float(contrast_score), 1),
-                    "formant_clarity": round(float(formant_score), 1),
-                    "voice_quality": round(float(hnr_score), 1),
-                    "plosive_detection": round(float(plosive_score), 1)
-                }
-            },
-            "reference_notes": reference_notes,
-            "dtw_debug": dtw_debug,
-        }
+                plot_data = build_plot_data(times, f0, rms, features, scores=scores,
+                                            reference_notes=reference_notes)
+            RESULT_CACHE.put_arrays(plot_data_key(analysis_id), plot_data)
+        images = render_plots(plot_data, plots, image_format, timer=timer, threads=threads)
+
+        feedback = build_feedback(analysis_id, metrics, images, reference_notes)
+        if series:
+            feedback["series"] = compact_series(plot_data)
+
+        if key is not None:
+            RESULT_CACHE.put(key, feedback)
+
+        summary = timer.finish(audio_seconds)
+        if timings:
+            feedback = dict(feedback, debug=dict(summary, vad=vad_summary) if vad_summary else summary)
 
         return feedback
 
@@ -0,0 +1,209 @@
+"""
+Batch analysis of many recordings.
+
+Used by POST /analyze/batch and from the command line to (re-)score whole
+folders:
+
+    python -m analysis.batch audio_samples --reference C4,D4,E4 --workers 4
+
+Each file is analyzed in a worker process (decode, features and the score
+model are loaded once per worker and reused for every file it handles).
+Per-file records are written as NDJSON, one line per file as soon as it
+finishes, and a summary CSV is written at the end.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import startup
+from .analyzer import analyze_singing_ai
+from .cache import _to_json
+from .model import get_advanced_model
+from .pitch import F0_METHODS, VOICE_RANGES
+from .references import compile_reference
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".webm", ".ogg", ".flac", ".mp4", ".aac")
+
+SUMMARY_FIELDS = (
+    "file", "status", "pitch_score", "breath_score", "diction_score",
+    "total_score", "analysis_id", "seconds", "error",
+)
+
+
+def find_audio_files(directory):
+    """Audio files directly inside `directory`, sorted by name."""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(AUDIO_EXTENSIONS) and os.path.isfile(os.path.join(directory, name))
+    )
+
+
+def parse_reference_map(value):
+    """
+    Per-file reference notes from a JSON object mapping file name to either
+    a list of notes or a comma-separated string, compiled up front (see
+    analysis.references). Raises ValueError for any other value or an
+    unknown note.
+    """
+    if not value:
+        return {}
+    mapping = json.loads(value)
+    if not isinstance(mapping, dict):
+        raise ValueError("Reference map must be a JSON object of file name -> notes")
+    parsed = {}
+    for name, notes in mapping.items():
+        if isinstance(notes, str):
+            notes = [note.strip() for note in notes.split(",") if note.strip()]
+        elif not isinstance(notes, list) or not all(isinstance(note, str) for note in notes):
+            raise ValueError(f"Notes for {name!r} must be a list of note names or a comma-separated string")
+        try:
+            parsed[name] = compile_reference(notes) if notes else None
+        except ValueError as e:
+            raise ValueError(f"Notes for {name!r}: {e}") from e
+    return parsed
+
+
+def analyze_file(path, name=None, reference_notes=None, **options):
+    """
+    Analyze one file for a batch and return its record:
+    {"file", "status": "ok"|"error", "seconds", "result" or "error"}.
+    Failures are captured in the record so one bad take does not stop the batch.
+    """
+    start = time.perf_counter()
+    record = {"file": name or os.path.basename(path)}
+    try:
+        record["result"] = analyze_singing_ai(path, reference_notes=reference_notes, **options)
+        record["status"] = "ok"
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def summary_row(record):
+    result = record.get("result") or {}
+    row = {field: result.get(field) for field in SUMMARY_FIELDS}
+    row.update(file=record["file"], status=record["status"],
+               seconds=record.get("seconds"), error=record.get("error"))
+    return row
+
+
+def write_summary_csv(records, out):
+    """Write one summary row per record to the text stream `out`."""
+    writer = csv.DictWriter(out, fieldnames=SUMMARY_FIELDS)
+    writer.writeheader()
+    for record in sorted(records, key=lambda r: r["file"]):
+        writer.writerow(summary_row(record))
+
+
+def summary_csv(records):
+    buf = io.StringIO()
+    write_summary_csv(records, buf)
+    return buf.getvalue()
+
+
+def to_ndjson(record):
+    return json.dumps(record, default=_to_json) + "\n"
+
+
+def _init_worker():
+    # Analyzer diagnostics are printed; keep stdout clean for NDJSON output
+    sys.stdout = sys.stderr
+    get_advanced_model()
+
+
+def run_batch(paths, reference_notes=None, reference_map=None, workers=None, **options):
+    """
+    Analyze `paths` on `workers` processes (default: CPU count; 0 runs
+    in-process) and yield each file's record as soon as it finishes.
+    reference_map maps file names to notes and overrides reference_notes.
+    """
+    reference_map = reference_map or {}
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    def references_for(path):
+        return reference_map.get(os.path.basename(path), reference_notes)
+
+    if workers <= 0:
+        for path in paths:
+            yield analyze_file(path, reference_notes=references_for(path), **options)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, max(1, len(paths))), mp_context=context,
+                             initializer=_init_worker) as executor:
+        futures = [
+            executor.submit(analyze_file, path, reference_notes=references_for(path), **options)
+            for path in paths
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m analysis.batch",
+                                     description="Analyze every recording in a directory.")
+    parser.add_argument("directory", help="directory of audio files")
+    parser.add_argument("--reference", help="comma-separated reference notes used for every file")
+    parser.add_argument("--references", help="JSON file mapping file name to reference notes")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: CPU count, 0 = in-process)")
+    parser.add_argument("--f0-method", default="pyin", choices=F0_METHODS, help="pitch tracker")
+    parser.add_argument("--voice-type", default=None, choices=sorted(VOICE_RANGES),
+                        help="voice type used to narrow the pitch range")
+    parser.add_argument("--no-cache", action="store_true", help="ignore cached results")
+    parser.add_argument("--output", help="NDJSON output file (default: stdout)")
+    parser.add_argument("--summary", default="batch_summary.csv", help="summary CSV path")
+    args = parser.parse_args(argv)
+    # Inherited by the worker processes, so they share the on-disk JIT cache
+    startup.configure()
+
+    paths = find_audio_files(args.directory)
+    if not paths:
+        parser.error(f"no audio files found in {args.directory}")
+
+    # Bad options are rejected before any file is decoded
+    reference_notes = None
+    reference_map = {}
+    try:
+        if args.reference:
+            reference_notes = compile_reference(
+                [note.strip() for note in args.reference.split(",") if note.strip()]) or None
+        if args.references:
+            with open(args.references) as f:
+                reference_map = parse_reference_map(f.read())
+    except ValueError as e:
+        parser.error(f"invalid reference notes: {e}")
+
+    start = time.perf_counter()
+    records = []
+    with contextlib.ExitStack() as stack:
+        out = stack.enter_context(open(args.output, "w")) if args.output else sys.stdout
+        stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        for record in run_batch(paths, reference_notes, reference_map, workers=args.workers,
+                                f0_method=args.f0_method, voice_type=args.voice_type,
+                                use_cache=not args.no_cache, plots=()):
+            records.append(record)
+            out.write(to_ndjson(record))
+            out.flush()
+
+    with open(args.summary, "w", newline="") as f:
+        write_summary_csv(records, f)
+
+    failed = sum(record["status"] != "ok" for record in records)
+    print(f"Analyzed {len(records)} files ({failed} failed) in {time.perf_counter() - start:.1f}s; "
+          f"summary written to {args.summary}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
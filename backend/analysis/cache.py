@@ -0,0 +1,226 @@
+"""
+Content-addressed cache for analysis results.
+
+Keys hash the decoded PCM, the normalized reference notes, the analysis
+options and ANALYZER_VERSION, so re-uploads of the same take (or client
+retries) return the stored feedback without re-running pitch tracking or
+plotting. Bump ANALYZER_VERSION whenever scoring or plotting changes to
+invalidate every stored result.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from . import events
+from .references import compile_reference
+
+ANALYZER_VERSION = "2026.10.5"
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def normalize_reference_notes(reference_notes):
+    """Canonical form of a note list: MIDI numbers, so "c4", "C4" and "B#3" match."""
+    if not reference_notes:
+        return []
+    try:
+        return [round(float(midi), 2) for midi in compile_reference(reference_notes).midi]
+    except ValueError:
+        return [str(note).strip().upper() for note in reference_notes]
+
+
+def _options_json(sr, reference_notes, options, version):
+    fields = {
+        "sr": int(sr),
+        "reference_notes": normalize_reference_notes(reference_notes),
+        "options": options or {},
+        "version": version,
+    }
+    # Note durations shape the alignment grid
+    durations = getattr(reference_notes, "durations", None)
+    if durations is not None:
+        fields["reference_durations"] = durations
+    return json.dumps(fields, sort_keys=True, default=_to_json).encode("utf-8")
+
+
+def cache_key(y, sr, reference_notes=None, options=None, version=ANALYZER_VERSION):
+    """Hash of the decoded waveform plus everything else that shapes the result."""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(y, dtype=np.float32).tobytes())
+    digest.update(_options_json(sr, reference_notes, options, version))
+    return digest.hexdigest()
+
+
+def file_cache_key(content_digest, sr, reference_notes=None, options=None, version=ANALYZER_VERSION):
+    """Like cache_key, for callers that never hold the decoded waveform (streaming analysis)."""
+    digest = hashlib.sha256()
+    digest.update(b"file:" + content_digest.encode("ascii"))
+    digest.update(_options_json(sr, reference_notes, options, version))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier LRU cache of analysis results.
+
+    Entries are either feedback JSON (get/put) or NumPy array bundles such
+    as plot data (get_arrays/put_arrays). The memory tier holds the
+    serialized bytes up to `max_bytes`; the optional disk
+    tier keeps one file per key under `disk_dir` up to `disk_max_bytes`,
+    evicting the least recently used files. The disk tier is safe to share
+    between worker processes (writes are atomic renames).
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_bytes=int(float(os.getenv("RESULT_CACHE_MB", "64")) * 1024 * 1024),
+            disk_dir=os.getenv("RESULT_CACHE_DIR") or None,
+            disk_max_bytes=int(float(os.getenv("RESULT_CACHE_DISK_MB", "512")) * 1024 * 1024),
+        )
+
+    def get(self, key):
+        data, tier = self._get_raw(key, ".json")
+        # Counted under the lock stats() reads them with; get() runs on many threads
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if data is None:
+            events.emit("result_cache", outcome="miss")
+            return None
+        events.emit("result_cache", outcome=f"hit_{tier}")
+        return json.loads(data)
+
+    def put(self, key, value):
+        self._put_raw(key, ".json", json.dumps(value, default=_to_json).encode("utf-8"))
+
+    def get_arrays(self, key):
+        """Return a dict of NumPy arrays stored with put_arrays, or None."""
+        data, _ = self._get_raw(key, ".npz")
+        if data is None:
+            return None
+        with np.load(io.BytesIO(data)) as bundle:
+            return {name: bundle[name] for name in bundle.files}
+
+    def put_arrays(self, key, arrays):
+        buf = io.BytesIO()
+        np.savez(buf, **arrays)
+        self._put_raw(key, ".npz", buf.getvalue())
+
+    def _get_raw(self, key, suffix):
+        entry_key = key + suffix
+        with self._lock:
+            data = self._entries.get(entry_key)
+            if data is not None:
+                self._entries.move_to_end(entry_key)
+                return data, "memory"
+        data = self._disk_get(entry_key)
+        if data is not None:
+            self._memory_put(entry_key, data)
+        return data, "disk"
+
+    def _put_raw(self, key, suffix, data):
+        self._memory_put(key + suffix, data)
+        self._disk_put(key + suffix, data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "memory_bytes": self._size,
+            }
+
+    def _memory_put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key)
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used
+            return data
+        except FileNotFoundError:
+            return None
+
+    def _disk_put(self, key, data):
+        if not self.disk_dir or len(data) > self.disk_max_bytes:
+            return
+        tmp_path = os.path.join(self.disk_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._disk_path(key))
+        self._disk_evict()
+
+    def _disk_evict(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.startswith("."):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+RESULT_CACHE = ResultCache.from_env()
@@ -0,0 +1,216 @@
+import hashlib
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import soundfile as sf
+import soxr
+import librosa
+
+TARGET_SR = 22050
+
+# MP4-family containers may keep their index at the end of the file, so
+# ffmpeg needs a seekable input rather than a pipe
+SEEKABLE_INPUT_EXTENSIONS = (".m4a", ".mp4", ".mov", ".3gp")
+
+
+class DecodeError(RuntimeError):
+    """Raised when an upload cannot be decoded to PCM."""
+
+
+class DecodeCache:
+    """LRU of decoded waveforms keyed by (content hash, sample rate), bounded by total bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, y, sr):
+        if y.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[0].nbytes
+            self._entries[key] = (y, sr)
+            self._size += y.nbytes
+            while self._size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+
+
+DECODE_CACHE = DecodeCache(int(float(os.getenv("DECODE_CACHE_MB", "256")) * 1024 * 1024))
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_audio(path, sr=TARGET_SR):
+    """
+    Decode stage shared by the API and direct analyze_singing_ai callers.
+
+    Returns (y, sr) for `path`, memoized by the file's content hash so the
+    same upload is never decoded or resampled twice in a process. The
+    returned array is read-only because it may be shared between callers.
+    """
+    key = (file_digest(path), sr)
+    cached = DECODE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    y, sr = decode_audio(path, sr)
+    y.flags.writeable = False
+    DECODE_CACHE.put(key, y, sr)
+    return y, sr
+
+
+def decode_audio(path, sr=TARGET_SR):
+    """
+    Decode an audio file to a mono float32 waveform at `sr`.
+
+    WAV files are read directly with soundfile. Everything else is piped
+    through ffmpeg, which writes raw float32 PCM to stdout that is wrapped
+    in a NumPy array as-is, with no intermediate WAV file.
+
+    Returns (y, sr).
+    """
+    if path.lower().endswith(".wav"):
+        return read_wav(path, sr)
+    return ffmpeg_decode(path, sr)
+
+
+def read_wav(path, sr=TARGET_SR):
+    try:
+        y, native_sr = sf.read(path, dtype="float32", always_2d=False)
+    except Exception as e:
+        raise DecodeError(f"Could not read WAV file: {e}") from e
+
+    if y.ndim > 1:
+        y = librosa.to_mono(y.T)
+    if native_sr != sr:
+        y = librosa.resample(y, orig_sr=native_sr, target_sr=sr)
+    return y, sr
+
+
+def _ffmpeg_command(path, sr):
+    seekable = os.path.splitext(path)[1].lower() in SEEKABLE_INPUT_EXTENSIONS
+    command = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", path if seekable else "pipe:0",
+        "-f", "f32le", "-acodec", "pcm_f32le",
+        "-ac", "1", "-ar", str(sr),
+        "pipe:1",
+    ]
+    return command, seekable
+
+
+def ffmpeg_decode(path, sr=TARGET_SR):
+    command, seekable = _ffmpeg_command(path, sr)
+    try:
+        with open(path, "rb") as source:
+            result = subprocess.run(
+                command,
+                stdin=subprocess.DEVNULL if seekable else source,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                check=True
+            )
+    except FileNotFoundError as e:
+        if not os.path.exists(path):
+            raise
+        raise DecodeError("ffmpeg is not installed") from e
+    except subprocess.CalledProcessError as e:
+        raise DecodeError(f"Audio conversion failed: {e.stderr.decode(errors='replace')}") from e
+
+    y = np.frombuffer(result.stdout, dtype=np.float32)
+    if y.size == 0:
+        raise DecodeError("Audio conversion produced no samples")
+    return y, sr
+
+
+def stream_audio(path, sr=TARGET_SR, block_size=TARGET_SR * 30):
+    """
+    Yield the mono float32 waveform at `sr` in blocks of about `block_size`
+    samples, without holding the whole recording in memory. The blocks
+    concatenate to the same samples decode_audio returns (up to resampler
+    boundary effects for WAVs at another rate).
+    """
+    if path.lower().endswith(".wav"):
+        yield from _stream_wav(path, sr, block_size)
+    else:
+        yield from _stream_ffmpeg(path, sr, block_size)
+
+
+def _stream_wav(path, sr, block_size):
+    try:
+        f = sf.SoundFile(path)
+    except Exception as e:
+        raise DecodeError(f"Could not read WAV file: {e}") from e
+
+    with f:
+        resampler = None
+        if f.samplerate != sr:
+            resampler = soxr.ResampleStream(f.samplerate, sr, 1, dtype="float32")
+        for block in f.blocks(blocksize=block_size, dtype="float32", always_2d=True):
+            # Same downmix as librosa.to_mono
+            y = block.mean(axis=1, dtype=np.float32) if block.shape[1] > 1 else block[:, 0]
+            if resampler is not None:
+                y = resampler.resample_chunk(y)
+            if y.size:
+                yield y
+        if resampler is not None:
+            tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+            if tail.size:
+                yield tail
+
+
+def _stream_ffmpeg(path, sr, block_size):
+    command, seekable = _ffmpeg_command(path, sr)
+    with open(path, "rb") as source:
+        try:
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL if seekable else source,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except FileNotFoundError as e:
+            raise DecodeError("ffmpeg is not installed") from e
+
+    produced = 0
+    try:
+        while True:
+            data = process.stdout.read(block_size * 4)
+            if not data:
+                break
+            produced += len(data)
+            yield np.frombuffer(data, dtype=np.float32)
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise DecodeError(f"Audio conversion failed: {stderr.decode(errors='replace')}")
+        if produced == 0:
+            raise DecodeError("Audio conversion produced no samples")
+    finally:
+        # The consumer may stop early; never leave ffmpeg running
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
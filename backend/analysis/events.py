@@ -0,0 +1,50 @@
+"""
+Lightweight event channel from analysis code to the API process.
+
+Analysis code calls emit(kind, **payload). In the API process, subscribers
+registered with subscribe() receive events directly; inside pool workers the
+sink is swapped for a multiprocessing queue (see worker_pool) whose events are
+re-dispatched in the API process. With no sink installed emit() is a no-op,
+so library callers pay nothing.
+"""
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+_sink = None
+_subscribers = defaultdict(list)
+_lock = threading.Lock()
+
+
+def set_sink(sink):
+    """Route emitted events to `sink(kind, payload)` (None disables emitting)."""
+    global _sink
+    _sink = sink
+
+
+def emit(kind, **payload):
+    if _sink is not None:
+        _sink(kind, payload)
+
+
+def subscribe(kind, handler):
+    with _lock:
+        _subscribers[kind].append(handler)
+
+
+def dispatch(kind, payload):
+    """Deliver an event to the subscribers registered in this process."""
+    with _lock:
+        handlers = list(_subscribers.get(kind, ()))
+    for handler in handlers:
+        try:
+            handler(**payload)
+        except Exception as e:
+            logger.warning(f"Event handler for {kind!r} failed: {e}")
+
+
+def install_local_dispatch():
+    """Deliver emitted events to this process's subscribers synchronously."""
+    set_sink(dispatch)
@@ -0,0 +1,103 @@
+from functools import cached_property
+
+import numpy as np
+import librosa
+
+
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+
+
+class FeatureContext:
+    """
+    Per-request spectral feature plane.
+
+    Every spectral feature used by the diction metrics and the diction plot is
+    derived from the same STFT, so it is computed once here and shared instead
+    of letting each librosa feature function run its own FFT pass. Parameters
+    match the librosa defaults the analyzer used before, so scores are unchanged.
+    """
+
+    def __init__(self, y, sr, n_fft=N_FFT, hop_length=HOP_LENGTH):
+        self.y = y
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+
+    @cached_property
+    def stft(self):
+        """Complex STFT (librosa defaults: hann window, centered, zero padded)."""
+        return librosa.stft(self.y, n_fft=self.n_fft, hop_length=self.hop_length)
+
+    @cached_property
+    def magnitude(self):
+        return np.abs(self.stft)
+
+    @cached_property
+    def power(self):
+        return self.magnitude ** 2
+
+    @cached_property
+    def mel(self):
+        """Mel power spectrogram computed from the shared STFT."""
+        return librosa.feature.melspectrogram(S=self.power, sr=self.sr, n_fft=self.n_fft, n_mels=N_MELS)
+
+    @cached_property
+    def log_mel(self):
+        """Log-power mel spectrogram as used by onset_strength and mfcc."""
+        return librosa.power_to_db(self.mel)
+
+    @cached_property
+    def zcr(self):
+        return librosa.feature.zero_crossing_rate(
+            self.y, frame_length=self.n_fft, hop_length=self.hop_length
+        )[0]
+
+    @cached_property
+    def onset_env_median(self):
+        return librosa.onset.onset_strength(
+            S=self.log_mel, sr=self.sr, hop_length=self.hop_length, aggregate=np.median
+        )
+
+    @cached_property
+    def onset_env_mean(self):
+        return librosa.onset.onset_strength(
+            S=self.log_mel, sr=self.sr, hop_length=self.hop_length
+        )
+
+    @cached_property
+    def hpss(self):
+        """Harmonic/percussive split of the shared STFT (complex components)."""
+        return librosa.decompose.hpss(self.stft)
+
+    @cached_property
+    def hpss_magnitude(self):
+        """Harmonic/percussive magnitudes, without building complex components."""
+        if "hpss" in self.__dict__:
+            H, P = self.hpss
+            return np.abs(H), np.abs(P)
+        return librosa.decompose.hpss(self.magnitude)
+
+    def mean_energy(self, S):
+        """
+        Mean per-sample energy of the signal a magnitude spectrogram represents.
+
+        Uses Parseval's relation on the one-sided hann-windowed STFT, so
+        ``mean_energy(|stft(x)|)`` approximates ``np.mean(x**2)`` without an
+        inverse transform.
+        """
+        return float(np.mean(self.frame_energy(S)) / self.energy_scale)
+
+    def frame_energy(self, S):
+        """Unscaled per-frame energy of a one-sided magnitude spectrogram (see mean_energy)."""
+        weights = np.full(S.shape[0], 2.0)
+        weights[0] = 1.0
+        if self.n_fft % 2 == 0:
+            weights[-1] = 1.0
+        return weights @ (S.astype(np.float64) ** 2)
+
+    @property
+    def energy_scale(self):
+        window = librosa.filters.get_window("hann", self.n_fft, fftbins=True)
+        return self.n_fft * np.sum(window ** 2)
@@ -0,0 +1,208 @@
+"""
+Frame-incremental pitch and energy tracking for live feedback (/ws/live).
+
+A LiveSession is fed PCM as the browser records it. Every hop that has a
+complete analysis frame is processed immediately: YIN (the same
+_yin_block the batch tracker uses), RMS, the deviation from the current
+reference note and running breath indicators. Frames are centered and
+zero padded exactly like analyze_singing_ai's 2048/512 framing, so the f0
+and RMS tracks collected during the session are used as-is for the final
+score (analyzer.analyze_live_take) and only diction is computed at the end.
+"""
+import numpy as np
+import librosa
+import soxr
+
+from .features import HOP_LENGTH, N_FFT
+from .pitch import _yin_block, pitch_range_for, yin_lags
+from .references import compile_reference
+
+LIVE_SR = 22050
+
+# Same voicing rules as pitch.yin_track, with the loudness reference being
+# the loudest frame so far instead of the loudest frame of the whole take
+TROUGH_THRESHOLD = 0.1
+VOICING_THRESHOLD = 0.25
+ENERGY_FLOOR_DB = -40.0
+
+# Frame levels are binned at 0.1 dB to track the running 20th percentile the
+# breath analysis uses as its dropout threshold
+LEVEL_EDGES_DB = np.arange(-120.0, 0.05, 0.1)
+DROPOUT_PERCENTILE = 20
+
+
+class LiveSession:
+    """Incremental pitch/RMS tracker for one live take."""
+
+    def __init__(self, input_sr=LIVE_SR, reference_notes=None, voice_type=None,
+                 frame_length=N_FFT, hop_length=HOP_LENGTH):
+        self.sr = LIVE_SR
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.reference_notes = reference_notes
+        self.fmin, self.fmax = pitch_range_for(reference_notes, voice_type)
+        self._win, self._min_period, self._max_period = yin_lags(self.sr, self.fmin, self.fmax, frame_length)
+        self._reference_midi = compile_reference(reference_notes).midi if reference_notes else None
+        self.current_note = None
+
+        self._resampler = None
+        if input_sr != self.sr:
+            self._resampler = soxr.ResampleStream(input_sr, self.sr, 1, dtype="float32")
+
+        # Centered framing: frame k covers samples [k*hop - n/2, k*hop + n/2)
+        self._buffer = np.zeros(frame_length // 2, dtype=np.float32)
+        self._buffer_start = -(frame_length // 2)
+        self._chunks = []
+        self._closed = False
+        self.n_samples = 0
+        self.n_frames = 0
+
+        self._f0 = []
+        self._rms = []
+        self._peak_rms = 1e-10
+        self._level_counts = np.zeros(len(LEVEL_EDGES_DB) + 1, dtype=np.int64)
+        self._dropouts = 0
+        self._phrase_frames = 0
+        self._longest_phrase_frames = 0
+        self._rms_mean = 0.0
+        self._rms_m2 = 0.0
+
+    @property
+    def duration(self):
+        return self.n_samples / self.sr
+
+    def set_reference_note(self, note):
+        """Measure cents against `note` (e.g. "E4") until changed; None uses the nearest reference note."""
+        self.current_note = librosa.note_to_midi(note) if note else None
+
+    def push(self, samples):
+        """Add mono PCM at the input rate; returns one feedback dict per completed frame."""
+        samples = np.asarray(samples, dtype=np.float32)
+        if self._resampler is not None:
+            samples = self._resampler.resample_chunk(samples)
+        return self._add(samples)
+
+    def close(self):
+        """End of input: flush the resampler and the trailing (zero padded) frames."""
+        if self._closed:
+            return []
+        tail = np.zeros(0, dtype=np.float32)
+        if self._resampler is not None:
+            tail = self._resampler.resample_chunk(tail, last=True)
+        frames = self._add(tail)
+        self._closed = True
+        # librosa pads the end with zeros too; a take of N samples has 1 + N // hop frames
+        pad = np.zeros(self.frame_length // 2, dtype=np.float32)
+        frames += self._process(pad, limit=1 + self.n_samples // self.hop_length)
+        return frames
+
+    def take(self):
+        """(y, sr, f0, rms) of the whole take, for analyzer.analyze_live_take."""
+        y = np.concatenate(self._chunks) if self._chunks else np.zeros(0, dtype=np.float32)
+        return y, self.sr, np.array(self._f0, dtype=float), np.array(self._rms, dtype=np.float32)
+
+    def breath_indicators(self):
+        """Running breath/dropout indicators over the take so far."""
+        frames = max(self.n_frames, 1)
+        variance = self._rms_m2 / frames
+        return {
+            "phrase_seconds": round(self._phrase_frames * self.hop_length / self.sr, 2),
+            "longest_phrase_seconds": round(self._longest_phrase_frames * self.hop_length / self.sr, 2),
+            "dropout_ratio": round(self._dropouts / frames, 3),
+            "energy_consistency": round(float(np.clip(10 - variance * 100, 0, 10)), 1),
+        }
+
+    def _add(self, samples):
+        if self._closed:
+            raise RuntimeError("Live session is closed")
+        if samples.size:
+            self._chunks.append(samples)
+            self.n_samples += samples.size
+        return self._process(samples)
+
+    def _process(self, samples, limit=None):
+        self._buffer = np.concatenate([self._buffer, samples]) if samples.size else self._buffer
+        buffer_end = self._buffer_start + len(self._buffer)
+        half = self.frame_length // 2
+
+        # Frames whose whole window has arrived
+        ready = (buffer_end - half) // self.hop_length + 1 - self.n_frames
+        if limit is not None:
+            ready = min(ready, limit - self.n_frames)
+        if ready <= 0:
+            return []
+
+        offset = self.n_frames * self.hop_length - half - self._buffer_start
+        span = self._buffer[offset:offset + (ready - 1) * self.hop_length + self.frame_length]
+        frames = np.lib.stride_tricks.sliding_window_view(span, self.frame_length)[::self.hop_length]
+        frames = frames.astype(np.float64)
+
+        period, trough = _yin_block(frames, self._win, self._min_period, self._max_period, TROUGH_THRESHOLD)
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+
+        results = [self._frame_feedback(sr_period, depth, level)
+                   for sr_period, depth, level in zip(self.sr / period, trough, rms)]
+
+        # Keep only what the next frame needs
+        next_start = self.n_frames * self.hop_length - half
+        self._buffer = self._buffer[next_start - self._buffer_start:]
+        self._buffer_start = next_start
+        return results
+
+    def _frame_feedback(self, f0, aperiodicity, rms):
+        index = self.n_frames
+        self.n_frames += 1
+
+        self._peak_rms = max(self._peak_rms, float(rms))
+        rms_db = 20.0 * np.log10(max(float(rms), 1e-10) / self._peak_rms)
+        voiced = (aperiodicity < VOICING_THRESHOLD and rms_db > ENERGY_FLOOR_DB
+                  and self.fmin <= f0 <= self.fmax)
+        f0 = float(f0) if voiced else float("nan")
+        self._f0.append(f0)
+        self._rms.append(float(rms))
+
+        # Running breath indicators
+        level_db = 20.0 * np.log10(max(float(rms), 1e-10))
+        self._level_counts[np.searchsorted(LEVEL_EDGES_DB, level_db)] += 1
+        dropout = level_db < self._dropout_threshold_db()
+        self._dropouts += int(dropout)
+        self._phrase_frames = self._phrase_frames + 1 if voiced else 0
+        self._longest_phrase_frames = max(self._longest_phrase_frames, self._phrase_frames)
+        delta = float(rms) - self._rms_mean
+        self._rms_mean += delta / self.n_frames
+        self._rms_m2 += delta * (float(rms) - self._rms_mean)
+
+        target, cents = None, None
+        if voiced:
+            midi = 69.0 + 12.0 * np.log2(f0 / 440.0)
+            target_midi = self._target_midi(midi)
+            target = librosa.midi_to_note(target_midi, unicode=False)
+            cents = round((midi - target_midi) * 100.0, 1)
+
+        return {
+            "frame": index,
+            "time": round(index * self.hop_length / self.sr, 3),
+            "f0": round(f0, 2) if voiced else None,
+            "target": target,
+            "cents": cents,
+            "rms": round(float(rms), 5),
+            "dropout": bool(dropout),
+        }
+
+    def _target_midi(self, midi):
+        if self.current_note is not None:
+            return self.current_note
+        if self._reference_midi is not None:
+            return self._reference_midi[np.argmin(np.abs(self._reference_midi - midi))]
+        return round(midi)
+
+    def _dropout_threshold_db(self):
+        cumulative = np.cumsum(self._level_counts)
+        rank = DROPOUT_PERCENTILE / 100.0 * cumulative[-1]
+        # Interpolate inside the bin holding the percentile (bin i covers (edge[i-1], edge[i]])
+        index = int(np.searchsorted(cumulative, rank))
+        if index == 0 or index >= len(LEVEL_EDGES_DB):
+            return -np.inf if index == 0 else LEVEL_EDGES_DB[-1]
+        below = cumulative[index - 1]
+        fraction = (rank - below) / max(cumulative[index] - below, 1)
+        return LEVEL_EDGES_DB[index - 1] + fraction * (LEVEL_EDGES_DB[index] - LEVEL_EDGES_DB[index - 1])
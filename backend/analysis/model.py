@@ -0,0 +1,169 @@
+"""
+Score model registry.
+
+The total-score model is loaded (and validated) once per process from a path
+anchored to the backend package rather than the working directory, and
+exposed through a batch predict_total API. If the file is missing or
+invalid, the model is retrained in memory; nothing is written at request
+time, so concurrent workers never race on the joblib file.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+import joblib
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = Path(os.getenv(
+    "SCORE_MODEL_PATH",
+    Path(__file__).resolve().parent.parent / "advanced_score_model.joblib"
+))
+# Model inputs: [pitch_score, breath_score, diction_score]
+N_FEATURES = 3
+
+_model = None
+_version = None
+_source = None
+_lock = threading.Lock()
+
+
+def train_advanced_model(path=None):
+    """Fit the total-score model on the built-in scenarios; save it atomically to `path` if given."""
+    from sklearn.linear_model import LinearRegression
+
+    # More comprehensive training data with realistic singing scenarios
+    X = np.array([
+        # Perfect singing
+        [10, 10, 10],
+        [9.5, 9.5, 9.5],
+        [9, 9, 9],
+        
+        # Good singing with minor issues
+        [8, 8, 8],
+        [8, 7, 8],
+        [7, 8, 7],
+        [7, 7, 8],
+        
+        # Average singing
+        [7, 6, 7],
+        [6, 7, 6],
+        [6, 6, 7],
+        [6, 6, 6],
+        
+        # Below average
+        [5, 5, 5],
+        [5, 4, 5],
+        [4, 5, 4],
+        [4, 4, 5],
+        
+        # Poor singing
+        [3, 3, 3],
+        [3, 2, 3],
+        [2, 3, 2],
+        [2, 2, 3],
+        
+        # Very poor
+        [1, 1, 1],
+        [1, 0, 1],
+        [0, 1, 0]
+    ])
+    
+    # Weighted total scores (pitch weighted more heavily)
+    y = np.array([
+        10.0, 9.8, 9.5,  # Perfect
+        8.2, 7.8, 7.6, 7.4,  # Good
+        6.8, 6.6, 6.4, 6.0,  # Average
+        5.2, 4.8, 4.6, 4.4,  # Below average
+        3.2, 2.8, 2.6, 2.4,  # Poor
+        1.2, 0.8, 0.6       # Very poor
+    ])
+    
+    model = LinearRegression()
+    model.fit(X, y)
+    if path is not None:
+        save_model(model, path)
+    return model
+
+
+def save_model(model, path=MODEL_PATH):
+    """Write the model via a temporary file and rename, so readers never see a partial file."""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def validate_model(model):
+    """Raise ValueError unless `model` maps N_FEATURES scores to finite totals."""
+    if not hasattr(model, "predict"):
+        raise ValueError("Score model has no predict method")
+    n_features = getattr(model, "n_features_in_", N_FEATURES)
+    if n_features != N_FEATURES:
+        raise ValueError(f"Score model expects {n_features} features, not {N_FEATURES}")
+    probe = np.asarray(model.predict(np.full((1, N_FEATURES), 5.0)), dtype=float)
+    if probe.shape != (1,) or not np.all(np.isfinite(probe)):
+        raise ValueError("Score model returned an invalid prediction")
+
+
+def _fingerprint(model):
+    """
+    Short hash of a fitted model: its coefficients for linear models (so
+    their fingerprints stay stable across pickling), else its pickled bytes.
+    """
+    if hasattr(model, "coef_") and hasattr(model, "intercept_"):
+        params = np.concatenate([np.ravel(model.coef_), np.ravel(model.intercept_)]).astype(np.float64)
+        data = params.tobytes()
+    else:
+        data = pickle.dumps(model, protocol=4)
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def load_model(path=MODEL_PATH):
+    """Load and validate the model at `path`, falling back to an in-memory retrain."""
+    global _model, _version, _source
+    with _lock:
+        try:
+            model = joblib.load(path)
+            validate_model(model)
+            version = _fingerprint(model)
+            source = "file"
+        except Exception as e:
+            logger.warning(f"Could not load score model from {path} ({e}); training in memory")
+            model = train_advanced_model()
+            version = _fingerprint(model)
+            source = "trained"
+        _model, _version, _source = model, version, source
+        return model
+
+
+def get_advanced_model():
+    """The process-wide score model, loaded on first use."""
+    if _model is None:
+        load_model()
+    return _model
+
+
+def model_version():
+    """Short fingerprint of the loaded model's coefficients."""
+    get_advanced_model()
+    return _version
+
+
+def model_info():
+    get_advanced_model()
+    return {"version": _version, "source": _source, "path": str(MODEL_PATH)}
+
+
+def predict_total(scores_matrix):
+    """
+    Predict total scores for a batch of [pitch, breath, diction] rows.
+    Returns a float array clipped to the 0-10 scale.
+    """
+    scores = np.asarray(scores_matrix, dtype=float).reshape(-1, N_FEATURES)
+    return np.clip(get_advanced_model().predict(scores), 0, 10)
@@ -0,0 +1,249 @@
+"""
+Segment-parallel pYIN for long recordings.
+
+librosa.pyin runs on one core, so a 10-minute take keeps a worker busy for
+tens of seconds. pyin() here cuts the recording at low-energy frames into
+one segment per pitch worker. Each segment is tracked in a separate
+process with OVERLAP_FRAMES of audio on either side, so the Viterbi pass
+sees the same neighbourhood near the cuts as it would in one pass. The
+waveform is copied once into shared memory and each task only carries
+the block's name and its sample range.
+
+The tracks are then stitched: in the overlap around each cut, the switch
+from one segment to the next happens at the frame nearest the cut where
+both tracks agree, i.e. both are unvoiced or both are within
+AGREE_CENTS. Because cuts are placed in the quietest frames, that is
+nearly always the cut itself.
+
+pyin_ranges() does the same for several sample ranges of one recording
+(the voiced segments analysis.vad finds): every range is cut the same
+way and all their pieces share the pool, so a long take with many pauses
+is spread over the workers as well.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory, util
+
+import numpy as np
+import librosa
+
+# Recordings shorter than this are tracked in one pass
+PARALLEL_MIN_SECONDS = float(os.getenv("PITCH_PARALLEL_MIN_SECONDS", "60"))
+
+# No segment is shorter than this, however many workers there are
+MIN_SEGMENT_SECONDS = 15
+
+# Extra frames tracked on each side of a segment (~1.5 s at 22.05 kHz, hop 512)
+OVERLAP_FRAMES = 64
+
+# How far from the evenly spaced position a cut may move to find a quiet frame
+CUT_SEARCH_FRAMES = 86
+
+# Tracks within this many cents count as agreeing when stitching
+AGREE_CENTS = 1.0
+
+
+def pitch_workers():
+    """
+    Processes for segment-parallel pyin (PITCH_WORKERS). The default
+    "auto" shares the CPUs among the analysis workers
+    (cpu_count // ANALYSIS_WORKERS); 1 turns parallel tracking off.
+    """
+    from .startup import cpus_per_worker
+
+    setting = os.getenv("PITCH_WORKERS", "auto")
+    if setting != "auto":
+        return max(1, int(setting))
+    return cpus_per_worker()
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+_finalizer = None
+
+
+def _init_pitch_worker():
+    from . import startup
+
+    # Shares the on-disk JIT cache, so pyin's Viterbi kernel isn't recompiled
+    startup.configure()
+
+
+def get_pool(workers):
+    """The process pool for segment tasks, started on first use."""
+    global _pool, _pool_workers, _finalizer
+    replaced = None
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            replaced = _pool
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                        initializer=_init_pitch_worker)
+            _pool_workers = workers
+        if _finalizer is None:
+            # A finalizer rather than atexit: inside an analysis worker,
+            # multiprocessing joins child processes before atexit handlers
+            # run. It must also run before the pool's queues close themselves
+            # (exitpriority 10), or the workers never see the shutdown. It is
+            # not tied to a pool object, so replacing or dropping the pool
+            # never calls it.
+            _finalizer = util.Finalize(None, shutdown_pool, exitpriority=100)
+        pool = _pool
+    if replaced is not None:
+        replaced.shutdown(wait=False, cancel_futures=True)
+    return pool
+
+
+def shutdown_pool(wait=True):
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def _warm_pitch_worker():
+    """Load librosa's pyin and its JIT-compiled Viterbi kernel in a pitch worker."""
+    librosa.pyin(np.zeros(4096, dtype=np.float32), fmin=65.0, fmax=2093.0, sr=22050)
+    return os.getpid()
+
+
+def warm_up(workers=None):
+    """Start the pitch workers and load pyin in each, if parallel tracking is enabled."""
+    workers = pitch_workers() if workers is None else workers
+    if workers > 1:
+        pool = get_pool(workers)
+        for future in [pool.submit(_warm_pitch_worker) for _ in range(workers)]:
+            future.result()
+
+
+def should_parallelize(n_samples, sr, workers=None):
+    workers = pitch_workers() if workers is None else workers
+    return workers > 1 and n_samples >= PARALLEL_MIN_SECONDS * sr
+
+
+def plan_cuts(rms, n_segments, search_frames=CUT_SEARCH_FRAMES):
+    """
+    Frame indices splitting len(rms) frames into n_segments: each cut is
+    the quietest frame within search_frames of its evenly spaced position.
+    Returns [0, cut_1, ..., len(rms)].
+    """
+    n_frames = len(rms)
+    cuts = [0]
+    for k in range(1, n_segments):
+        target = k * n_frames // n_segments
+        lo = max(cuts[-1] + 1, target - search_frames)
+        hi = min(n_frames - 1, target + search_frames + 1)
+        cuts.append(lo + int(np.argmin(rms[lo:hi])) if hi > lo else target)
+    cuts.append(n_frames)
+    return cuts
+
+
+def _track_segment(shm_name, n_samples, dtype, start, end, pyin_kwargs):
+    """pyin on y[start:end] of the shared waveform."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        y = np.ndarray((n_samples,), dtype=dtype, buffer=shm.buf)
+        # pyin pads (copies) the input, so no view of the shared block outlives this call
+        result = librosa.pyin(y[start:end], **pyin_kwargs)
+        del y
+        return result
+    finally:
+        shm.close()
+
+
+def _switch_frame(left, right, cut, window):
+    """Frame nearest `cut` (within the window) where the two overlapping f0 tracks agree."""
+    lo, hi = max(0, cut - window), min(len(left), cut + window)
+    a, b = left[lo:hi], right[lo:hi]
+    both_voiced = ~np.isnan(a) & ~np.isnan(b)
+    cents = np.full(len(a), np.inf)
+    cents[both_voiced] = np.abs(1200.0 * np.log2(a[both_voiced] / b[both_voiced]))
+    agree = (np.isnan(a) & np.isnan(b)) | (cents <= AGREE_CENTS)
+    candidates = np.flatnonzero(agree) + lo
+    if not len(candidates):
+        return cut
+    return int(candidates[np.argmin(np.abs(candidates - cut))])
+
+
+def _stitch(results, offsets, cuts, n_frames, overlap_frames):
+    """One (f0, voiced_flag, voiced_probs) over n_frames from the overlapping piece tracks."""
+    tracks = []
+    for (f0, voiced_flag, voiced_probs), a in zip(results, offsets):
+        # Each piece's arrays, placed on the range's timeline (NaN/False/0 outside)
+        n = min(len(f0), n_frames - a)
+        track = (np.full(n_frames, np.nan), np.zeros(n_frames, dtype=bool), np.zeros(n_frames))
+        for full, part in zip(track, (f0, voiced_flag, voiced_probs)):
+            full[a:a + n] = part[:n]
+        tracks.append(track)
+
+    f0, voiced_flag, voiced_probs = (np.empty(n_frames), np.empty(n_frames, dtype=bool), np.empty(n_frames))
+    start = 0
+    for i, track in enumerate(tracks):
+        end = n_frames if i == len(tracks) - 1 else _switch_frame(track[0], tracks[i + 1][0],
+                                                                   cuts[i + 1], overlap_frames)
+        for full, part in zip((f0, voiced_flag, voiced_probs), track):
+            full[start:end] = part[start:end]
+        start = end
+    return f0, voiced_flag, voiced_probs
+
+
+def pyin_ranges(y, sr, ranges, fmin, fmax, frame_length=2048, hop_length=512, workers=None,
+                overlap_frames=OVERLAP_FRAMES):
+    """
+    librosa.pyin(y[start:end], ..., fill_na=np.nan) for each (start, end)
+    sample range, with the ranges and pieces of long ranges tracked in
+    parallel; returns one (f0, voiced_flag, voiced_probs) per range.
+    """
+    workers = pitch_workers() if workers is None else workers
+    y = np.ascontiguousarray(y)
+    min_frames = max(1, int(MIN_SEGMENT_SECONDS * sr / hop_length))
+    pyin_kwargs = {"fmin": fmin, "fmax": fmax, "sr": sr, "frame_length": frame_length,
+                   "hop_length": hop_length, "fill_na": np.nan}
+
+    plans = []
+    for start, end in ranges:
+        rms = librosa.feature.rms(y=y[start:end], frame_length=frame_length, hop_length=hop_length)[0]
+        n_pieces = max(1, min(workers, len(rms) // min_frames))
+        plans.append((len(rms), plan_cuts(rms, n_pieces)))
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, y.nbytes))
+    try:
+        np.ndarray(y.shape, dtype=y.dtype, buffer=shm.buf)[:] = y
+        pool = get_pool(workers)
+        futures, offsets = [], []
+        for (start, end), (n_frames, cuts) in zip(ranges, plans):
+            futures.append([])
+            offsets.append([])
+            for first, last in zip(cuts[:-1], cuts[1:]):
+                a = max(0, first - overlap_frames)
+                b = min(n_frames, last + overlap_frames)
+                futures[-1].append(pool.submit(_track_segment, shm.name, len(y), y.dtype.str,
+                                               start + a * hop_length, min(end, start + b * hop_length),
+                                               pyin_kwargs))
+                offsets[-1].append(a)
+        try:
+            results = [[future.result() for future in range_futures] for range_futures in futures]
+        except BrokenProcessPool:
+            # A pitch worker died (e.g. OOM-killed); start a fresh pool next time
+            print("[WARN] Pitch worker pool broke; tracking this recording in one pass")
+            shutdown_pool(wait=False)
+            return [librosa.pyin(y[start:end], **pyin_kwargs) for start, end in ranges]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return [_stitch(range_results, range_offsets, cuts, n_frames, overlap_frames)
+            for range_results, range_offsets, (n_frames, cuts) in zip(results, offsets, plans)]
+
+
+def pyin(y, sr, fmin, fmax, frame_length=2048, hop_length=512, workers=None,
+         overlap_frames=OVERLAP_FRAMES):
+    """
+    librosa.pyin(y, ..., fill_na=np.nan) computed on segments in parallel;
+    returns (f0, voiced_flag, voiced_probs) over every frame of y.
+    """
+    return pyin_ranges(y, sr, [(0, len(y))], fmin, fmax, frame_length=frame_length,
+                       hop_length=hop_length, workers=workers, overlap_frames=overlap_frames)[0]
@@ -0,0 +1,204 @@
+import numpy as np
+import librosa
+
+from . import parallel_pitch
+from .references import compile_reference
+
+
+# Full tracking range used by analyze_singing_ai
+F0_MIN_NOTE = "C2"
+F0_MAX_NOTE = "C7"
+
+F0_METHODS = ("pyin", "pyin_range", "yin")
+
+# Comfortable tessitura per voice type, used to narrow the pyin search range
+VOICE_RANGES = {
+    "soprano": ("C4", "C6"),
+    "mezzo": ("A3", "A5"),
+    "alto": ("F3", "F5"),
+    "tenor": ("C3", "C5"),
+    "baritone": ("A2", "A4"),
+    "bass": ("E2", "E4"),
+}
+
+# Head-room (in semitones) kept around a derived range for scoops and vibrato
+RANGE_MARGIN_SEMITONES = 5
+
+# Frames processed per vectorized YIN block; bounds the working set
+YIN_BLOCK_FRAMES = 1024
+
+
+def full_pitch_range():
+    return (float(librosa.note_to_hz(F0_MIN_NOTE)),
+            float(librosa.note_to_hz(F0_MAX_NOTE)))
+
+
+def pitch_range_for(reference_notes=None, voice_type=None, margin=RANGE_MARGIN_SEMITONES):
+    """
+    Derive (fmin, fmax) for pitch tracking from the reference notes or the
+    singer's voice type, widened by `margin` semitones and clamped to the
+    full C2-C7 range. Falls back to the full range when neither is given.
+    """
+    full_min, full_max = full_pitch_range()
+
+    if reference_notes:
+        ref_hz = compile_reference(reference_notes).hz
+        low, high = float(np.min(ref_hz)), float(np.max(ref_hz))
+    elif voice_type:
+        if voice_type not in VOICE_RANGES:
+            raise ValueError(f"Unknown voice type: {voice_type}")
+        low_note, high_note = VOICE_RANGES[voice_type]
+        low, high = float(librosa.note_to_hz(low_note)), float(librosa.note_to_hz(high_note))
+    else:
+        return full_min, full_max
+
+    factor = 2.0 ** (margin / 12.0)
+    return max(full_min, low / factor), min(full_max, high * factor)
+
+
+def yin_track(y, sr, fmin, fmax, frame_length=2048, hop_length=512,
+              trough_threshold=0.1, voicing_threshold=0.25, energy_floor_db=-40.0):
+    """
+    Vectorized YIN pitch tracker with cheap voicing.
+
+    Frames are centered and zero padded exactly like librosa.pyin, so the
+    output lines up frame-for-frame with the pyin track. A frame is voiced
+    when its best normalized-difference trough is below `voicing_threshold`
+    and its RMS is within `energy_floor_db` of the loudest frame.
+
+    Returns f0 (NaN where unvoiced), voiced_flag and voiced_probs, mirroring
+    librosa.pyin(..., fill_na=np.nan).
+    """
+    y = np.asarray(y, dtype=np.float32)
+    y_padded = np.pad(y, frame_length // 2)
+    frames = librosa.util.frame(y_padded, frame_length=frame_length, hop_length=hop_length)
+    n_frames = frames.shape[1]
+
+    win, min_period, max_period = yin_lags(sr, fmin, fmax, frame_length)
+
+    f0 = np.full(n_frames, np.nan)
+    aperiodicity = np.ones(n_frames)
+
+    for start in range(0, n_frames, YIN_BLOCK_FRAMES):
+        block = frames[:, start:start + YIN_BLOCK_FRAMES].T.astype(np.float64)
+        period, trough = _yin_block(block, win, min_period, max_period, trough_threshold)
+        f0[start:start + len(block)] = sr / period
+        aperiodicity[start:start + len(block)] = trough
+
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=0))
+    rms_db = 20.0 * np.log10(np.maximum(rms, 1e-10) / max(float(np.max(rms)), 1e-10))
+
+    voiced_flag = (aperiodicity < voicing_threshold) & (rms_db > energy_floor_db)
+    voiced_flag &= (f0 >= fmin) & (f0 <= fmax)
+    voiced_probs = np.where(voiced_flag, np.clip(1.0 - aperiodicity, 0.0, 1.0), 0.0)
+    f0[~voiced_flag] = np.nan
+    return f0, voiced_flag, voiced_probs
+
+
+def yin_lags(sr, fmin, fmax, frame_length=2048):
+    """(integration window, min period, max period) in samples for YIN over [fmin, fmax]."""
+    min_period = max(1, int(np.floor(sr / fmax)))
+    max_period = min(int(np.ceil(sr / fmin)), frame_length // 2 - 1)
+    return frame_length - max_period - 1, min_period, max_period
+
+
+def _yin_block(block, win, min_period, max_period, trough_threshold):
+    """YIN on a (n_frames, frame_length) block; returns refined period and trough depth."""
+    n, frame_length = block.shape
+    n_fft = 1 << int(np.ceil(np.log2(frame_length + win)))
+
+    # Autocorrelation of the first `win` samples against every lag
+    spec = np.fft.rfft(block, n_fft, axis=1)
+    head = np.fft.rfft(block[:, :win], n_fft, axis=1)
+    acf = np.fft.irfft(spec * np.conj(head), n_fft, axis=1)[:, :max_period + 1]
+
+    # Difference function d(tau) = E(0) + E(tau) - 2 r(tau)
+    energy = np.cumsum(np.pad(block ** 2, ((0, 0), (1, 0))), axis=1)
+    lags = np.arange(max_period + 1)
+    window_energy = energy[:, lags + win] - energy[:, lags]
+    diff = np.maximum(window_energy[:, :1] + window_energy - 2.0 * acf, 0.0)
+
+    # Cumulative mean normalized difference
+    cmnd = np.ones_like(diff)
+    running = np.cumsum(diff[:, 1:], axis=1)
+    cmnd[:, 1:] = diff[:, 1:] * lags[1:] / np.maximum(running, 1e-12)
+
+    search = cmnd[:, min_period:max_period + 1]
+    is_trough = np.zeros_like(search, dtype=bool)
+    is_trough[:, 1:-1] = (search[:, 1:-1] <= search[:, :-2]) & (search[:, 1:-1] < search[:, 2:])
+    candidates = is_trough & (search < trough_threshold)
+
+    has_candidate = candidates.any(axis=1)
+    idx = np.where(has_candidate, np.argmax(candidates, axis=1), np.argmin(search, axis=1))
+
+    # Parabolic interpolation around the chosen lag
+    rows = np.arange(n)
+    left = search[rows, np.maximum(idx - 1, 0)]
+    centre = search[rows, idx]
+    right = search[rows, np.minimum(idx + 1, search.shape[1] - 1)]
+    denom = left - 2.0 * centre + right
+    shift = np.where(np.abs(denom) > 1e-12, 0.5 * (left - right) / np.where(denom == 0, 1, denom), 0.0)
+    shift = np.clip(shift, -1.0, 1.0)
+
+    period = min_period + idx + shift
+    return period, centre
+
+
+def _method_range(method, reference_notes, voice_type):
+    """(fmin, fmax) searched by f0 backend `method`."""
+    if method == "pyin":
+        return full_pitch_range()
+    if method in ("pyin_range", "yin"):
+        return pitch_range_for(reference_notes, voice_type)
+    raise ValueError(f"Unknown f0 method: {method}")
+
+
+def track_pitch(y, sr, method="pyin", reference_notes=None, voice_type=None,
+                frame_length=2048, hop_length=512):
+    """
+    Run the selected f0 backend and return (f0, voiced_flag, voiced_probs).
+
+    method:
+      "pyin"       - librosa.pyin over the full C2-C7 range
+      "pyin_range" - librosa.pyin restricted to the range implied by the
+                     reference notes or voice type (fewer Viterbi states)
+      "yin"        - vectorized YIN with energy/aperiodicity voicing
+
+    pyin on recordings longer than PITCH_PARALLEL_MIN_SECONDS is split
+    into segments tracked in parallel (analysis.parallel_pitch).
+    """
+    fmin, fmax = _method_range(method, reference_notes, voice_type)
+
+    if method == "yin":
+        return yin_track(y, sr, fmin, fmax, frame_length=frame_length, hop_length=hop_length)
+
+    if parallel_pitch.should_parallelize(len(y), sr):
+        return parallel_pitch.pyin(y, sr, fmin, fmax, frame_length=frame_length, hop_length=hop_length)
+
+    return librosa.pyin(
+        y,
+        fmin=fmin,
+        fmax=fmax,
+        sr=sr,
+        frame_length=frame_length,
+        hop_length=hop_length,
+        fill_na=np.nan
+    )
+
+
+def track_pitch_ranges(y, sr, ranges, method="pyin", reference_notes=None, voice_type=None,
+                       frame_length=2048, hop_length=512):
+    """
+    track_pitch(y[start:end], ...) for each (start, end) sample range; one
+    (f0, voiced_flag, voiced_probs) per range. With pyin, ranges that add
+    up to PITCH_PARALLEL_MIN_SECONDS or more are tracked in parallel
+    (analysis.parallel_pitch.pyin_ranges).
+    """
+    fmin, fmax = _method_range(method, reference_notes, voice_type)
+    total = sum(end - start for start, end in ranges)
+    if method != "yin" and parallel_pitch.should_parallelize(total, sr):
+        return parallel_pitch.pyin_ranges(y, sr, ranges, fmin, fmax,
+                                          frame_length=frame_length, hop_length=hop_length)
+    return [track_pitch(y[start:end], sr, method=method, reference_notes=reference_notes,
+                        voice_type=voice_type, frame_length=frame_length, hop_length=hop_length)
+            for start, end in ranges]
@@ -0,0 +1,232 @@
+"""
+Plot data and rendering for the analysis response.
+
+Analysis produces a small "plot data" bundle of frame-level arrays (pitch
+track, reference, RMS, mel spectrogram, onset strength, ZCR). Figures are
+rendered from that bundle only when requested, either inline in the
+/analyze response or later from the cached bundle, and the same arrays can
+be returned downsampled as JSON for clients that draw their own charts.
+
+Figures are built with matplotlib's object-oriented API (Figure, not
+pyplot), so nothing touches pyplot's global figure state and the plots of
+one analysis can be rendered on several threads at once.
+"""
+import io
+import base64
+from functools import partial
+
+import numpy as np
+import librosa
+
+from .references import compile_reference
+from .stages import run_stages
+
+PLOT_NAMES = ("pitch", "breath", "diction")
+IMAGE_FORMATS = ("png", "svg")
+
+# Frames kept per series in the plot data bundle; a 12-inch figure at
+# 150 dpi is ~1800 px wide, so denser series add no visible detail
+PLOT_MAX_FRAMES = 2000
+
+# Points per series in the compact JSON output
+SERIES_MAX_POINTS = 500
+
+
+def _figure(**kwargs):
+    """A new Figure; matplotlib is imported on the first render, not with the analysis stack."""
+    from matplotlib.figure import Figure
+    return Figure(**kwargs)
+
+
+def create_plot_image(fig, image_format="png"):
+    buf = io.BytesIO()
+    if image_format == "svg":
+        fig.savefig(buf, format="svg", bbox_inches="tight")
+        mime = "image/svg+xml"
+    else:
+        fig.savefig(buf, format="png", bbox_inches="tight", dpi=150)
+        mime = "image/png"
+    buf.seek(0)
+    encoded = base64.b64encode(buf.read()).decode("utf-8")
+    return f"data:{mime};base64,{encoded}"
+
+
+def smooth_rms(rms):
+    from scipy.signal import savgol_filter
+
+    if len(rms) < 7:
+        return rms
+    window_len = min(51, len(rms) if len(rms) % 2 == 1 else len(rms) - 1)
+    return savgol_filter(rms, window_len, 3)
+
+
+def build_plot_data(times, f0, rms, features, scores, reference_notes=None, max_frames=PLOT_MAX_FRAMES):
+    """
+    Collect the arrays every plot needs, decimated to at most `max_frames`
+    frames. `scores` maps plot name to the score shown in its title.
+    """
+    step = max(1, int(np.ceil(len(times) / max_frames)))
+    mel_db = librosa.power_to_db(features.mel, ref=np.max)[:, ::step]
+    return plot_data_from_series(times, f0, rms, mel_db, features.onset_env_mean, features.zcr,
+                                 features.sr, features.hop_length, scores, reference_notes, step)
+
+
+def plot_data_from_series(times, f0, rms, mel_db, onset_env, zcr, sr, hop_length, scores,
+                          reference_notes=None, step=1):
+    """
+    build_plot_data from full-length 1-D frame series and a mel spectrogram
+    (in dB) that is already decimated by `step`.
+    """
+    data = {
+        "sr": np.array(sr),
+        "hop_length": np.array(hop_length),
+        "scores": np.array([scores[name] for name in PLOT_NAMES], dtype=float),
+        "times": times[::step],
+        "f0": f0[::step],
+        "rms": rms[::step],
+        "rms_smooth": smooth_rms(rms)[::step],
+        "energy_threshold": np.array(np.percentile(rms, 20)),
+        "mel_db": mel_db,
+        "onset_env": onset_env[::step],
+        "zcr": zcr[::step],
+    }
+
+    if reference_notes and len(reference_notes) >= 2:
+        try:
+            ref_hz = compile_reference(reference_notes).hz
+            data["reference_hz"] = np.interp(times, np.linspace(0, times[-1], len(ref_hz)), ref_hz)[::step]
+        except Exception as e:
+            print(f"[WARN] Could not plot reference notes: {e}")
+
+    return data
+
+
+def render_pitch_plot(data, image_format="png"):
+    pitch_score = data["scores"][PLOT_NAMES.index("pitch")]
+    times, f0 = data["times"], data["f0"]
+
+    pitch_fig = _figure(figsize=(12, 6))
+    ax1, ax2 = pitch_fig.subplots(2, 1)
+    ax1.plot(times, f0, label="Sung Pitch", color="blue", alpha=0.7)
+
+    if "reference_hz" in data:
+        ref_interp = data["reference_hz"]
+        ax1.plot(times, ref_interp, label="Expected Pitch (Reference)", linestyle="--", color="orange", linewidth=2)
+
+        cents_deviation = 1200 * np.log2(f0 / ref_interp)
+        ax2.plot(times, cents_deviation, label="Pitch Deviation (cents)", color="red", alpha=0.7)
+        ax2.axhline(y=0, color='black', linestyle='-', alpha=0.5)
+        ax2.axhline(y=50, color='gray', linestyle='--', alpha=0.5, label="±50 cents")
+        ax2.axhline(y=-50, color='gray', linestyle='--', alpha=0.5)
+        ax2.set_ylabel("Deviation (cents)")
+        ax2.set_xlabel("Time (s)")
+        ax2.legend()
+        ax2.grid(True, alpha=0.3)
+    else:
+        print("[INFO] No reference notes available — skipping expected pitch overlay.")
+
+    ax1.set_title(f"Pitch Analysis (Score: {pitch_score:.1f}/10)")
+    ax1.set_xlabel("Time (s)")
+    ax1.set_ylabel("Frequency (Hz)")
+    ax1.legend()
+    ax1.grid(True, alpha=0.3)
+
+    return create_plot_image(pitch_fig, image_format)
+
+
+def render_breath_plot(data, image_format="png"):
+    breath_score = data["scores"][PLOT_NAMES.index("breath")]
+    rms_times = data["times"]
+
+    breath_fig = _figure(figsize=(12, 6))
+    ax1, ax2 = breath_fig.subplots(2, 1)
+    ax1.plot(rms_times, data["rms"], label="RMS Energy", color="green", alpha=0.7)
+    ax1.axhline(y=float(data["energy_threshold"]), color='red', linestyle='--', label="Low Energy Threshold")
+    ax1.set_title(f"Breath Support Analysis (Score: {breath_score:.1f}/10)")
+    ax1.set_ylabel("Energy")
+    ax1.legend()
+    ax1.grid(True, alpha=0.3)
+
+    ax2.plot(rms_times, data["rms_smooth"], label="Smoothed Energy", color="darkgreen", alpha=0.7)
+    ax2.set_xlabel("Time (s)")
+    ax2.set_ylabel("Smoothed Energy")
+    ax2.legend()
+    ax2.grid(True, alpha=0.3)
+
+    return create_plot_image(breath_fig, image_format)
+
+
+def render_diction_plot(data, image_format="png"):
+    """Enhanced diction visualization with more features"""
+    import librosa.display
+    diction_score = data["scores"][PLOT_NAMES.index("diction")]
+    times = data["times"]
+
+    fig = _figure(figsize=(12, 9))
+    ax1, ax2, ax3 = fig.subplots(3, 1)
+
+    # Spectral features
+    img = librosa.display.specshow(data["mel_db"], x_coords=times, x_axis='time', y_axis='mel',
+                                   sr=int(data["sr"]), hop_length=int(data["hop_length"]),
+                                   fmax=8000, ax=ax1)
+    ax1.set_title(f"Diction Analysis (Score: {diction_score:.1f}/10) - Spectrogram")
+    fig.colorbar(img, ax=ax1, format='%+2.0f dB')
+
+    # Onset strength
+    ax2.plot(times, data["onset_env"], label='Onset Strength', color='orange')
+    ax2.set_ylabel('Strength')
+    ax2.set_title('Consonant Detection')
+    ax2.legend()
+
+    # Zero crossing rate
+    ax3.plot(times, data["zcr"], label='Zero Crossing Rate', color='green')
+    ax3.set_xlabel('Time (s)')
+    ax3.set_ylabel('Rate')
+    ax3.set_title('Articulation Clarity')
+    ax3.legend()
+
+    fig.tight_layout()
+    return create_plot_image(fig, image_format)
+
+
+RENDERERS = {
+    "pitch": render_pitch_plot,
+    "breath": render_breath_plot,
+    "diction": render_diction_plot,
+}
+
+
+def _render_or_none(name, data, image_format):
+    try:
+        return RENDERERS[name](data, image_format)
+    except Exception as e:
+        print(f"Error creating {name} plot: {e}")
+        return None
+
+
+def render_plots(data, names=PLOT_NAMES, image_format="png", timer=None, threads=None):
+    """Render the requested plots, up to `threads` at once (see analysis.stages); returns {name: data URI or None}."""
+    images = {name: None for name in PLOT_NAMES}
+    rendered = run_stages({f"plot_{name}": (partial(_render_or_none, name, data, image_format), ())
+                           for name in names}, threads=threads, timer=timer)
+    images.update({name: rendered[f"plot_{name}"] for name in names})
+    return images
+
+
+def compact_series(data, max_points=SERIES_MAX_POINTS):
+    """Downsampled pitch/RMS/onset series as JSON-friendly lists (NaN -> None)."""
+    step = max(1, int(np.ceil(len(data["times"]) / max_points)))
+
+    def as_list(values, decimals):
+        values = np.round(np.asarray(values, dtype=float)[::step], decimals)
+        return [None if np.isnan(v) else float(v) for v in values]
+
+    series = {
+        "times": as_list(data["times"], 3),
+        "f0": as_list(data["f0"], 2),
+        "rms": as_list(data["rms"], 5),
+        "onset_strength": as_list(data["onset_env"], 3),
+    }
+    if "reference_hz" in data:
+        series["reference_hz"] = as_list(data["reference_hz"], 2)
+    return series
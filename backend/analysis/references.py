@@ -0,0 +1,136 @@
+"""
+Reference-note library and compiled reference notes.
+
+A ReferenceNotes is the tuple of note names plus everything the analysis
+derives from them - MIDI numbers, Hz, cents and the DTW alignment grid -
+computed once. Named pieces (standard exercises and songs) are loaded
+from REFERENCE_LIBRARY at startup; ad-hoc note lists are interned in an
+LRU, so repeated requests with the same notes reuse the compiled form.
+
+Because ReferenceNotes is a tuple of the note names, it can be passed
+anywhere a note list is accepted, and it pickles to pool workers with its
+arrays rather than being recompiled there.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import librosa
+
+DEFAULT_LIBRARY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    "reference_pieces.json")
+LIBRARY_PATH = os.getenv("REFERENCE_LIBRARY", DEFAULT_LIBRARY_PATH)
+CACHE_SIZE = int(os.getenv("REFERENCE_CACHE_SIZE", "256"))
+
+# Alignment grid cells for a note of average duration
+GRID_FRAMES_PER_NOTE = 8
+
+
+class ReferenceNotes(tuple):
+    """Note names with their precomputed MIDI/Hz/cents arrays and alignment grid."""
+
+    @classmethod
+    def compile(cls, notes, durations=None, piece_id=None, title=None):
+        """Build from note names (raises ValueError for unknown notes)."""
+        self = cls(str(note).strip() for note in notes)
+        if not self:
+            raise ValueError("No valid notes provided")
+        try:
+            self.midi = np.array([librosa.note_to_midi(note) for note in self], dtype=float)
+        except librosa.util.exceptions.ParameterError as e:
+            raise ValueError(str(e)) from e
+        self.hz = librosa.midi_to_hz(self.midi)
+        self.cents = 100.0 * self.midi
+        self.durations = None
+        if durations is not None:
+            durations = np.asarray(durations, dtype=float)
+            if durations.shape != self.midi.shape or np.any(durations <= 0):
+                raise ValueError("durations must be positive, one per note")
+            self.durations = durations
+        self.piece_id = piece_id
+        self.title = title
+
+        # DTW grid: GRID_FRAMES_PER_NOTE cells per note, scaled by relative duration
+        if self.durations is None:
+            cells = np.full(len(self), GRID_FRAMES_PER_NOTE)
+        else:
+            cells = np.maximum(1, np.round(GRID_FRAMES_PER_NOTE * self.durations / self.durations.mean()))
+        self.grid_notes = np.repeat(np.arange(len(self)), cells.astype(int))
+        self.grid_cents = self.cents[self.grid_notes]
+        return self
+
+    def describe(self):
+        return {
+            "piece_id": self.piece_id,
+            "title": self.title,
+            "notes": list(self),
+            "durations": None if self.durations is None else self.durations.tolist(),
+        }
+
+
+_interned = OrderedDict()
+_interned_lock = threading.Lock()
+
+
+def compile_reference(notes, durations=None):
+    """
+    The ReferenceNotes for `notes` (names or an existing ReferenceNotes),
+    from the LRU of recently used note lists. Raises ValueError for
+    unknown note names.
+    """
+    if notes is None or (isinstance(notes, ReferenceNotes) and durations is None):
+        return notes
+    key = (tuple(str(note).strip() for note in notes),
+           None if durations is None else tuple(float(d) for d in durations))
+    with _interned_lock:
+        compiled = _interned.get(key)
+        if compiled is not None:
+            _interned.move_to_end(key)
+            return compiled
+    compiled = ReferenceNotes.compile(key[0], key[1])
+    with _interned_lock:
+        _interned[key] = compiled
+        while len(_interned) > CACHE_SIZE:
+            _interned.popitem(last=False)
+    return compiled
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def load_library(path=None):
+    """
+    Read the piece library: a JSON list of {"id", "title", "notes",
+    "durations" (optional, in beats)}. Returns {piece_id: ReferenceNotes}.
+    """
+    path = path or LIBRARY_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        entries = json.load(f)
+    library = {}
+    for entry in entries:
+        try:
+            library[entry["id"]] = ReferenceNotes.compile(entry["notes"], entry.get("durations"),
+                                                          piece_id=entry["id"], title=entry.get("title"))
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"Invalid reference piece {entry.get('id')!r} in {path}: {e}") from e
+    return library
+
+
+def get_library():
+    """The piece library, loaded on first use."""
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = load_library()
+            print(f"Loaded {len(_library)} reference pieces from {LIBRARY_PATH}")
+        return _library
+
+
+def get_piece(piece_id):
+    """The library piece `piece_id`, or None."""
+    return get_library().get(piece_id)
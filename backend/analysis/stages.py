@@ -0,0 +1,93 @@
+"""
+Concurrent execution of independent analysis stages.
+
+Once the waveform, pitch track and RMS exist, the pitch, breath and diction
+scores don't depend on each other, and neither do the three figures. Most
+of their time is spent in NumPy/SciPy FFT and filtering code that releases
+the GIL, so on an otherwise idle machine running them on threads shortens
+a single request. run_stages() takes a small DAG of named stages and starts
+each one as soon as the stages it depends on have finished, with at most
+`threads` running at a time. With one thread the stages run in order on
+the calling thread, exactly as before.
+
+Stages must not share lazily computed state (e.g. one FeatureContext
+property read by two stages), and must not call run_stages themselves.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+
+
+def stage_threads():
+    """
+    Threads per analysis for independent stages (STAGE_THREADS). The
+    default "auto" shares the CPUs among the analysis workers
+    (cpu_count // ANALYSIS_WORKERS); 1 runs stages one after another.
+    """
+    from .startup import cpus_per_worker
+
+    setting = os.getenv("STAGE_THREADS", "auto")
+    if setting != "auto":
+        return max(1, int(setting))
+    return cpus_per_worker()
+
+
+def _next_ready(pending, results):
+    for name, (_, deps) in pending.items():
+        if all(dep in results for dep in deps):
+            return name
+    return None
+
+
+def run_stages(stages, threads=None, timer=None, on_start=None):
+    """
+    Run `stages`, a dict of name -> (fn, deps), and return {name: result}.
+
+    fn is called with the results of its deps, in order. Each stage is
+    timed under its name on `timer`, and on_start(name) is called on the
+    calling thread as it is started. The first exception raised by a stage
+    propagates once the stages already running have finished; stages not
+    yet started are skipped.
+    """
+    threads = stage_threads() if threads is None else max(1, threads)
+    unknown = {dep for _, deps in stages.values() for dep in deps} - set(stages)
+    if unknown:
+        raise ValueError(f"Unknown stage dependencies: {sorted(unknown)}")
+
+    pending = dict(stages)
+    results = {}
+
+    def run(name):
+        fn, deps = stages[name]
+        with timer.stage(name) if timer else nullcontext():
+            return fn(*(results[dep] for dep in deps))
+
+    if threads == 1 or len(stages) <= 1:
+        while pending:
+            name = _next_ready(pending, results)
+            if name is None:
+                raise ValueError(f"Cyclic stage dependencies: {sorted(pending)}")
+            del pending[name]
+            if on_start:
+                on_start(name)
+            results[name] = run(name)
+        return results
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=min(threads, len(stages)),
+                            thread_name_prefix="pitchpanel-stage") as pool:
+        while pending or running:
+            while pending and len(running) < threads:
+                name = _next_ready(pending, results)
+                if name is None:
+                    break
+                del pending[name]
+                if on_start:
+                    on_start(name)
+                running[pool.submit(run, name)] = name
+            if not running:
+                raise ValueError(f"Cyclic stage dependencies: {sorted(pending)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    return results
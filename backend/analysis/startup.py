@@ -0,0 +1,95 @@
+"""
+Process startup for the API and its analysis workers.
+
+configure() has to run before librosa, numba or matplotlib are imported:
+it selects the headless Agg backend and points numba's on-disk cache at
+NUMBA_CACHE_DIR, so JIT-compiled kernels (librosa's pyin/Viterbi and
+onset helpers, the DTW alignment) are compiled once per machine instead
+of once per process. warm_up() analyzes a short synthetic clip so the
+remaining first-call costs (JIT, lazy imports, model load, matplotlib)
+are paid before the process reports ready.
+
+Startup milestones are kept in seconds since this module was imported,
+which is the first thing main.py does.
+"""
+import os
+import tempfile
+import time
+
+STARTED = time.perf_counter()
+
+DEFAULT_NUMBA_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pitchpanel", "numba")
+
+_milestones = {}
+
+
+def configure():
+    """Environment for headless, JIT-cached analysis; inherited by spawned workers."""
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    cache_dir = os.environ.setdefault("NUMBA_CACHE_DIR", DEFAULT_NUMBA_CACHE_DIR)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e:
+        print(f"[WARN] NUMBA_CACHE_DIR {cache_dir} is not writable ({e}); JIT results won't be cached")
+
+
+def cpus_per_worker():
+    """CPUs available to one analysis process: cpu_count // ANALYSIS_WORKERS (at least 1)."""
+    cpus = os.cpu_count() or 1
+    analysis_workers = int(os.getenv("ANALYSIS_WORKERS", cpus))
+    return max(1, cpus // max(1, analysis_workers))
+
+
+def warmup_enabled():
+    return os.getenv("ANALYSIS_WARMUP", "1").lower() not in ("0", "false", "no", "off")
+
+
+def synthetic_take(seconds=1.5, sr=22050):
+    """A short sung-like clip (C4-D4-E4-F4 with vibrato and breath noise)."""
+    import numpy as np
+
+    t = np.arange(int(seconds * sr)) / sr
+    midi = np.array([60, 62, 64, 65])[np.minimum((t / seconds * 4).astype(int), 3)]
+    f0 = 440.0 * 2 ** ((midi - 69) / 12) * (1 + 0.006 * np.sin(2 * np.pi * 5.5 * t))
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(np.sin(k * phase) / k for k in range(1, 4))
+    rng = np.random.default_rng(0)
+    return (0.3 * y + 0.003 * rng.standard_normal(len(t))).astype(np.float32), sr
+
+
+def warm_up():
+    """Run one uncached analysis with every plot on a synthetic clip and start the pitch workers; returns the wall time."""
+    import soundfile as sf
+    from . import parallel_pitch
+    from .analyzer import analyze_singing_ai
+
+    start = time.perf_counter()
+    y, sr = synthetic_take()
+    fd, path = tempfile.mkstemp(suffix=".wav", prefix="pitchpanel-warmup-")
+    os.close(fd)
+    try:
+        sf.write(path, y, sr)
+        analyze_singing_ai(path, reference_notes=["C4", "D4", "E4", "F4"], use_cache=False)
+    finally:
+        os.remove(path)
+    parallel_pitch.warm_up()
+    mark("warmed_up")
+    return time.perf_counter() - start
+
+
+def mark(name):
+    """Record that startup milestone `name` was reached now."""
+    _milestones[name] = round(time.perf_counter() - STARTED, 4)
+    return _milestones[name]
+
+
+def mark_first_request(duration):
+    """Record the first served request (only the first call counts)."""
+    if "first_request" not in _milestones:
+        mark("first_request")
+        _milestones["first_request_duration"] = round(duration, 4)
+
+
+def report():
+    """Startup milestones in seconds since import, e.g. {"imported", "warmed_up", "ready", "first_request"}."""
+    return dict(_milestones)
@@ -0,0 +1,311 @@
+"""
+Block-wise feature extraction for long recordings.
+
+analyze_singing_ai(streaming=True) reads the recording in blocks
+(analysis.decode.stream_audio) instead of decoding it whole. Each block of
+frames is analyzed together with CONTEXT_FRAMES frames of audio on either
+side, using the same FeatureContext and pitch tracker as the in-memory
+path, and only the block's own frames are kept, so STFT, HPSS, pYIN and
+delta windows see the same neighbourhood they would in one pass.
+
+What is kept per frame is only the 1-D series the scores need (f0, RMS,
+centroid, rolloff, ZCR, flatness, onset strength: ~8 bytes each per 23 ms
+frame). Everything 2-D (STFT, mel, HPSS, MFCC, contrast) is reduced per
+block into running means/variances and energy sums, and the mel
+spectrogram for the diction plot is decimated as it arrives. Peak memory
+is therefore bounded by the block size rather than the recording length.
+
+The same accumulator serves voice-activity gating in the in-memory path
+(segment_features): only the voiced segments found by analysis.vad are
+analyzed, and the silence between them is recorded as unvoiced frames
+that the diction statistics leave out.
+"""
+import numpy as np
+import librosa
+
+from .decode import DecodeError, stream_audio
+from .features import FeatureContext, HOP_LENGTH, N_FFT, N_MELS
+from .pitch import track_pitch, track_pitch_ranges
+from .plots import PLOT_MAX_FRAMES, plot_data_from_series
+from .timing import StageTimer
+
+BLOCK_SECONDS = 30
+
+# Frames of audio analyzed on each side of a block and then discarded.
+# Covers the STFT window (4 frames), delta (4), HPSS median filter (15) and
+# gives pYIN's Viterbi pass some context at block boundaries.
+CONTEXT_FRAMES = 32
+
+# Context around voiced segments: the STFT window and delta width. The
+# segments are padded with silence already (analysis.vad.PAD_S), so HPSS
+# only misses more of that silence.
+SEGMENT_CONTEXT_FRAMES = 8
+
+
+class RunningMoments:
+    """Per-row count, mean and variance of a (rows, frames) stream, merged block by block."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        n = values.shape[-1]
+        if n == 0:
+            return
+        mean = values.mean(axis=-1)
+        m2 = np.sum((values - mean[..., None]) ** 2, axis=-1)
+        if self.count == 0:
+            self.count, self.mean, self.m2 = n, mean, m2
+            return
+        # Chan et al. pairwise update
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / self.count)
+
+
+class ColumnDecimator:
+    """
+    Keeps every `step`-th column of a stream of (rows, frames) blocks,
+    doubling `step` whenever more than 2 * max_columns are held.
+    """
+
+    def __init__(self, max_columns):
+        self.max_columns = max_columns
+        self.step = 1
+        self._blocks = []
+        self._kept = 0
+
+    def append(self, columns, start):
+        index = np.arange(start, start + columns.shape[1])
+        kept = columns[:, index % self.step == 0]
+        self._blocks.append(kept)
+        self._kept += kept.shape[1]
+        if self._kept > 2 * self.max_columns:
+            merged = np.concatenate(self._blocks, axis=1)[:, ::2]
+            self._blocks = [merged]
+            self._kept = merged.shape[1]
+            self.step *= 2
+
+    def result(self):
+        return np.concatenate(self._blocks, axis=1), self.step
+
+
+class StreamedFeatures:
+    """Accumulates per-block results; the attributes mirror what the in-memory path computes."""
+
+    def __init__(self, sr, n_fft=N_FFT, hop_length=HOP_LENGTH):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_samples = 0
+        self._series = {name: [] for name in
+                        ("f0", "rms", "centroid", "rolloff", "zcr", "flatness", "onset_env", "onset_env_mean")}
+        self._voiced = []
+        self._mfcc = RunningMoments()
+        self._mfcc_delta = RunningMoments()
+        self._contrast_sum = 0.0
+        self._contrast_count = 0
+        self._harmonic_energy = 0.0
+        self._percussive_energy = 0.0
+        self._energy_frames = 0
+        self._energy_scale = None
+        self._mel = ColumnDecimator(PLOT_MAX_FRAMES)
+        self._mel_max = 0.0
+
+    def series(self, name):
+        return np.concatenate(self._series[name]) if self._series[name] else np.zeros(0)
+
+    def voiced(self):
+        """Per frame, whether it was analyzed (False for frames added with add_silence)."""
+        return np.concatenate(self._voiced) if self._voiced else np.zeros(0, dtype=bool)
+
+    def add_block(self, segment, first, last, offset, pitch_options, timer, f0=None):
+        """
+        Analyze `segment` (audio starting at frame `offset`) and keep frames
+        [first, last) in absolute frame numbers. f0, if given, is the
+        segment's pitch track, already computed.
+        """
+        a, b = first - offset, last - offset
+        sr = self.sr
+
+        if f0 is None:
+            with timer.stage("pitch"):
+                f0, _, _ = track_pitch(segment, sr, frame_length=self.n_fft,
+                                       hop_length=self.hop_length, **pitch_options)
+        self._series["f0"].append(f0[a:b])
+        self._voiced.append(np.ones(b - a, dtype=bool))
+
+        with timer.stage("features"):
+            features = FeatureContext(segment, sr, n_fft=self.n_fft, hop_length=self.hop_length)
+            S = features.magnitude[:, a:b]
+            self._series["rms"].append(librosa.feature.rms(y=segment, hop_length=self.hop_length)[0][a:b])
+            self._series["centroid"].append(librosa.feature.spectral_centroid(S=S, sr=sr)[0])
+            self._series["rolloff"].append(
+                librosa.feature.spectral_rolloff(S=S, sr=sr, roll_percent=0.95)[0])
+            self._series["flatness"].append(librosa.feature.spectral_flatness(S=S)[0])
+            self._series["zcr"].append(features.zcr[a:b])
+            self._series["onset_env"].append(features.onset_env_median[a:b])
+            self._series["onset_env_mean"].append(features.onset_env_mean[a:b])
+
+            contrast = librosa.feature.spectral_contrast(S=S, sr=sr, n_bands=6)
+            self._contrast_sum += float(np.sum(contrast, dtype=np.float64))
+            self._contrast_count += contrast.size
+
+            mfcc = librosa.feature.mfcc(S=features.log_mel, sr=sr, n_mfcc=13)
+            self._mfcc.update(mfcc[:, a:b])
+            self._mfcc_delta.update(librosa.feature.delta(mfcc)[:, a:b])
+
+            H_mag, P_mag = features.hpss_magnitude
+            self._harmonic_energy += float(np.sum(features.frame_energy(H_mag[:, a:b])))
+            self._percussive_energy += float(np.sum(features.frame_energy(P_mag[:, a:b])))
+            self._energy_frames += b - a
+            self._energy_scale = features.energy_scale
+
+            mel = features.mel[:, a:b]
+            if mel.size:
+                self._mel_max = max(self._mel_max, float(mel.max()))
+            self._mel.append(mel, first)
+
+    def add_silence(self, first, last, rms):
+        """Record frames [first, last) as silence without analyzing them; `rms` is their RMS."""
+        n = last - first
+        self._series["f0"].append(np.full(n, np.nan))
+        self._series["rms"].append(np.asarray(rms, dtype=np.float32))
+        for name in ("centroid", "rolloff", "zcr", "flatness", "onset_env", "onset_env_mean"):
+            self._series[name].append(np.zeros(n))
+        self._voiced.append(np.zeros(n, dtype=bool))
+        self._mel.append(np.zeros((N_MELS, n), dtype=np.float32), first)
+
+    def diction_stats(self):
+        """The dict analyzer.diction_statistics() returns, from the streamed blocks (voiced frames only)."""
+        frames = max(self._energy_frames, 1)
+        voiced = self.voiced()
+        return {
+            "centroid": self.series("centroid")[voiced],
+            "rolloff": self.series("rolloff")[voiced],
+            "onset_env": self.series("onset_env")[voiced],
+            "zcr": self.series("zcr")[voiced],
+            "mfcc_std": self._mfcc.std,
+            "mfcc_delta_std": self._mfcc_delta.std,
+            "contrast_mean": self._contrast_sum / max(self._contrast_count, 1),
+            "harmonic_energy": self._harmonic_energy / frames / self._energy_scale,
+            "percussive_energy": self._percussive_energy / frames / self._energy_scale,
+            "flatness": self.series("flatness")[voiced],
+        }
+
+    def mel_db(self):
+        """Decimated mel spectrogram in dB relative to the recording's peak, and its column step."""
+        mel, step = self._mel.result()
+        mel_db = librosa.power_to_db(mel, ref=self._mel_max or 1.0, top_db=None)
+        # Same 80 dB floor power_to_db applies below the global peak
+        return np.maximum(mel_db, -80.0), step
+
+    def plot_data(self, times, scores, reference_notes=None, max_frames=PLOT_MAX_FRAMES):
+        """Same bundle as plots.build_plot_data, from the streamed series."""
+        mel_db, mel_step = self.mel_db()
+        # Decimate every series on a multiple of the mel column step so they line up
+        step = max(1, int(np.ceil(len(times) / max_frames)))
+        step = int(np.ceil(step / mel_step)) * mel_step
+        return plot_data_from_series(
+            times, self.series("f0"), self.series("rms"), mel_db[:, ::step // mel_step],
+            self.series("onset_env_mean"), self.series("zcr"), self.sr, self.hop_length,
+            scores, reference_notes, step
+        )
+
+
+def stream_features(path, sr=22050, pitch_options=None, block_seconds=BLOCK_SECONDS, timer=None,
+                    n_fft=N_FFT, hop_length=HOP_LENGTH, context_frames=CONTEXT_FRAMES):
+    """
+    Extract the analysis features of the recording at `path` block by block.
+    pitch_options are passed to track_pitch (method, reference_notes,
+    voice_type). Returns a StreamedFeatures.
+    """
+    block_frames = max(1, int(block_seconds * sr / hop_length))
+    read_size = block_frames * hop_length
+    streamed = StreamedFeatures(sr, n_fft=n_fft, hop_length=hop_length)
+    pitch_options = pitch_options or {}
+    timer = timer or StageTimer()
+
+    buffer = np.zeros(0, dtype=np.float32)
+    buffer_start = 0  # absolute sample index of buffer[0]
+    blocks = stream_audio(path, sr, block_size=read_size)
+    eof = False
+    first = 0
+    while True:
+        last = first + block_frames
+        needed = (last + context_frames) * hop_length
+        with timer.stage("decode"):
+            pending = [buffer]
+            available = buffer_start + len(buffer)
+            while not eof and available < needed:
+                block = next(blocks, None)
+                if block is None:
+                    eof = True
+                    break
+                pending.append(block)
+                available += len(block)
+            buffer = np.concatenate(pending) if len(pending) > 1 else buffer
+        streamed.n_samples = buffer_start + len(buffer)
+        if streamed.n_samples == 0:
+            raise DecodeError("Recording contains no audio")
+
+        if eof:
+            # Frame count of a centered STFT over the whole recording
+            last = min(last, 1 + streamed.n_samples // hop_length)
+        if last <= first:
+            break
+
+        start = max(0, first - context_frames) * hop_length
+        end = min(needed, buffer_start + len(buffer))
+        segment = buffer[start - buffer_start:end - buffer_start]
+        streamed.add_block(segment, first, last, start // hop_length, pitch_options, timer)
+
+        # Drop audio no later block will need
+        keep_from = max(0, last - context_frames) * hop_length
+        buffer = buffer[keep_from - buffer_start:]
+        buffer_start = keep_from
+        first = last
+
+    return streamed
+
+
+def segment_features(y, sr, rms, segments, pitch_options=None, timer=None, n_fft=N_FFT,
+                     hop_length=HOP_LENGTH, context_frames=SEGMENT_CONTEXT_FRAMES):
+    """
+    Analyze only the (start, end) frame ranges `segments` of `y` (from
+    analysis.vad.voiced_segments), each with context_frames of audio on
+    either side; the frames between them are added as silence with their
+    `rms`. Returns a StreamedFeatures covering every frame of `y`.
+
+    The segments are pitch-tracked together first, so long takes with many
+    pauses still reach the segment-parallel pyin (track_pitch_ranges).
+    """
+    streamed = StreamedFeatures(sr, n_fft=n_fft, hop_length=hop_length)
+    streamed.n_samples = len(y)
+    pitch_options = pitch_options or {}
+    timer = timer or StageTimer()
+
+    ranges = [(max(0, first - context_frames) * hop_length, min(len(y), (last + context_frames) * hop_length))
+              for first, last in segments]
+    with timer.stage("pitch"):
+        tracks = track_pitch_ranges(y, sr, ranges, frame_length=n_fft, hop_length=hop_length,
+                                    **pitch_options)
+
+    done = 0
+    for (first, last), (start, end), (f0, _, _) in zip(segments, ranges, tracks):
+        if first > done:
+            streamed.add_silence(done, first, rms[done:first])
+        streamed.add_block(y[start:end], first, last, start // hop_length, pitch_options, timer, f0=f0)
+        done = last
+    if done < len(rms):
+        streamed.add_silence(done, len(rms), rms[done:])
+    return streamed
@@ -0,0 +1,46 @@
+"""
+Stage timing for analyze_singing_ai.
+
+Each timed stage is reported as a "stage_timing" event (picked up by the
+API's /metrics) and kept on the StageTimer so it can be returned with the
+response. Without an event sink the cost is two perf_counter calls.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from . import events
+
+
+class StageTimer:
+    """Collects wall-clock seconds per stage for one analysis."""
+
+    def __init__(self):
+        self.timings = {}
+        self._lock = threading.Lock()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            # Stages may run on several threads (analysis.stages)
+            with self._lock:
+                self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            events.emit("stage_timing", stage=name, seconds=elapsed)
+
+    def finish(self, audio_seconds, cached=False):
+        """Report the whole analysis; returns the summary used for the "debug" response field."""
+        summary = {
+            "cached": cached,
+            "audio_seconds": round(audio_seconds, 3) if audio_seconds is not None else None,
+            "wall_seconds": round(time.perf_counter() - self._wall_start, 4),
+            "cpu_seconds": round(time.process_time() - self._cpu_start, 4),
+        }
+        events.emit("analysis_timing", **summary)
+        summary["stage_seconds"] = {name: round(seconds, 4) for name, seconds in self.timings.items()}
+        return summary
@@ -0,0 +1,48 @@
+"""
+Energy-based voice activity detection.
+
+Uploads usually start and end with silence and pause between phrases.
+voiced_segments() finds the frames whose RMS is within VAD_TOP_DB of the
+loudest frame (the rule librosa.effects.split applies, but on the RMS
+track the analysis computes anyway), bridges short pauses and pads each
+segment, so pitch tracking and the diction features only run where
+someone is singing. analysis.streaming.segment_features analyzes the
+segments and maps the results back onto the full timeline.
+"""
+import numpy as np
+
+# Frames more than this far below the loudest frame are silence
+VAD_TOP_DB = 45.0
+
+# Pauses shorter than this stay inside a segment (splitting them would save
+# less than the context analyzed around each segment)
+MIN_PAUSE_S = 0.5
+
+# Kept on both sides of every segment, so note onsets and releases are analyzed
+PAD_S = 0.1
+
+# Gate only when at least this fraction of the frames can be skipped
+MIN_SKIPPED_FRACTION = 0.1
+
+
+def voiced_segments(rms, sr, hop_length, top_db=VAD_TOP_DB, min_pause_s=MIN_PAUSE_S, pad_s=PAD_S):
+    """Sorted, disjoint (start, end) frame ranges of the non-silent parts of an RMS track."""
+    rms = np.asarray(rms)
+    if not len(rms) or rms.max() <= 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    loud = (rms > rms.max() * 10 ** (-top_db / 20)).astype(np.int8)
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], loud, [0]])))
+    pad = int(round(pad_s * sr / hop_length))
+    starts = np.maximum(edges[0::2] - pad, 0)
+    ends = np.minimum(edges[1::2] + pad, len(rms))
+
+    # Merge segments separated by less than a pause (this also merges overlapping pads)
+    first = np.flatnonzero(np.concatenate([[True], starts[1:] - ends[:-1] >= min_pause_s * sr / hop_length]))
+    return np.column_stack([starts[first], np.maximum.reduceat(ends, first)])
+
+
+def skipped_fraction(segments, n_frames):
+    """Fraction of n_frames outside the segments."""
+    if n_frames <= 0:
+        return 0.0
+    return 1.0 - float(np.sum(segments[:, 1] - segments[:, 0])) / n_frames
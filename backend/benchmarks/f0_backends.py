@@ -0,0 +1,104 @@
+"""
+Accuracy drift and speed of the f0 backends against full-range pyin.
+
+Usage (from backend/):
+    python -m benchmarks.f0_backends [audio_dir] [--voice-type mezzo] [--json out.json]
+
+For every clip, each backend is compared to librosa.pyin over C2-C7 on:
+  - voicing agreement (fraction of frames with the same voiced decision)
+  - median / 95th percentile absolute cents error on frames both call voiced
+  - drift of the pitch score produced by analyze_pitch_accuracy
+
+pyin_range only differs from pyin when a range applies, so it is
+skipped unless --voice-type is given.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+import librosa
+
+from analysis.analyzer import analyze_pitch_accuracy
+from analysis.pitch import F0_METHODS, VOICE_RANGES, track_pitch
+
+SR = 22050
+HOP_LENGTH = 512
+
+
+def compare_tracks(f0_ref, voiced_ref, f0, voiced):
+    n = min(len(f0_ref), len(f0))
+    f0_ref, voiced_ref, f0, voiced = f0_ref[:n], voiced_ref[:n], f0[:n], voiced[:n]
+    both = voiced_ref & voiced & ~np.isnan(f0_ref) & ~np.isnan(f0)
+    cents = np.abs(1200.0 * np.log2(f0[both] / f0_ref[both])) if np.any(both) else np.array([np.nan])
+    return {
+        "voicing_agreement": float(np.mean(voiced_ref == voiced)),
+        "median_cents_error": float(np.nanmedian(cents)),
+        "p95_cents_error": float(np.nanpercentile(cents, 95)),
+    }
+
+
+def pitch_score(f0):
+    times = librosa.times_like(f0, sr=SR, hop_length=HOP_LENGTH)
+    return analyze_pitch_accuracy(f0, times, None, SR)[0]
+
+
+def benchmark_file(path, methods, voice_type=None):
+    y, _ = librosa.load(path, sr=SR)
+    rows = {}
+    for method in methods:
+        start = time.perf_counter()
+        f0, voiced, _ = track_pitch(y, SR, method=method, voice_type=voice_type)
+        elapsed = time.perf_counter() - start
+        rows[method] = {"seconds": elapsed, "f0": f0, "voiced": voiced}
+
+    ref = rows["pyin"]
+    ref_score = pitch_score(ref["f0"])
+    duration = len(y) / SR
+    report = {}
+    for method, row in rows.items():
+        entry = {
+            "seconds": round(row["seconds"], 3),
+            "realtime_factor": round(row["seconds"] / duration, 3),
+            "pitch_score_drift": round(pitch_score(row["f0"]) - ref_score, 3),
+        }
+        if method != "pyin":
+            entry.update({k: round(v, 3) for k, v in
+                          compare_tracks(ref["f0"], ref["voiced"], row["f0"], row["voiced"]).items()})
+        report[method] = entry
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio_dir", nargs="?", default=os.path.join(os.path.dirname(__file__), "..", "audio_samples"))
+    parser.add_argument("--voice-type", default=None, choices=sorted(VOICE_RANGES),
+                        help="Voice type used to narrow pyin_range/yin (pyin_range is skipped without it)")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.audio_dir, "*.wav")))
+    if not paths:
+        parser.error(f"No .wav files found in {args.audio_dir}")
+
+    methods = ["pyin"] + [m for m in F0_METHODS if m != "pyin"]
+    if args.voice_type is None:
+        # Without a range pyin_range is full-range pyin, so its row would only repeat pyin's
+        methods.remove("pyin_range")
+        print("No --voice-type given; skipping pyin_range (identical to pyin without a range)")
+    report = {}
+    for path in paths:
+        name = os.path.basename(path)
+        report[name] = benchmark_file(path, methods, voice_type=args.voice_type)
+        for method, entry in report[name].items():
+            print(f"{name:24s} {method:11s} " + " ".join(f"{k}={v}" for k, v in entry.items()))
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Per-stage benchmark of the analysis pipeline with a baseline regression gate.
+
+Usage (from backend/):
+    python -m benchmarks.pipeline [audio_dir] [--lengths 10,60,300,600]
+                                  [--json out.json] [--baseline benchmarks/baseline.json]
+                                  [--save-baseline] [--require-baseline] [--threshold 0.2]
+
+Every clip in audio_dir plus synthetic sung clips of the given lengths (in
+seconds) is run through each stage separately - decode, pyin,
+analyze_pitch_accuracy, analyze_breath_support, analyze_diction_articulation,
+each plot, model predict - and through analyze_singing_ai end to end
+(with the result cache disabled). Each clip runs in a fresh process so
+its peak RSS is not inflated by earlier clips.
+
+Recorded per stage: wall time, CPU time and the process peak RSS after
+the stage. With --baseline, wall time and peak RSS are compared to the
+stored report and the exit code is 1 if any stage is slower (or larger)
+than baseline * (1 + threshold). Timings are machine specific, so no
+baseline is committed: create one with --save-baseline on the machine
+that runs the gate. Without one the comparison is skipped (exit 0),
+unless --baseline was given explicitly or --require-baseline is set, in
+which case the missing file is an error (exit 2), so a CI gate cannot
+pass by accident.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+SR = 22050
+HOP_LENGTH = 512
+DEFAULT_LENGTHS = (10, 60, 300, 600)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Differences below these are treated as noise by the regression gate
+MIN_WALL_DELTA_S = 0.05
+MIN_RSS_DELTA_MB = 16
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(fn, repeat=1):
+    """Run fn `repeat` times; returns (last result, timings with the best wall/CPU time)."""
+    walls, cpus = [], []
+    for _ in range(repeat):
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        result = fn()
+        walls.append(time.perf_counter() - wall_start)
+        cpus.append(time.process_time() - cpu_start)
+    return result, {
+        "wall_s": round(min(walls), 4),
+        "cpu_s": round(min(cpus), 4),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def synthetic_clip(seconds, sr=SR, seed=0):
+    """
+    A deterministic sung-like clip: a C major melody with vibrato, a few
+    harmonics, breath noise and short pauses between phrases.
+    """
+    rng = np.random.default_rng(seed)
+    melody = [60, 62, 64, 65, 67, 69, 71, 72, 71, 69, 67, 65, 64, 62]
+    note_s = 0.5
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+    note_index = (t // note_s).astype(int)
+    midi = np.asarray(melody)[note_index % len(melody)]
+    f0 = 440.0 * 2 ** ((midi - 69) / 12) * (1 + 0.006 * np.sin(2 * np.pi * 5.5 * t))
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(np.sin(k * phase) / k for k in range(1, 5))
+
+    # Phrases of 8 notes followed by a 0.3 s breath
+    phrase_s = 8 * note_s
+    in_phrase = (t % (phrase_s + 0.3)) < phrase_s
+    envelope = np.where(in_phrase, 1.0, 0.0)
+    envelope = np.convolve(envelope, np.hanning(1024) / np.hanning(1024).sum(), mode="same")
+    y = 0.3 * y * envelope + 0.003 * rng.standard_normal(n)
+    return y.astype(np.float32)
+
+
+def benchmark_clip(path, repeat=1):
+    """Time every pipeline stage on one audio file; runs in a fresh worker process."""
+    import librosa
+    from analysis.analyzer import (analyze_breath_support, analyze_diction_articulation,
+                                   analyze_pitch_accuracy, analyze_singing_ai)
+    from analysis.decode import decode_audio
+    from analysis.features import FeatureContext
+    from analysis.model import get_advanced_model, predict_total
+    from analysis.pitch import track_pitch
+    from analysis.plots import PLOT_NAMES, RENDERERS, build_plot_data
+
+    get_advanced_model()
+    stages = {}
+
+    (y, sr), stages["decode"] = measure(lambda: decode_audio(path, SR), repeat)
+    (f0, _, _), stages["pyin"] = measure(lambda: track_pitch(y, sr, method="pyin"), repeat)
+    times = librosa.times_like(f0, sr=sr, hop_length=HOP_LENGTH)
+    rms = librosa.feature.rms(y=y, hop_length=HOP_LENGTH)[0]
+
+    pitch, stages["analyze_pitch_accuracy"] = measure(
+        lambda: analyze_pitch_accuracy(f0, times, None, sr), repeat)
+    breath, stages["analyze_breath_support"] = measure(
+        lambda: analyze_breath_support(y, sr, rms), repeat)
+    # Includes computing the shared spectral features from scratch
+    diction, stages["analyze_diction_articulation"] = measure(
+        lambda: analyze_diction_articulation(y, sr, features=FeatureContext(y, sr)), repeat)
+
+    features = FeatureContext(y, sr)
+    scores = {"pitch": pitch[0], "breath": breath[0], "diction": diction[0]}
+    plot_data, stages["plot_data"] = measure(
+        lambda: build_plot_data(times, f0, rms, features, scores), repeat)
+    for name in PLOT_NAMES:
+        _, stages[f"plot_{name}"] = measure(lambda: RENDERERS[name](plot_data), repeat)
+
+    _, stages["model_predict"] = measure(
+        lambda: predict_total([[pitch[0], breath[0], diction[0]]]), repeat)
+    _, stages["analyze_singing_ai"] = measure(
+        lambda: analyze_singing_ai(path, use_cache=False), repeat)
+
+    return {"duration_s": round(len(y) / sr, 2), "stages": stages}
+
+
+def run_isolated(path, repeat):
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(benchmark_clip, path, repeat).result()
+
+
+def compare(report, baseline, threshold):
+    """Return a list of human-readable regressions of `report` against `baseline`."""
+    regressions = []
+    for clip, entry in report["clips"].items():
+        base_entry = baseline.get("clips", {}).get(clip)
+        if base_entry is None:
+            continue
+        for stage, timings in entry["stages"].items():
+            base = base_entry["stages"].get(stage)
+            if base is None:
+                continue
+            for metric, min_delta in (("wall_s", MIN_WALL_DELTA_S), ("peak_rss_mb", MIN_RSS_DELTA_MB)):
+                new, old = timings[metric], base[metric]
+                if new > old * (1 + threshold) and new - old > min_delta:
+                    regressions.append(f"{clip} {stage} {metric}: {old} -> {new} "
+                                       f"(+{(new / old - 1) * 100 if old else float('inf'):.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio_dir", nargs="?", default=os.path.join(os.path.dirname(__file__), "..", "audio_samples"))
+    parser.add_argument("--lengths", default=",".join(str(s) for s in DEFAULT_LENGTHS),
+                        help="Comma-separated synthetic clip lengths in seconds (empty for none)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage; the fastest is kept")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write the report as JSON")
+    parser.add_argument("--baseline", default=None,
+                        help="Baseline report to compare against (default: benchmarks/baseline.json)")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="Fail (exit 2) instead of skipping the comparison when there is no baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown before a stage counts as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+    required = args.require_baseline or args.baseline is not None
+    args.baseline = args.baseline or DEFAULT_BASELINE
+
+    import soundfile as sf
+    from analysis.cache import ANALYZER_VERSION
+
+    clips = {os.path.basename(p): p for p in sorted(glob.glob(os.path.join(args.audio_dir, "*.wav")))}
+    lengths = [float(s) for s in args.lengths.split(",") if s.strip()]
+
+    report = {
+        "meta": {
+            "analyzer_version": ANALYZER_VERSION,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "clips": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for seconds in lengths:
+            name = f"synthetic_{seconds:g}s"
+            path = os.path.join(tmp_dir, f"{name}.wav")
+            sf.write(path, synthetic_clip(seconds), SR)
+            clips[name] = path
+
+        for name, path in clips.items():
+            entry = run_isolated(path, args.repeat)
+            report["clips"][name] = entry
+            audio_s = entry["duration_s"]
+            for stage, t in entry["stages"].items():
+                print(f"{name:24s} {stage:30s} wall={t['wall_s']:8.3f}s cpu={t['cpu_s']:8.3f}s "
+                      f"rss={t['peak_rss_mb']:7.1f}MB  x{t['wall_s'] / audio_s:.3f} realtime")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 2 if required else 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"No regressions above {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
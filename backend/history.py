@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+
+# Score columns that can be charted with HistoryStore.trend()
+TREND_METRICS = ("total_score", "pitch_score", "breath_score", "diction_score", "pitch_accuracy")
+
+SUMMARY_COLUMNS = ("take_id", "user_id", "piece_id", "analysis_id", "analyzer_version", "created_at",
+                   "total_score", "pitch_score", "breath_score", "diction_score", "pitch_accuracy")
+
+
+class HistoryStore:
+    """
+    Per-user analysis history in a local SQLite file (WAL mode).
+
+    Each take keeps its scores, detailed subscores, compact feature series,
+    reference notes and analyzer version, so progress views never re-run
+    audio analysis. The indexes cover the three history queries:
+    recent takes and score trends by (user_id, created_at), and the best
+    take per piece by (user_id, piece_id, total_score).
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # Durable across crashes in WAL mode; only an OS crash can lose the last commits
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS takes (
+                    take_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    piece_id TEXT,
+                    analysis_id TEXT,
+                    analyzer_version TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    total_score REAL NOT NULL,
+                    pitch_score REAL NOT NULL,
+                    breath_score REAL NOT NULL,
+                    diction_score REAL NOT NULL,
+                    pitch_accuracy REAL,
+                    detailed_scores TEXT NOT NULL,
+                    reference_notes TEXT,
+                    series TEXT
+                )
+                """
+            )
+            # Last N takes and trends: a range scan on user_id, created_at (the
+            # pitch accuracy trend is answered from the index alone)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS takes_user_created ON takes (user_id, created_at, pitch_accuracy)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS takes_user_piece_score ON takes (user_id, piece_id, total_score)")
+
+    def record(self, user_id: str, result: dict, analyzer_version: str,
+               piece_id: Optional[str] = None, created_at: Optional[float] = None) -> str:
+        """Store an analysis result (the /analyze JSON); returns its take_id."""
+        take_id = uuid.uuid4().hex
+        detailed = result.get("detailed_scores", {})
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO takes (take_id, user_id, piece_id, analysis_id, analyzer_version, created_at, "
+                "total_score, pitch_score, breath_score, diction_score, pitch_accuracy, "
+                "detailed_scores, reference_notes, series) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    take_id, user_id, piece_id, result.get("analysis_id"), analyzer_version,
+                    created_at if created_at is not None else time.time(),
+                    result["total_score"], result["pitch_score"], result["breath_score"], result["diction_score"],
+                    detailed.get("pitch", {}).get("accuracy"),
+                    json.dumps(detailed),
+                    json.dumps(result.get("reference_notes")),
+                    json.dumps(result["series"]) if result.get("series") else None,
+                ),
+            )
+        return take_id
+
+    def recent(self, user_id: str, limit: int = 20, piece_id: Optional[str] = None) -> list:
+        """The user's last `limit` takes, newest first (scores only)."""
+        query = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM takes WHERE user_id = ?"
+        params = [user_id]
+        if piece_id is not None:
+            query += " AND piece_id = ?"
+            params.append(piece_id)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def trend(self, user_id: str, metric: str = "pitch_accuracy", days: float = 90) -> list:
+        """(created_at, value) points of one score over the last `days` days, oldest first."""
+        if metric not in TREND_METRICS:
+            raise ValueError(f"metric must be one of: {', '.join(TREND_METRICS)}")
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT created_at, {metric} AS value FROM takes "
+                "WHERE user_id = ? AND created_at >= ? ORDER BY created_at",
+                (user_id, time.time() - days * 86400),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def best_per_piece(self, user_id: str) -> list:
+        """The highest-scoring take of each piece the user has sung."""
+        # SQLite returns the bare columns of the row that holds the MAX()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT piece_id, MAX(total_score) AS total_score, take_id, created_at, "
+                "pitch_score, breath_score, diction_score, COUNT(*) AS takes "
+                "FROM takes WHERE user_id = ? AND piece_id IS NOT NULL GROUP BY piece_id",
+                (user_id,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, user_id: str, take_id: str) -> Optional[dict]:
+        """One take with its detailed scores, reference notes and series."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM takes WHERE take_id = ? AND user_id = ?", (take_id, user_id)
+            ).fetchone()
+        if row is None:
+            return None
+        take = dict(row)
+        for field in ("detailed_scores", "reference_notes", "series"):
+            take[field] = json.loads(take[field]) if take[field] is not None else None
+        return take
+
+
+def history_store_from_env() -> Optional[HistoryStore]:
+    """HistoryStore at HISTORY_DB (default history.db next to main.py); HISTORY_DB=off disables it."""
+    path = os.getenv("HISTORY_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.db"))
+    if path.lower() in ("", "off", "none"):
+        return None
+    return HistoryStore(path)
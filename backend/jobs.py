@@ -0,0 +1,209 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+
+from analysis import events
+
+# Progress stages reported by analyze_singing_ai, in order
+STAGES = ("decode", "pitch", "breath", "diction", "plots")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def report_progress(job_id: str, stage: str) -> None:
+    """Progress callback handed to analyze_singing_ai; runs inside pool workers."""
+    events.emit("job_progress", job_id=job_id, stage=stage)
+
+
+def _progress_for(stage: Optional[str]) -> float:
+    if stage not in STAGES:
+        return 0.0
+    return round(STAGES.index(stage) / len(STAGES), 2)
+
+
+class MemoryJobStore:
+    """In-process job store; finished jobs are evicted `ttl` seconds after their last update."""
+
+    def __init__(self, ttl: int = 3600):
+        self.ttl = ttl
+        self._jobs = {}
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def create(self) -> dict:
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": QUEUED,
+            "stage": None,
+            "progress": 0.0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._lock:
+            self._evict_expired(now)
+            self._jobs[job["job_id"]] = job
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            self._evict_expired(time.time())
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job["updated_at"] = time.time()
+
+    def update_if_active(self, job_id: str, **fields) -> None:
+        """update(), unless the job has already finished (checked under the same lock)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in (DONE, FAILED):
+                return
+            job.update(fields)
+            job["updated_at"] = time.time()
+
+    def set_result(self, job_id: str, result: dict) -> None:
+        with self._lock:
+            if job_id not in self._jobs:
+                return
+            self._results[job_id] = result
+        self.update(job_id, status=DONE, stage=None, progress=1.0)
+
+    def get_result(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._results.get(job_id)
+
+    def _evict_expired(self, now: float) -> None:
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["status"] in (DONE, FAILED) and now - job["updated_at"] > self.ttl]
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+            self._results.pop(job_id, None)
+
+
+class SqliteJobStore:
+    """Job store backed by a local SQLite file, so jobs survive worker restarts."""
+
+    def __init__(self, path: str, ttl: int = 3600):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    progress REAL NOT NULL DEFAULT 0,
+                    error TEXT,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)")
+
+    def create(self) -> dict:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._evict_expired(now)
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, status, progress, created_at, updated_at) VALUES (?, ?, 0, ?, ?)",
+                (job_id, QUEUED, now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, status, stage, progress, error, created_at, updated_at "
+                "FROM jobs WHERE job_id = ? AND NOT (status IN (?, ?) AND updated_at < ?)",
+                (job_id, DONE, FAILED, time.time() - self.ttl),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id: str, **fields) -> None:
+        if not fields:
+            return
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {columns}, updated_at = ? WHERE job_id = ?",
+                (*fields.values(), time.time(), job_id),
+            )
+
+    def update_if_active(self, job_id: str, **fields) -> None:
+        """update(), unless the job has already finished (checked in the same statement)."""
+        if not fields:
+            return
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {columns}, updated_at = ? WHERE job_id = ? AND status NOT IN (?, ?)",
+                (*fields.values(), time.time(), job_id, DONE, FAILED),
+            )
+
+    def set_result(self, job_id: str, result: dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, stage = NULL, progress = 1, result = ?, updated_at = ? "
+                "WHERE job_id = ?",
+                (DONE, json.dumps(result), time.time(), job_id),
+            )
+
+    def get_result(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None or row["result"] is None:
+            return None
+        return json.loads(row["result"])
+
+    def _evict_expired(self, now: float) -> None:
+        self._conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (DONE, FAILED, now - self.ttl),
+        )
+
+
+def job_store_from_env():
+    """
+    Build the job store from JOB_STORE ("memory" or "sqlite:<path>") and
+    JOB_TTL (seconds a finished job stays retrievable).
+    """
+    ttl = int(os.getenv("JOB_TTL", "3600"))
+    spec = os.getenv("JOB_STORE", "memory")
+    if spec.startswith("sqlite:"):
+        return SqliteJobStore(spec[len("sqlite:"):], ttl=ttl)
+    if spec != "memory":
+        raise ValueError(f"Unknown JOB_STORE: {spec}")
+    return MemoryJobStore(ttl=ttl)
+
+
+def track_progress(store) -> None:
+    """Apply progress events emitted by analysis workers to `store`."""
+
+    def on_progress(job_id, stage):
+        # Events are delivered asynchronously and may trail the final result,
+        # so finished jobs are skipped atomically with the write
+        store.update_if_active(job_id, status=RUNNING, stage=stage, progress=_progress_for(stage))
+
+    events.subscribe("job_progress", on_progress)
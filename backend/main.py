@@ -1,11 +1,39 @@
 import os
-import subprocess
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import asyncio
+import functools
+import tempfile
+import time
+import uuid
+import aiofiles
+import json
+import numpy as np
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from analysis.analyzer import analyze_singing_ai
-from typing import Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from analysis import startup
+# Headless plotting and the on-disk JIT cache must be set up before librosa/numba/matplotlib load
+startup.configure()
+from analysis.analyzer import (PITCH_ALIGNMENTS, analyze_live_take, analyze_singing_ai, render_stored_plot,
+                               stored_series)
+from analysis.batch import analyze_file, parse_reference_map, summary_csv, to_ndjson
+from analysis import events
+from analysis.cache import ANALYZER_VERSION, _to_json
+from analysis.decode import DecodeError
+from analysis.live import LIVE_SR, LiveSession
+from analysis.model import get_advanced_model, model_info
+from analysis.pitch import F0_METHODS, VOICE_RANGES
+from analysis.plots import IMAGE_FORMATS, PLOT_NAMES
+from analysis.references import ReferenceNotes, compile_reference, get_library, get_piece
+from worker_pool import AnalysisPool, PoolBroken, PoolSaturated
+from jobs import DONE, FAILED, job_store_from_env, report_progress, track_progress
+from history import TREND_METRICS, history_store_from_env
+from scratch import scratch_space_from_env, upload_path
+from metrics import UPLOAD_BYTES, render_metrics, time_stage, track_metrics
+from typing import List, Optional
 from pathlib import Path
 import logging
+from collections import Counter, OrderedDict
 
 # Configure logging
 logging.basicConfig(
@@ -14,10 +42,69 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ====================== Analysis Worker Pool ======================
+# CPU-bound analysis runs in a bounded process pool so the event loop (and
+# /health) stays responsive while jobs are running.
+analysis_pool = AnalysisPool.from_env()
+
+# On-demand plots are rendered from plot data cached by whichever worker ran
+# the analysis, so with several workers the cache needs its shared disk tier.
+# Workers inherit the environment when they are spawned.
+if analysis_pool.max_workers > 1:
+    os.environ.setdefault("RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pitchpanel-cache"))
+
+# Result cache hit/miss counts, reported by workers through analysis.events
+result_cache_counts = Counter()
+events.subscribe("result_cache", lambda outcome: result_cache_counts.update([outcome]))
+
+# Stage timings, audio durations and cache outcomes for /metrics
+track_metrics()
+
+# Warm-up time of each analysis process (pid -> seconds, None when warm-up is off)
+worker_warmups = {}
+events.subscribe("worker_ready", lambda pid, warmup_seconds: worker_warmups.__setitem__(pid, warmup_seconds))
+
+# Readiness probes are not counted as the first request
+STARTUP_UNTIMED_PATHS = ("/health", "/metrics")
+
+# Every request writes its uploads to its own scratch directory, removed
+# when the request or job finishes
+scratch = scratch_space_from_env()
+SCRATCH_REAP_INTERVAL = float(os.getenv("SCRATCH_REAP_INTERVAL", "300"))
+
+
+async def reap_scratch():
+    """Periodically remove scratch directories orphaned by crashed requests or processes."""
+    while True:
+        await asyncio.sleep(SCRATCH_REAP_INTERVAL)
+        await asyncio.to_thread(scratch.reap)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.mark("imported")
+    get_advanced_model()
+    get_library()
+    if analysis_pool.max_workers <= 0 and startup.warmup_enabled():
+        # In-process analysis: warm up here, before events are dispatched locally
+        worker_warmups[os.getpid()] = round(await asyncio.to_thread(startup.warm_up), 3)
+    analysis_pool.start()
+    await asyncio.to_thread(scratch.reap)
+    reaper = asyncio.create_task(reap_scratch())
+    await analysis_pool.wait_ready()
+    logger.info(f"Ready in {startup.mark('ready')}s")
+    try:
+        yield
+    finally:
+        reaper.cancel()
+        analysis_pool.shutdown()
+
+
 app = FastAPI(
     title="Singing Analysis API",
     description="API for analyzing vocal performances",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # ====================== CORS Configuration ======================
@@ -49,30 +136,51 @@ app.add_middleware(
     expose_headers=["*"]  # Changed from just Content-Disposition
 )
 
+@app.middleware("http")
+async def time_first_request(request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    if request.url.path not in STARTUP_UNTIMED_PATHS:
+        startup.mark_first_request(time.perf_counter() - start)
+    return response
+
 # ====================== Constants & Helpers ======================
-UPLOAD_DIR = "temp_uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
-def save_upload_file(upload_file: UploadFile, destination: str) -> None:
-    """Save uploaded file with size validation and error handling"""
-    try:
-        # Check file size
-        upload_file.file.seek(0, os.SEEK_END)
-        file_size = upload_file.file.tell()
-        upload_file.file.seek(0)
-        
-        if file_size > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large. Max size is {MAX_FILE_SIZE/1024/1024}MB"
-            )
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+def file_too_large_error() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large. Max size is {MAX_FILE_SIZE/1024/1024}MB"
+    )
+
+async def save_upload_file(upload_file: UploadFile, destination: str) -> None:
+    """
+    Stream an uploaded file to disk in fixed-size chunks, enforcing the size
+    limit as bytes arrive so memory use stays constant regardless of size.
+    """
+    # Reject early when the client declared the size up front
+    if upload_file.size is not None and upload_file.size > MAX_FILE_SIZE:
+        raise file_too_large_error()
 
-        with open(destination, "wb") as buffer:
-            content = upload_file.file.read()
-            buffer.write(content)
-        logger.info(f"Saved file to {destination}")
+    try:
+        written = 0
+        with time_stage("upload"):
+            async with aiofiles.open(destination, "wb") as buffer:
+                while True:
+                    chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > MAX_FILE_SIZE:
+                        raise file_too_large_error()
+                    await buffer.write(chunk)
+        UPLOAD_BYTES.observe(written)
+        logger.info(f"Saved file to {destination} ({written} bytes)")
     except HTTPException:
+        if os.path.exists(destination):
+            os.remove(destination)
         raise
     except Exception as e:
         logger.error(f"Error saving file {upload_file.filename}: {str(e)}")
@@ -81,93 +189,203 @@ def save_upload_file(upload_file: UploadFile, destination: str) -> None:
             detail=f"Could not save file: {str(e)}"
         )
 
-def convert_to_wav(input_path: str) -> str:
-    """Convert audio file to standardized WAV format"""
-    base, ext = os.path.splitext(input_path)
-    wav_path = base + ".wav"
+def parse_reference_notes(reference: Optional[str], piece_id: Optional[str] = None) -> Optional[ReferenceNotes]:
+    """
+    Compile the comma-separated reference form field, or use the library
+    piece `piece_id` when no notes are given. A piece_id that is not in the
+    library only labels the take in the user's history.
+    """
+    if not reference:
+        return get_piece(piece_id) if piece_id else None
+    try:
+        ref_notes = [note.strip() for note in reference.split(",") if note.strip()]
+        if not ref_notes:
+            raise ValueError("No valid notes provided")
+        return compile_reference(ref_notes)
+    except Exception as e:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Invalid reference notes format: {str(e)}"
+        )
 
-    if ext.lower() != ".wav":
-        try:
-            result = subprocess.run([
-                "ffmpeg", "-y", "-i", input_path, 
-                "-ar", "22050", "-ac", "1", "-sample_fmt", "s16",
-                wav_path
-            ], check=True, capture_output=True, text=True)
-            
-            logger.info(f"Converted {input_path} to WAV format")
-            logger.debug(f"FFmpeg output: {result.stdout}")
-            return wav_path
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFmpeg conversion failed: {e.stderr}")
+def validate_analysis_options(f0_method: str, voice_type: Optional[str], alignment: str = "dtw") -> None:
+    if alignment not in PITCH_ALIGNMENTS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"alignment must be one of: {', '.join(PITCH_ALIGNMENTS)}"
+        )
+    if f0_method not in F0_METHODS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"f0_method must be one of: {', '.join(F0_METHODS)}"
+        )
+    if voice_type and voice_type not in VOICE_RANGES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"voice_type must be one of: {', '.join(VOICE_RANGES)}"
+        )
+
+def parse_output_options(plots: Optional[str], output: str, image_format: str) -> dict:
+    """
+    Translate the plots/output/image_format form fields into analyzer kwargs.
+    plots is "all", "none" or a comma-separated subset of PLOT_NAMES; the
+    compact output mode returns downsampled series and skips plots unless
+    they are requested explicitly.
+    """
+    if output not in ("full", "compact"):
+        raise HTTPException(status_code=422, detail="output must be 'full' or 'compact'")
+    if image_format not in IMAGE_FORMATS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"image_format must be one of: {', '.join(IMAGE_FORMATS)}"
+        )
+
+    if plots is None:
+        plots = "none" if output == "compact" else "all"
+    if plots == "all":
+        selected = PLOT_NAMES
+    elif plots == "none":
+        selected = ()
+    else:
+        selected = tuple(name.strip() for name in plots.split(",") if name.strip())
+        unknown = [name for name in selected if name not in PLOT_NAMES]
+        if unknown:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Unknown plots: {', '.join(unknown)}. Choose from: {', '.join(PLOT_NAMES)}"
+            )
+
+    return {"plots": selected, "series": output == "compact", "image_format": image_format}
+
+async def save_analysis_uploads(audio_file: UploadFile, sheet_music: Optional[UploadFile],
+                                scratch_dir: str) -> tuple:
+    """
+    Validate and save the audio and optional sheet music into the request's
+    scratch directory. Audio is decoded in-process by the analysis worker,
+    so it is stored as uploaded; only the file extension of the client's
+    name is kept.
+    """
+    # Validate audio file
+    if not audio_file.filename:
+        raise HTTPException(
+            status_code=422,
+            detail="Audio file must have a filename"
+        )
+
+    # Save and process audio
+    audio_path = upload_path(scratch_dir, "audio", audio_file.filename)
+    await save_upload_file(audio_file, audio_path)
+
+    # Process sheet music if provided
+    sheet_path = None
+    if sheet_music:
+        if not sheet_music.filename:
             raise HTTPException(
                 status_code=422,
-                detail=f"Audio conversion failed: {e.stderr}"
+                detail="Sheet music file must have a filename"
             )
-    return input_path
+
+        if not any(sheet_music.filename.lower().endswith(ext)
+                  for ext in ['.png', '.jpg', '.jpeg']):
+            raise HTTPException(
+                status_code=422,
+                detail="Sheet music must be PNG or JPG"
+            )
+
+        sheet_path = upload_path(scratch_dir, "sheet", sheet_music.filename)
+        await save_upload_file(sheet_music, sheet_path)
+
+    return audio_path, sheet_path
+
+def pool_saturated_error(e: PoolSaturated) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=(f"{e}, please retry shortly" if isinstance(e, PoolBroken)
+                else "Analysis queue is full, please retry shortly"),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+# ====================== Analysis History ======================
+# Analyses submitted with a user_id are recorded (scores, subscores, compact
+# series) so progress can be charted without re-running any analysis.
+history_store = history_store_from_env()
+
+def history_options(output_options: dict, user_id: Optional[str]) -> dict:
+    """The compact series are always computed for takes that will be recorded."""
+    if user_id and history_store is not None:
+        return dict(output_options, series=True)
+    return output_options
+
+def record_take(result: dict, user_id: Optional[str], piece_id: Optional[str], keep_series: bool) -> dict:
+    """Store `result` in the user's history; adds take_id and drops series the client did not ask for."""
+    if not user_id or history_store is None:
+        return result
+    result = dict(result)
+    try:
+        result["take_id"] = history_store.record(user_id, result, ANALYZER_VERSION, piece_id=piece_id)
+    except Exception as e:
+        logger.warning(f"Could not record take for {user_id}: {str(e)}")
+    if not keep_series:
+        result.pop("series", None)
+    return result
 
 # ====================== API Endpoints ======================
 @app.post("/analyze")
 async def analyze_audio(
     audio_file: UploadFile = File(..., description="Audio file (WAV, MP3, etc.)"),
     sheet_music: Optional[UploadFile] = File(None, description="Optional sheet music (PNG, JPG)"),
-    reference: Optional[str] = Form(None, description="Optional reference notes (comma-separated)")
+    reference: Optional[str] = Form(None, description="Optional reference notes (comma-separated)"),
+    f0_method: str = Form("pyin", description="Pitch tracker: pyin, pyin_range or yin"),
+    voice_type: Optional[str] = Form(None, description="Optional voice type used to narrow the pitch range"),
+    alignment: str = Form("dtw", description="Reference alignment: dtw (tempo-independent) or linear"),
+    plots: Optional[str] = Form(None, description="Plots to render: all, none or a comma-separated subset of pitch,breath,diction"),
+    output: str = Form("full", description="full, or compact for downsampled series instead of plots"),
+    image_format: str = Form("png", description="Plot image format: png or svg"),
+    timings: bool = Form(False, description="Include per-stage timings under debug"),
+    streaming: bool = Form(False, description="Analyze in blocks with bounded memory (for long recordings)"),
+    user_id: Optional[str] = Form(None, description="Record the take in this user's history"),
+    piece_id: Optional[str] = Form(None, description="Reference library piece (used when reference is empty) or a label for per-piece history")
 ):
-    audio_path = None
-    sheet_path = None
+    scratch_dir = None
     
     try:
-        # Validate audio file
-        if not audio_file.filename:
-            raise HTTPException(
-                status_code=422,
-                detail="Audio file must have a filename"
-            )
-            
-        # Save and process audio
-        audio_path = os.path.join(UPLOAD_DIR, audio_file.filename)
-        save_upload_file(audio_file, audio_path)
-        audio_path = convert_to_wav(audio_path)
-        
-        # Process sheet music if provided
-        if sheet_music:
-            if not sheet_music.filename:
-                raise HTTPException(
-                    status_code=422,
-                    detail="Sheet music file must have a filename"
-                )
-                
-            if not any(sheet_music.filename.lower().endswith(ext) 
-                      for ext in ['.png', '.jpg', '.jpeg']):
-                raise HTTPException(
-                    status_code=422,
-                    detail="Sheet music must be PNG or JPG"
-                )
-                
-            sheet_path = os.path.join(UPLOAD_DIR, sheet_music.filename)
-            save_upload_file(sheet_music, sheet_path)
-        
-        # Process reference notes
-        ref_notes = None
-        if reference:
-            try:
-                ref_notes = [note.strip() for note in reference.split(",") if note.strip()]
-                if not ref_notes:
-                    raise ValueError("No valid notes provided")
-            except Exception as e:
-                raise HTTPException(
-                    status_code=422,
-                    detail=f"Invalid reference notes format: {str(e)}"
-                )
-        
+        ref_notes = parse_reference_notes(reference, piece_id)
+        validate_analysis_options(f0_method, voice_type, alignment)
+        output_options = parse_output_options(plots, output, image_format)
+        upload_start = time.perf_counter()
+        scratch_dir = scratch.create()
+        audio_path, sheet_path = await save_analysis_uploads(audio_file, sheet_music, scratch_dir)
+        upload_seconds = time.perf_counter() - upload_start
+
         # Run analysis
-        result = analyze_singing_ai(
+        result = await analysis_pool.run(
+            analyze_singing_ai,
             file_path=audio_path,
             reference_notes=ref_notes,
-            sheet_image_path=sheet_path
+            sheet_image_path=sheet_path,
+            f0_method=f0_method,
+            voice_type=voice_type,
+            timings=timings,
+            streaming=streaming,
+            alignment=alignment,
+            **history_options(output_options, user_id)
         )
+        # The history insert is blocking SQLite I/O; keep it off the event loop
+        result = await asyncio.to_thread(record_take, result, user_id, piece_id, output_options["series"])
+
+        if timings:
+            result["debug"]["upload_seconds"] = round(upload_seconds, 4)
         
         return result
         
+    except PoolSaturated as e:
+        raise pool_saturated_error(e)
+    except DecodeError as e:
+        logger.error(f"Audio decoding failed: {str(e)}")
+        raise HTTPException(
+            status_code=422,
+            detail=str(e)
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -177,24 +395,455 @@ async def analyze_audio(
             detail="Internal server error during analysis"
         )
     finally:
-        # Cleanup files
-        for path in [audio_path, sheet_path]:
-            if path and os.path.exists(path):
+        scratch.release(scratch_dir)
+
+# ====================== Batch Analysis ======================
+# A batch streams one NDJSON line per file as each analysis finishes, then a
+# final line pointing at the summary CSV. Plots are skipped; they can be
+# rendered afterwards from each result's analysis_id.
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "50"))
+BATCH_SUMMARY_LIMIT = 100  # summaries kept for GET /analyze/batch/{id}/summary.csv
+batch_summaries = OrderedDict()
+
+def batch_error_record(name: str, error: Exception) -> dict:
+    """The record analyze_file would return for a file that failed outside the analysis."""
+    return {"file": name, "status": "error", "error": str(error), "seconds": None}
+
+async def stream_batch(batch_id: str, batch_dir: str, files: list, options: dict):
+    """
+    Submit the batch's files to the analysis pool, at most one per worker at
+    a time so a large batch cannot fill the queue ahead of /analyze
+    requests, and yield NDJSON records as they complete.
+    """
+    remaining = list(files)
+    pending = set()
+    names = {}
+    records = []
+    max_pending = max(1, analysis_pool.max_workers)
+    try:
+        while remaining or pending:
+            while remaining and len(pending) < max_pending and analysis_pool.has_capacity():
+                name, path, ref_notes = remaining.pop(0)
+                try:
+                    future = analysis_pool.submit(
+                        analyze_file, path, name=name, reference_notes=ref_notes, **options
+                    )
+                except PoolSaturated as e:
+                    # A crashed worker (PoolBroken) fails this file, not the whole stream
+                    record = batch_error_record(name, e)
+                    records.append(record)
+                    yield to_ndjson(record)
+                    continue
+                pending.add(future)
+                names[future] = name
+            if not pending:
+                if remaining:
+                    # The pool is full with other requests; wait for a free slot
+                    await asyncio.sleep(0.1)
+                continue
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # analyze_file records analysis errors itself; this is the pool failing
+                    logger.error(f"Batch {batch_id}: {names[future]} failed in the pool: {str(e)}")
+                    record = batch_error_record(names[future], e)
+                records.append(record)
+                yield to_ndjson(record)
+
+        batch_summaries[batch_id] = summary_csv(records)
+        while len(batch_summaries) > BATCH_SUMMARY_LIMIT:
+            batch_summaries.popitem(last=False)
+        yield to_ndjson({
+            "batch_id": batch_id,
+            "files": len(records),
+            "failed": sum(record["status"] != "ok" for record in records),
+            "summary_url": f"/analyze/batch/{batch_id}/summary.csv"
+        })
+    finally:
+        # If the client went away, drop the files not yet submitted, cancel
+        # the queued ones and let running ones finish before their inputs
+        # are deleted
+        remaining.clear()
+        for future in pending:
+            future.cancel()
+        if pending:
+            await asyncio.wait(pending)
+        scratch.release(batch_dir)
+
+@app.post("/analyze/batch")
+async def analyze_batch(
+    audio_files: List[UploadFile] = File(..., description="Audio files (WAV, MP3, etc.)"),
+    reference: Optional[str] = Form(None, description="Optional reference notes for every file (comma-separated)"),
+    references: Optional[str] = Form(None, description="Optional JSON object mapping file name to reference notes"),
+    f0_method: str = Form("pyin", description="Pitch tracker: pyin, pyin_range or yin"),
+    voice_type: Optional[str] = Form(None, description="Optional voice type used to narrow the pitch range")
+):
+    if len(audio_files) > MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many files. Max batch size is {MAX_BATCH_FILES}"
+        )
+    if not analysis_pool.has_capacity():
+        raise pool_saturated_error(PoolSaturated(analysis_pool.retry_after))
+
+    ref_notes = parse_reference_notes(reference)
+    validate_analysis_options(f0_method, voice_type)
+    try:
+        reference_map = parse_reference_map(references)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid references: {str(e)}")
+
+    names = [audio_file.filename for audio_file in audio_files]
+    if not all(names):
+        raise HTTPException(status_code=422, detail="Audio files must have filenames")
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=422, detail="Audio file names must be unique within a batch")
+
+    batch_id = uuid.uuid4().hex
+    batch_dir = scratch.create(prefix="batch-")
+    files = []
+    try:
+        for index, audio_file in enumerate(audio_files):
+            path = upload_path(batch_dir, f"{index:04d}", audio_file.filename)
+            await save_upload_file(audio_file, path)
+            files.append((audio_file.filename, path, reference_map.get(audio_file.filename, ref_notes)))
+    except Exception:
+        scratch.release(batch_dir)
+        raise
+
+    options = {"f0_method": f0_method, "voice_type": voice_type, "plots": ()}
+    return StreamingResponse(
+        stream_batch(batch_id, batch_dir, files, options),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Id": batch_id}
+    )
+
+@app.get("/analyze/batch/{batch_id}/summary.csv")
+async def get_batch_summary(batch_id: str):
+    summary = batch_summaries.get(batch_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Batch not found, unfinished or expired")
+    return Response(
+        content=summary,
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="batch-{batch_id}.csv"'}
+    )
+
+# ====================== Analysis Jobs ======================
+# Long analyses can be submitted as jobs: POST /jobs returns immediately and
+# the client polls GET /jobs/{id} for progress, then fetches the result.
+job_store = job_store_from_env()
+track_progress(job_store)
+
+def _store_job_result(job_id: str, scratch_dir: str, user_id: Optional[str], piece_id: Optional[str],
+                      keep_series: bool, future) -> None:
+    try:
+        job_store.set_result(job_id, record_take(future.result(), user_id, piece_id, keep_series))
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {str(e)}")
+        job_store.update(job_id, status=FAILED, error=str(e))
+    finally:
+        scratch.release(scratch_dir)
+
+def _finish_job(*args) -> None:
+    """Done callback for a job's future; the history and job-store writes run in a thread, not on the loop."""
+    asyncio.get_running_loop().run_in_executor(None, functools.partial(_store_job_result, *args))
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    audio_file: UploadFile = File(..., description="Audio file (WAV, MP3, etc.)"),
+    sheet_music: Optional[UploadFile] = File(None, description="Optional sheet music (PNG, JPG)"),
+    reference: Optional[str] = Form(None, description="Optional reference notes (comma-separated)"),
+    f0_method: str = Form("pyin", description="Pitch tracker: pyin, pyin_range or yin"),
+    voice_type: Optional[str] = Form(None, description="Optional voice type used to narrow the pitch range"),
+    alignment: str = Form("dtw", description="Reference alignment: dtw (tempo-independent) or linear"),
+    plots: Optional[str] = Form(None, description="Plots to render: all, none or a comma-separated subset of pitch,breath,diction"),
+    output: str = Form("full", description="full, or compact for downsampled series instead of plots"),
+    image_format: str = Form("png", description="Plot image format: png or svg"),
+    timings: bool = Form(False, description="Include per-stage timings under debug"),
+    streaming: bool = Form(False, description="Analyze in blocks with bounded memory (for long recordings)"),
+    user_id: Optional[str] = Form(None, description="Record the take in this user's history"),
+    piece_id: Optional[str] = Form(None, description="Reference library piece (used when reference is empty) or a label for per-piece history")
+):
+    if not analysis_pool.has_capacity():
+        raise pool_saturated_error(PoolSaturated(analysis_pool.retry_after))
+
+    scratch_dir = None
+    try:
+        ref_notes = parse_reference_notes(reference, piece_id)
+        validate_analysis_options(f0_method, voice_type, alignment)
+        output_options = parse_output_options(plots, output, image_format)
+        scratch_dir = scratch.create()
+        audio_path, sheet_path = await save_analysis_uploads(audio_file, sheet_music, scratch_dir)
+
+        job = job_store.create()
+        future = analysis_pool.submit(
+            analyze_singing_ai,
+            file_path=audio_path,
+            reference_notes=ref_notes,
+            sheet_image_path=sheet_path,
+            f0_method=f0_method,
+            voice_type=voice_type,
+            progress=functools.partial(report_progress, job["job_id"]),
+            timings=timings,
+            streaming=streaming,
+            alignment=alignment,
+            **history_options(output_options, user_id)
+        )
+    except PoolSaturated as e:
+        scratch.release(scratch_dir)
+        raise pool_saturated_error(e)
+    except Exception:
+        scratch.release(scratch_dir)
+        raise
+
+    future.add_done_callback(functools.partial(
+        _finish_job, job["job_id"], scratch_dir, user_id, piece_id, output_options["series"]))
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/jobs/{job['job_id']}",
+        "result_url": f"/jobs/{job['job_id']}/result"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {job['error']}")
+    if job["status"] != DONE:
+        return JSONResponse(status_code=202, content=job)
+    return job_store.get_result(job_id)
+
+# ====================== Live Feedback ======================
+# The browser streams raw mono PCM over /ws/live (query: sample_rate,
+# encoding f32|s16, reference or piece_id, voice_type). Each binary message is analyzed
+# as soon as it completes a 512-sample hop and answered with a "frames"
+# message: per-frame pitch, target note, cents deviation and dropout flag,
+# plus running breath indicators. Text messages control the session:
+#   {"type": "reference_note", "note": "E4"}  measure cents against E4
+#   {"type": "end"}                           score the take and close
+# The full score is computed in the analysis pool from the tracks collected
+# during the session and sent as a final "result" message.
+LIVE_MAX_SECONDS = float(os.getenv("LIVE_MAX_SECONDS", "600"))
+PCM_DTYPES = {"f32": "<f4", "s16": "<i2"}
+
+def decode_pcm(data: bytes, encoding: str) -> np.ndarray:
+    """Float samples from one binary message; raises ValueError unless it holds whole samples."""
+    itemsize = np.dtype(PCM_DTYPES[encoding]).itemsize
+    if len(data) % itemsize:
+        raise ValueError(f"{encoding} frames must be a multiple of {itemsize} bytes, got {len(data)}")
+    samples = np.frombuffer(data, dtype=PCM_DTYPES[encoding])
+    if encoding == "s16":
+        return samples.astype(np.float32) / 32768.0
+    return samples
+
+@app.websocket("/ws/live")
+async def live_feedback(
+    websocket: WebSocket,
+    sample_rate: int = LIVE_SR,
+    encoding: str = "f32",
+    reference: Optional[str] = None,
+    piece_id: Optional[str] = None,
+    voice_type: Optional[str] = None
+):
+    await websocket.accept()
+    try:
+        ref_notes = parse_reference_notes(reference, piece_id)
+        validate_analysis_options("yin", voice_type)
+        if encoding not in PCM_DTYPES:
+            raise HTTPException(status_code=422, detail=f"encoding must be one of: {', '.join(PCM_DTYPES)}")
+        if not 8000 <= sample_rate <= 192000:
+            raise HTTPException(status_code=422, detail="sample_rate must be between 8000 and 192000")
+        session = LiveSession(input_sr=sample_rate, reference_notes=ref_notes, voice_type=voice_type)
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "detail": e.detail})
+        await websocket.close(code=1008)
+        return
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                start = time.perf_counter()
                 try:
-                    os.remove(path)
-                    logger.info(f"Cleaned up temporary file: {path}")
+                    samples = decode_pcm(message["bytes"], encoding)
+                except ValueError as e:
+                    await websocket.send_json({"type": "error", "detail": str(e)})
+                    continue
+                frames = session.push(samples)
+                await websocket.send_json({
+                    "type": "frames",
+                    "frames": frames,
+                    "breath": session.breath_indicators(),
+                    "latency_ms": round((time.perf_counter() - start) * 1000, 2)
+                })
+                if session.duration >= LIVE_MAX_SECONDS:
+                    await websocket.send_json({"type": "error",
+                                               "detail": f"Live takes are limited to {LIVE_MAX_SECONDS:g} seconds"})
+                    break
+                continue
+
+            try:
+                control = json.loads(message.get("text") or "{}")
+            except json.JSONDecodeError:
+                control = None
+            if not isinstance(control, dict):
+                await websocket.send_json({"type": "error", "detail": "Control messages must be JSON objects"})
+                continue
+            if control.get("type") == "reference_note":
+                try:
+                    session.set_reference_note(control.get("note"))
                 except Exception as e:
-                    logger.warning(f"Could not remove {path}: {str(e)}")
+                    await websocket.send_json({"type": "error", "detail": f"Invalid note: {str(e)}"})
+            elif control.get("type") == "end":
+                break
+
+        frames = session.close()
+        await websocket.send_json({"type": "frames", "frames": frames, "breath": session.breath_indicators()})
+        if session.n_samples == 0:
+            await websocket.send_json({"type": "error", "detail": "No audio received"})
+            await websocket.close()
+            return
+
+        y, sr, f0, rms = session.take()
+        try:
+            result = await analysis_pool.run(analyze_live_take, y, sr, f0, rms, reference_notes=ref_notes)
+        except PoolSaturated as e:
+            await websocket.send_json({"type": "error", "detail": "Analysis queue is full, please retry shortly",
+                                       "retry_after": e.retry_after})
+            await websocket.close(code=1013)
+            return
+        await websocket.send_text(json.dumps({"type": "result", "result": result}, default=_to_json))
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info("Live session disconnected")
+    except Exception as e:
+        logger.error(f"Live session failed: {str(e)}", exc_info=True)
+        await websocket.close(code=1011)
+
+# ====================== On-demand Plots ======================
+# Plots skipped at analysis time can be rendered later from the plot data
+# the analysis cached under its analysis_id.
+@app.get("/analysis/{analysis_id}/plots/{name}")
+async def get_analysis_plot(analysis_id: str, name: str, image_format: str = "png"):
+    if name not in PLOT_NAMES:
+        raise HTTPException(status_code=404, detail=f"Unknown plot: {name}")
+    if image_format not in IMAGE_FORMATS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"image_format must be one of: {', '.join(IMAGE_FORMATS)}"
+        )
+    try:
+        plot = await analysis_pool.run(render_stored_plot, analysis_id, name, image_format)
+    except PoolSaturated as e:
+        raise pool_saturated_error(e)
+    if plot is None:
+        raise HTTPException(status_code=404, detail="Analysis not found or expired; re-run /analyze")
+    return {"analysis_id": analysis_id, f"{name}_plot": plot}
+
+@app.get("/analysis/{analysis_id}/series")
+async def get_analysis_series(analysis_id: str):
+    try:
+        series = await analysis_pool.run(stored_series, analysis_id)
+    except PoolSaturated as e:
+        raise pool_saturated_error(e)
+    if series is None:
+        raise HTTPException(status_code=404, detail="Analysis not found or expired; re-run /analyze")
+    return {"analysis_id": analysis_id, "series": series}
+
+# ====================== History Queries ======================
+def get_history_store():
+    if history_store is None:
+        raise HTTPException(status_code=404, detail="Analysis history is disabled (HISTORY_DB=off)")
+    return history_store
+
+@app.get("/history/{user_id}/takes")
+async def get_recent_takes(user_id: str, limit: int = 20, piece_id: Optional[str] = None):
+    if not 1 <= limit <= 500:
+        raise HTTPException(status_code=422, detail="limit must be between 1 and 500")
+    return {"user_id": user_id, "takes": get_history_store().recent(user_id, limit=limit, piece_id=piece_id)}
+
+@app.get("/history/{user_id}/takes/{take_id}")
+async def get_take(user_id: str, take_id: str):
+    take = get_history_store().get(user_id, take_id)
+    if take is None:
+        raise HTTPException(status_code=404, detail="Take not found")
+    return take
+
+@app.get("/history/{user_id}/trend")
+async def get_score_trend(user_id: str, metric: str = "pitch_accuracy", days: float = 90):
+    if metric not in TREND_METRICS:
+        raise HTTPException(status_code=422, detail=f"metric must be one of: {', '.join(TREND_METRICS)}")
+    if days <= 0:
+        raise HTTPException(status_code=422, detail="days must be positive")
+    points = get_history_store().trend(user_id, metric=metric, days=days)
+    return {"user_id": user_id, "metric": metric, "days": days, "points": points}
+
+@app.get("/history/{user_id}/best")
+async def get_best_takes(user_id: str):
+    return {"user_id": user_id, "pieces": get_history_store().best_per_piece(user_id)}
+
+# ====================== Reference Library ======================
+@app.get("/pieces")
+async def list_pieces():
+    return {"pieces": [piece.describe() for piece in get_library().values()]}
+
+@app.get("/pieces/{piece_id}")
+async def get_reference_piece(piece_id: str):
+    piece = get_piece(piece_id)
+    if piece is None:
+        raise HTTPException(status_code=404, detail="Unknown piece")
+    return piece.describe()
 
 # ====================== Health Check ======================
 @app.get("/health")
 async def health_check():
     return {
         "status": "healthy",
-        "environment": os.getenv("ENVIRONMENT", "development")
+        "environment": os.getenv("ENVIRONMENT", "development"),
+        "analysis_pool": analysis_pool.stats(),
+        "analyzer_version": ANALYZER_VERSION,
+        "score_model": model_info(),
+        "scratch": scratch.stats(),
+        "startup": {**startup.report(), "worker_warmup_seconds": list(worker_warmups.values())},
+        "result_cache": {
+            "hits": result_cache_counts["hit_memory"] + result_cache_counts["hit_disk"],
+            "memory_hits": result_cache_counts["hit_memory"],
+            "disk_hits": result_cache_counts["hit_disk"],
+            "misses": result_cache_counts["miss"]
+        }
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text exposition of analysis timings and pool load."""
+    pool = analysis_pool.stats()
+    content = render_metrics({
+        "pitchpanel_pool_workers": ("Analysis worker processes", lambda: pool["workers"]),
+        "pitchpanel_pool_capacity": ("Jobs the pool accepts before returning 503", lambda: analysis_pool.capacity),
+        "pitchpanel_pool_in_flight": ("Analyses running or waiting for a worker", lambda: pool["in_flight"]),
+        "pitchpanel_pool_queued": ("Analyses waiting for a worker", lambda: pool["queued"]),
+        "pitchpanel_ready_seconds": ("Seconds from process start until the API was ready",
+                                     lambda: startup.report().get("ready", float("nan"))),
+    })
+    return PlainTextResponse(content, media_type="text/plain; version=0.0.4")
+
+
 @app.options("/analyze")
 async def analyze_options():
     return {"message": "OK"}
\ No newline at end of file
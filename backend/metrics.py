@@ -0,0 +1,146 @@
+"""
+Prometheus-style metrics for the API.
+
+Analysis workers report stage and analysis timings through analysis.events;
+track_metrics() feeds them into the histograms and counters below, and
+render_metrics() produces the text exposition format served at /metrics.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from analysis import events
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+AUDIO_SECONDS_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200)
+BYTES_BUCKETS = tuple(2 ** n for n in range(16, 27, 2))  # 64KB .. 64MB
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[key] = (counts, total + value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, (counts, total) in series:
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {counts[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(key)} {_format_value(v)}" for key, v in values)
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "pitchpanel_stage_seconds", "Wall-clock seconds spent in each analysis stage", SECONDS_BUCKETS)
+ANALYSIS_SECONDS = Histogram(
+    "pitchpanel_analysis_seconds", "Wall-clock seconds per analysis", SECONDS_BUCKETS)
+AUDIO_DURATION = Histogram(
+    "pitchpanel_audio_duration_seconds", "Duration of analyzed recordings", AUDIO_SECONDS_BUCKETS)
+UPLOAD_BYTES = Histogram(
+    "pitchpanel_upload_bytes", "Size of uploaded files in bytes", BYTES_BUCKETS)
+AUDIO_SECONDS_TOTAL = Counter(
+    "pitchpanel_audio_seconds_total", "Seconds of audio analyzed (cache hits excluded)")
+CPU_SECONDS_TOTAL = Counter(
+    "pitchpanel_analysis_cpu_seconds_total", "CPU seconds spent analyzing (cache hits excluded)")
+ANALYSES_TOTAL = Counter(
+    "pitchpanel_analyses_total", "Analyses completed, by outcome")
+RESULT_CACHE_TOTAL = Counter(
+    "pitchpanel_result_cache_total", "Result cache lookups, by outcome")
+
+METRICS = (STAGE_SECONDS, ANALYSIS_SECONDS, AUDIO_DURATION, UPLOAD_BYTES,
+           AUDIO_SECONDS_TOTAL, CPU_SECONDS_TOTAL, ANALYSES_TOTAL, RESULT_CACHE_TOTAL)
+
+
+@contextmanager
+def time_stage(stage: str):
+    """Time a stage that runs in the API process itself (e.g. upload)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def _on_analysis(cached, audio_seconds, wall_seconds, cpu_seconds):
+    outcome = "cached" if cached else "analyzed"
+    ANALYSES_TOTAL.inc(outcome=outcome)
+    ANALYSIS_SECONDS.observe(wall_seconds, outcome=outcome)
+    if not cached:
+        AUDIO_DURATION.observe(audio_seconds)
+        AUDIO_SECONDS_TOTAL.inc(audio_seconds)
+        CPU_SECONDS_TOTAL.inc(cpu_seconds)
+
+
+def track_metrics() -> None:
+    """Record timing and cache events emitted by analysis workers."""
+    events.subscribe("stage_timing", lambda stage, seconds: STAGE_SECONDS.observe(seconds, stage=stage))
+    events.subscribe("analysis_timing", _on_analysis)
+    events.subscribe("result_cache", lambda outcome: RESULT_CACHE_TOTAL.inc(outcome=outcome))
+
+
+def render_metrics(gauges: Dict[str, Tuple[str, Callable[[], float]]]) -> str:
+    """
+    Text exposition of every metric plus `gauges`, a mapping of
+    name -> (help text, callable returning the current value).
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, (help_text, read) in gauges.items():
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {_format_value(read())}"])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,99 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+SCRATCH_DIRNAME = "pitchpanel-scratch"
+
+
+def default_scratch_root() -> str:
+    """
+    pitchpanel-scratch in the system temp dir. tmpfs such as /dev/shm is
+    opt-in through SCRATCH_DIR: it is often small (64 MB in a default
+    Docker container), and a batch can hold 50 uploads of up to 50 MB.
+    """
+    return os.path.join(tempfile.gettempdir(), SCRATCH_DIRNAME)
+
+
+class ScratchSpace:
+    """
+    A private, uniquely named directory per request under one root.
+
+    Uploads are written inside their request's directory, so concurrent
+    requests never share paths and cleanup never has to guess which files
+    belong to whom: release() removes exactly one directory. Directories
+    left behind by crashed requests or a killed process are removed by
+    reap() once they are older than max_age and no longer in use here.
+    """
+
+    def __init__(self, root: str, max_age: float = 3600):
+        self.root = root
+        self.max_age = max_age
+        self._active = set()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def create(self, prefix: str = "req-") -> str:
+        """A new, empty scratch directory (mode 0700)."""
+        path = tempfile.mkdtemp(prefix=prefix, dir=self.root)
+        with self._lock:
+            self._active.add(path)
+        return path
+
+    def release(self, directory: Optional[str]) -> None:
+        """Delete a scratch directory and everything in it."""
+        if not directory:
+            return
+        shutil.rmtree(directory, ignore_errors=True)
+        with self._lock:
+            self._active.discard(directory)
+
+    def reap(self, max_age: Optional[float] = None) -> int:
+        """Remove orphaned scratch directories older than max_age seconds; returns how many."""
+        cutoff = time.time() - (self.max_age if max_age is None else max_age)
+        with self._lock:
+            active = set(self._active)
+        removed = 0
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.path in active or entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"Could not reap {entry.path}: {e}")
+        if removed:
+            logger.info(f"Reaped {removed} orphaned scratch directories from {self.root}")
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            active = len(self._active)
+        return {"root": self.root, "active": active}
+
+
+def upload_path(directory: str, stem: str, filename: Optional[str]) -> str:
+    """`directory`/`stem` plus the extension of a client-supplied file name (which is never used as a path)."""
+    extension = os.path.splitext(os.path.basename((filename or "").replace("\\", "/")))[1].lower()
+    return os.path.join(directory, stem + extension)
+
+
+def scratch_space_from_env() -> ScratchSpace:
+    return ScratchSpace(
+        os.getenv("SCRATCH_DIR") or default_scratch_root(),
+        max_age=float(os.getenv("SCRATCH_MAX_AGE", "3600")),
+    )
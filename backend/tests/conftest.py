@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Tests import the backend modules the way main.py does (analysis.*, jobs, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import startup  # noqa: E402
+
+startup.configure()
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from analysis.alignment import MAX_LOCAL_CENTS, _banded_dtw, band_windows
+
+
+def full_dtw(query, reference, max_cost, allowed=None):
+    """Textbook O(n * m) DTW with the same steps and capped local cost; `allowed` masks cells."""
+    n, m = len(query), len(reference)
+    cost = np.minimum(np.abs(query[:, None] - reference[None, :]), max_cost)
+    if allowed is not None:
+        cost = np.where(allowed, cost, np.inf)
+    acc = np.full((n, m), np.inf)
+    for i in range(n):
+        for j in range(m):
+            if i == 0 and j == 0:
+                acc[i, j] = cost[i, j]
+                continue
+            best = min(acc[i - 1, j - 1] if i and j else np.inf,
+                       acc[i - 1, j] if i else np.inf,
+                       acc[i, j - 1] if j else np.inf)
+            acc[i, j] = best + cost[i, j]
+    return acc[-1, -1], cost
+
+
+def band_mask(n, m, lo, width):
+    j = np.arange(m)[None, :]
+    return (j >= lo[:, None]) & (j < lo[:, None] + width)
+
+
+def check_path(path_i, path_j, n, m):
+    assert (path_i[0], path_j[0]) == (0, 0)
+    assert (path_i[-1], path_j[-1]) == (n - 1, m - 1)
+    di, dj = np.diff(path_i), np.diff(path_j)
+    assert set(zip(di.tolist(), dj.tolist())) <= {(1, 1), (1, 0), (0, 1)}
+
+
+def random_case(rng, n, m):
+    reference = np.repeat(rng.integers(-1200, 1200, size=max(1, m // 4)) * 1.0, 4)[:m]
+    reference = np.pad(reference, (0, m - len(reference)), mode="edge")
+    query = np.interp(np.linspace(0, m - 1, n), np.arange(m), reference) + rng.normal(0, 40, n)
+    return query, reference
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_full_band_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n, m = rng.integers(5, 40), rng.integers(5, 40)
+    query, reference = random_case(rng, n, m)
+    lo, width = band_windows(n, m, radius=m)
+    assert width == m and not lo.any()
+
+    total, path_i, path_j = _banded_dtw(query, reference, lo, width, MAX_LOCAL_CENTS)
+    expected, cost = full_dtw(query, reference, MAX_LOCAL_CENTS)
+    assert total == pytest.approx(expected)
+    check_path(path_i, path_j, n, m)
+    assert cost[path_i, path_j].sum() == pytest.approx(total)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_narrow_band_matches_brute_force_restricted_to_band(seed):
+    rng = np.random.default_rng(100 + seed)
+    n, m = rng.integers(20, 60), rng.integers(20, 60)
+    query, reference = random_case(rng, n, m)
+    lo, width = band_windows(n, m, radius=3)
+    assert width < m
+
+    total, path_i, path_j = _banded_dtw(query, reference, lo, width, MAX_LOCAL_CENTS)
+    allowed = band_mask(n, m, lo, width)
+    expected, cost = full_dtw(query, reference, MAX_LOCAL_CENTS, allowed)
+    assert total == pytest.approx(expected)
+    check_path(path_i, path_j, n, m)
+    assert allowed[path_i, path_j].all()
+    # Restricting the band can only make the best path more expensive
+    assert total >= full_dtw(query, reference, MAX_LOCAL_CENTS)[0] - 1e-9
+
+
+@pytest.mark.parametrize("n, m", [(1, 1), (1, 7), (7, 1), (3, 20), (10, 50)])
+def test_edge_shapes(n, m):
+    rng = np.random.default_rng(n * 100 + m)
+    query, reference = random_case(rng, n, m)
+    lo, width = band_windows(n, m, radius=2)
+    # Consecutive rows overlap, so a monotone path through the band exists
+    assert (lo[1:] <= lo[:-1] + width).all()
+    assert lo[0] == 0 and lo[-1] + width == m
+
+    total, path_i, path_j = _banded_dtw(query, reference, lo, width, MAX_LOCAL_CENTS)
+    expected, _ = full_dtw(query, reference, MAX_LOCAL_CENTS, band_mask(n, m, lo, width))
+    assert np.isfinite(total) and total == pytest.approx(expected)
+    check_path(path_i, path_j, n, m)
+    assert len(np.unique(path_j)) == m
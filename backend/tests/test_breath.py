@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from analysis.analyzer import analyze_breath_support, analyze_breath_support_batch
+
+SR = 22050
+HOP = 512
+
+
+def sung_energy(note_seconds, ramp_seconds, hop_length=HOP):
+    """RMS of held notes joined by steady crescendos; only the notes are sustained."""
+    frame_rate = SR / hop_length
+    level, parts = 0.05, []
+    for seconds in note_seconds:
+        parts.append(level + np.linspace(0, 0.1, int(ramp_seconds * frame_rate), endpoint=False))
+        level += 0.1
+        frames = int(round(seconds * frame_rate))
+        parts.append(level + 1e-5 * np.arange(frames))
+        level += 1e-5 * frames
+    parts.append(level + np.linspace(0, 0.1, int(ramp_seconds * frame_rate)))
+    return np.concatenate(parts)
+
+
+def assert_matches_single(tracks):
+    batch = analyze_breath_support_batch(tracks, SR, HOP)
+    assert batch.shape == (len(tracks), 5)
+    for row, rms in zip(batch, tracks):
+        np.testing.assert_allclose(row, analyze_breath_support(None, SR, rms, HOP))
+
+
+def test_batch_matches_single_tracks():
+    rng = np.random.default_rng(0)
+    tracks = [rng.uniform(0.05, 0.5, 200), sung_energy([2, 3], 4), rng.uniform(0, 1, 8),
+              np.full(50, 0.3), rng.uniform(0, 1, 500)]
+    assert_matches_single(tracks)
+
+
+@pytest.mark.parametrize("length", [0, 1, 2, 3])
+def test_batch_matches_single_for_short_tracks(length):
+    rng = np.random.default_rng(length)
+    tracks = [rng.uniform(0, 1, 100), rng.uniform(0, 1, length), rng.uniform(0, 1, 100)]
+    assert_matches_single(tracks)
+    assert_matches_single([tracks[1]])
+
+
+def test_sustained_runs_do_not_span_adjacent_tracks():
+    # Each track ends and the next begins on a held note, so a run crossing
+    # the boundary would double the phrase length of both
+    note = sung_energy([3], 4)
+    tail, head = note[:len(note) // 2], note[len(note) // 2:]
+    assert_matches_single([tail, head, tail, head])
+    assert_matches_single([tail, np.array([]), head])
+
+
+def test_empty_batch():
+    assert analyze_breath_support_batch([], SR, HOP).shape == (0, 5)
+
+
+def test_phrase_length_in_seconds():
+    # Held notes of 2, 3 and 4 s average 3 s; smoothing may add up to half
+    # its 51-frame window to each phrase
+    rms = sung_energy([2, 3, 4], 5.5)
+    phrase_seconds = analyze_breath_support(None, SR, rms, HOP)[3] / 2
+    assert 3.0 <= phrase_seconds <= 3.0 + 25 * HOP / SR
+
+    # The same frames at half the hop are half as long
+    half_hop = analyze_breath_support(None, SR, rms, HOP // 2)[3] / 2
+    assert half_hop == pytest.approx(phrase_seconds / 2)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from analysis import model
+
+
+@pytest.fixture(autouse=True)
+def restore_model():
+    yield
+    model.load_model()
+
+
+def test_non_linear_model_loads(tmp_path):
+    from sklearn.ensemble import GradientBoostingRegressor
+
+    linear = model.train_advanced_model()
+    X = np.random.default_rng(0).uniform(0, 10, size=(200, model.N_FEATURES))
+    regressor = GradientBoostingRegressor(n_estimators=20, random_state=0).fit(X, linear.predict(X))
+    path = tmp_path / "gbr.joblib"
+    model.save_model(regressor, path)
+
+    loaded = model.load_model(path)
+    assert isinstance(loaded, GradientBoostingRegressor)
+    assert model.model_info()["source"] == "file"
+    assert len(model.model_version()) == 12
+    totals = model.predict_total([[5, 5, 5], [9, 9, 9]])
+    assert totals.shape == (2,) and np.all((totals >= 0) & (totals <= 10))
+
+
+def test_linear_fingerprint_survives_round_trip(tmp_path):
+    trained = model.train_advanced_model()
+    path = tmp_path / "linear.joblib"
+    model.save_model(trained, path)
+    model.load_model(path)
+    assert model.model_version() == model._fingerprint(trained)
+
+
+def test_invalid_model_falls_back_to_training(tmp_path):
+    path = tmp_path / "bad.joblib"
+    model.save_model({"not": "a model"}, path)
+    model.load_model(path)
+    assert model.model_info()["source"] == "trained"
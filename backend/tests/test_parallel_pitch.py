@@ -0,0 +1,111 @@
+import threading
+
+import numpy as np
+import pytest
+
+from analysis import parallel_pitch
+
+
+def run_with_timeout(fn, timeout=120):
+    """Run fn on a daemon thread; fail instead of hanging the test run if it doesn't return."""
+    errors = []
+
+    def target():
+        try:
+            fn()
+        except Exception as e:  # surfaced below
+            errors.append(e)
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f"{fn.__name__} did not return within {timeout}s"
+    if errors:
+        raise errors[0]
+
+
+@pytest.fixture
+def fresh_pool():
+    parallel_pitch.shutdown_pool()
+    yield
+    parallel_pitch.shutdown_pool()
+
+
+def test_shutdown_and_resize_do_not_deadlock(fresh_pool):
+    def cycle():
+        first = parallel_pitch.get_pool(2)
+        assert parallel_pitch.get_pool(2) is first
+        resized = parallel_pitch.get_pool(3)
+        assert resized is not first
+        parallel_pitch.shutdown_pool(wait=False)
+        parallel_pitch.shutdown_pool()
+        assert parallel_pitch.get_pool(2).submit(int, "7").result(timeout=60) == 7
+        parallel_pitch.shutdown_pool(wait=True)
+
+    run_with_timeout(cycle)
+
+
+def synthetic_phrases(seconds=12.0, sr=22050):
+    """Sung-like phrases (stepwise notes with vibrato) separated by short breaths."""
+    t = np.arange(int(seconds * sr)) / sr
+    midi = 57 + 2 * (np.floor(t / 0.75) % 7)
+    f0 = 440.0 * 2 ** ((midi - 69) / 12) * (1 + 0.005 * np.sin(2 * np.pi * 5.5 * t))
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(np.sin(k * phase) / k for k in range(1, 4))
+    breaths = (t % 3.0) > 2.6
+    y[breaths] = 0.0
+    rng = np.random.default_rng(0)
+    return (0.3 * y + 0.002 * rng.standard_normal(len(t))).astype(np.float32), sr
+
+
+def assert_tracks_equal(actual, expected):
+    f0, voiced_flag, voiced_probs = actual
+    f0_ref, voiced_ref, probs_ref = expected
+    assert len(f0) == len(f0_ref)
+    np.testing.assert_array_equal(np.isnan(f0), np.isnan(f0_ref))
+    both = ~np.isnan(f0)
+    cents = 1200 * np.abs(np.log2(f0[both] / f0_ref[both]))
+    assert cents.max(initial=0) < 1.0
+    assert np.mean(voiced_flag == voiced_ref) > 0.999
+    np.testing.assert_allclose(voiced_probs, probs_ref, atol=1e-6)
+
+
+@pytest.fixture
+def short_segments(monkeypatch, fresh_pool):
+    # Cut a 12 s clip into 3 s pieces so the stitching is exercised
+    monkeypatch.setattr(parallel_pitch, "MIN_SEGMENT_SECONDS", 3)
+
+
+def test_stitched_pyin_matches_whole_file(short_segments):
+    import librosa
+
+    y, sr = synthetic_phrases()
+    kwargs = {"fmin": 65.0, "fmax": 1047.0, "sr": sr, "frame_length": 2048, "hop_length": 512}
+    expected = librosa.pyin(y, fill_na=np.nan, **kwargs)
+
+    result = {}
+    run_with_timeout(lambda: result.setdefault("tracks", parallel_pitch.pyin(
+        y, sr, 65.0, 1047.0, workers=2)), timeout=300)
+    assert_tracks_equal(result["tracks"], expected)
+
+
+def test_pyin_ranges_match_per_range_pyin(short_segments):
+    import librosa
+
+    y, sr = synthetic_phrases()
+    ranges = [(0, 2 * sr), (int(2.5 * sr), 10 * sr), (int(10.5 * sr), len(y))]
+    kwargs = {"fmin": 65.0, "fmax": 1047.0, "sr": sr, "frame_length": 2048, "hop_length": 512}
+
+    result = {}
+    run_with_timeout(lambda: result.setdefault("tracks", parallel_pitch.pyin_ranges(
+        y, sr, ranges, 65.0, 1047.0, workers=2)), timeout=300)
+    assert len(result["tracks"]) == len(ranges)
+    for tracks, (start, end) in zip(result["tracks"], ranges):
+        assert_tracks_equal(tracks, librosa.pyin(y[start:end], fill_na=np.nan, **kwargs))
+
+
+def test_plan_cuts_picks_quiet_frames():
+    rms = np.ones(100)
+    rms[[30, 70]] = 0.0
+    assert parallel_pitch.plan_cuts(rms, 3, search_frames=10) == [0, 30, 70, 100]
+    assert parallel_pitch.plan_cuts(rms, 1) == [0, 100]
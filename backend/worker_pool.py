@@ -0,0 +1,216 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from analysis import events, startup
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturated(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Analysis queue is full")
+        self.retry_after = retry_after
+
+
+class PoolBroken(PoolSaturated):
+    """Raised when a worker died (e.g. OOM-killed) and broke the pool; it is rebuilt for later jobs."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after)
+        self.args = ("Analysis worker crashed",)
+
+
+def _init_worker(event_queue, warm_up=False):
+    """Import the heavy analysis stack, load the score model and optionally warm up, once per worker."""
+    startup.configure()
+    import librosa  # noqa: F401
+    from analysis.model import get_advanced_model
+
+    get_advanced_model()
+    # Before the sink is installed, so the warm-up does not show up in /metrics
+    warmup_seconds = round(startup.warm_up(), 3) if warm_up else None
+    events.set_sink(lambda kind, payload: event_queue.put((kind, payload)))
+    events.emit("worker_ready", pid=os.getpid(), warmup_seconds=warmup_seconds)
+
+
+def _ping():
+    return os.getpid()
+
+
+class AnalysisPool:
+    """
+    Bounded process pool for CPU-bound analysis.
+
+    At most `max_workers` jobs run at once and at most `queue_depth` more may
+    wait for a worker; anything beyond that is rejected with PoolSaturated so
+    the caller can answer 503 instead of letting requests pile up. With
+    `max_workers=0` jobs run in the event loop's default thread executor,
+    which is handy for development.
+
+    Events emitted by workers through analysis.events are forwarded over a
+    queue and dispatched to subscribers in this process.
+
+    If a worker dies, ProcessPoolExecutor fails every job in flight and
+    refuses new ones. Those jobs raise PoolBroken (a PoolSaturated, so
+    callers answer 503) and the executor is replaced with a fresh one.
+    """
+
+    def __init__(self, max_workers: int, queue_depth: int, retry_after: int = 5,
+                 start_method: str = "spawn", warm_up: bool = False):
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+        self.start_method = start_method
+        self.warm_up = warm_up
+        self.in_flight = 0
+        self._ready_workers = set()
+        self._all_ready = threading.Event()
+        self._executor = None
+        self._event_queue = None
+        self._event_thread = None
+
+    @classmethod
+    def from_env(cls) -> "AnalysisPool":
+        max_workers = int(os.getenv("ANALYSIS_WORKERS", os.cpu_count() or 1))
+        return cls(
+            max_workers=max_workers,
+            queue_depth=int(os.getenv("ANALYSIS_QUEUE_DEPTH", max(1, max_workers))),
+            retry_after=int(os.getenv("ANALYSIS_RETRY_AFTER", "5")),
+            start_method=os.getenv("ANALYSIS_START_METHOD", "spawn"),
+            warm_up=startup.warmup_enabled(),
+        )
+
+    @property
+    def capacity(self) -> int:
+        return max(1, self.max_workers) + self.queue_depth
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.in_flight - max(1, self.max_workers))
+
+    def start(self) -> None:
+        if self.max_workers <= 0:
+            events.install_local_dispatch()
+            return
+        if self._executor is None:
+            context = multiprocessing.get_context(self.start_method)
+            self._event_queue = context.Queue()
+            self._event_thread = threading.Thread(target=self._drain_events, daemon=True)
+            self._event_thread.start()
+            self._executor = self._new_executor(context)
+            logger.info(f"Started analysis pool with {self.max_workers} workers "
+                        f"(queue depth {self.queue_depth})")
+
+    def _new_executor(self, context):
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._event_queue, self.warm_up),
+        )
+        # Spawn every worker now so imports and model loading happen at
+        # startup rather than on the first requests
+        for _ in range(self.max_workers):
+            executor.submit(_ping)
+        return executor
+
+    def _replace_broken(self, broken) -> None:
+        """Swap in a new executor for `broken`, unless that already happened."""
+        if self._executor is not broken or broken is None:
+            return
+        logger.error("An analysis worker died; restarting the analysis pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._ready_workers.clear()
+        self._executor = self._new_executor(multiprocessing.get_context(self.start_method))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self._event_queue is not None:
+            self._event_queue.put(None)
+            self._event_thread.join(timeout=5)
+            self._event_queue = None
+            self._event_thread = None
+
+    async def wait_ready(self, timeout: float = 300) -> bool:
+        """Wait until every worker has initialized (and warmed up); False on timeout."""
+        if self._executor is None:
+            return True
+        ready = await asyncio.to_thread(self._all_ready.wait, timeout)
+        if not ready:
+            logger.warning(f"Only {len(self._ready_workers)} of {self.max_workers} workers ready after {timeout}s")
+        return ready
+
+    def _drain_events(self):
+        while True:
+            item = self._event_queue.get()
+            if item is None:
+                return
+            kind, payload = item
+            if kind == "worker_ready":
+                self._ready_workers.add(payload["pid"])
+                if len(self._ready_workers) >= self.max_workers:
+                    self._all_ready.set()
+            events.dispatch(kind, payload)
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < self.capacity
+
+    def submit(self, fn, *args, **kwargs) -> asyncio.Future:
+        """
+        Schedule `fn(*args, **kwargs)` on the pool and return an awaitable
+        future, or raise PoolSaturated if the pool is full. Must be called
+        from the event loop.
+        """
+        if not self.has_capacity():
+            raise PoolSaturated(self.retry_after)
+
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        try:
+            inner = loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+        except BrokenProcessPool:
+            self._replace_broken(executor)
+            raise PoolBroken(self.retry_after)
+        self.in_flight += 1
+        future = loop.create_future()
+
+        def settle(inner):
+            self.in_flight -= 1
+            if future.cancelled():
+                return
+            if inner.cancelled():
+                future.cancel()
+            elif isinstance(inner.exception(), BrokenProcessPool):
+                self._replace_broken(executor)
+                future.set_exception(PoolBroken(self.retry_after))
+            elif inner.exception() is not None:
+                future.set_exception(inner.exception())
+            else:
+                future.set_result(inner.result())
+
+        inner.add_done_callback(settle)
+        # Cancelling the returned future cancels the job if it hasn't started
+        future.add_done_callback(lambda f: inner.cancel() if f.cancelled() else None)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` on the pool, or raise PoolSaturated if it is full."""
+        return await self.submit(fn, *args, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+        }